@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Shared client for the AI analysis endpoints.
+# The model is configured once per process; calls are async, bounded by AI_MAX_CONCURRENCY and
+# AI_TIMEOUT_SECONDS (queueing for a slot included), cached by (context, data) hash for
+# AI_CACHE_TTL_SECONDS, and identical analyses running at the same time share one model call.
+AI_BACKEND = os.getenv("AI_BACKEND", "gemini")  # gemini | fake (tests, offline deployments)
+AI_MODEL = os.getenv("AI_MODEL", "gemini-pro")
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT_SECONDS", "30"))
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+AI_CACHE_TTL = float(os.getenv("AI_CACHE_TTL_SECONDS", "600"))
+AI_CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", "512"))
+
+
+class AIError(Exception):
+    pass
+
+
+class AIUnavailable(AIError):
+    """No backend configured (e.g. GEMINI_API_KEY missing)."""
+
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, api_key: str, model: str = AI_MODEL):
+        import google.generativeai as genai  # imported on first use: the SDK is slow to import and optional offline
+
+        genai.configure(api_key=api_key)
+        self.model_name = model
+        self._model = genai.GenerativeModel(model)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self._model.generate_content_async(prompt)
+        return response.text
+
+
+class FakeBackend:
+    """Deterministic, network-free backend. `responses` maps a prompt substring to a canned answer."""
+
+    name = "fake"
+
+    def __init__(self, responses: Optional[Dict[str, str]] = None, delay: float = 0.0):
+        self.model_name = "fake"
+        self.responses = responses or {}
+        self.delay = delay
+        self.prompts: List[str] = []
+
+    async def generate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        for needle, answer in self.responses.items():
+            if needle in prompt:
+                return answer
+        return f"Offline analysis ({hashlib.sha256(prompt.encode()).hexdigest()[:8]}): no model configured."
+
+
+def _default_backend():
+    if AI_BACKEND == "fake":
+        return FakeBackend()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return None
+    try:
+        return GeminiBackend(api_key)
+    except Exception as e:
+        logger.error(f"AI backend unavailable: {e}")
+        return None
+
+
+def analysis_key(*parts) -> str:
+    """Stable hash of the analysis inputs (dict key order does not matter)."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _ResponseCache:
+    """TTL + LRU cache of model answers keyed by analysis hash."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class AIClient:
+    def __init__(self, backend=None, *, timeout: float = AI_TIMEOUT, max_concurrency: int = AI_MAX_CONCURRENCY,
+                 cache_ttl: float = AI_CACHE_TTL, cache_max_entries: int = AI_CACHE_MAX_ENTRIES):
+        self._backend = backend
+        self._backend_loaded = backend is not None
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.cache = _ResponseCache(cache_ttl, cache_max_entries)
+        # asyncio primitives belong to one event loop; keep one semaphore / in-flight table per loop
+        self._semaphores: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._in_flight: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if not self._backend_loaded:
+            with self._lock:
+                if not self._backend_loaded:
+                    self._backend = _default_backend()
+                    self._backend_loaded = True
+        return self._backend
+
+    @property
+    def available(self) -> bool:
+        return self.backend is not None
+
+    def set_backend(self, backend):
+        """Swap the backend (tests, offline mode); drops cached answers from the previous one."""
+        with self._lock:
+            self._backend = backend
+            self._backend_loaded = True
+        self.cache.clear()
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._semaphores:
+                self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+                self._in_flight[loop] = {}
+            return self._semaphores[loop], self._in_flight[loop]
+
+    async def generate(self, prompt: str, *, key: Optional[str] = None) -> str:
+        """Model answer for `prompt`; `key` (see analysis_key) identifies it for caching and coalescing."""
+        backend = self.backend
+        if backend is None:
+            raise AIUnavailable("AI Service Unavailable (Missing Key)")
+        key = key or analysis_key(prompt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        semaphore, in_flight = self._loop_state()
+        task = in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(backend, semaphore, prompt, key))
+            in_flight[key] = task
+            task.add_done_callback(lambda _: in_flight.pop(key, None))
+        # shield: one caller disconnecting must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _call(self, backend, semaphore: asyncio.Semaphore, prompt: str, key: str) -> str:
+        async def bounded():
+            async with semaphore:
+                return await backend.generate(prompt)
+
+        # One deadline covers the wait for a free slot and the model call itself
+        try:
+            text = await asyncio.wait_for(bounded(), self.timeout)
+        except asyncio.TimeoutError:
+            raise AIError(f"AI request timed out after {self.timeout:.0f}s")
+        self.cache.set(key, text)
+        return text
+
+
+ai_client = AIClient()
@@ -1,9 +1,9 @@
 
 from logging.config import fileConfig
-from sqlalchemy import engine_from_config
-from sqlalchemy import pool
+from sqlalchemy import create_engine
 from alembic import context
-from ..database import Base
+from backend.database import Base
+from backend import models  # noqa: F401  registers every table on Base.metadata
 import os
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,222 @@
+"""Baseline: the schema databases had before migrations existed
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 09:00:00
+
+Frozen copy of the tables `Base.metadata.create_all` created at the time; later schema changes are
+migrations of their own. A database created before migrations existed is stamped at this revision
+(`alembic stamp 0001_baseline`) and upgraded from there.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_baseline"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password_hash", sa.String(), nullable=False),
+        sa.Column("role", sa.String(), nullable=False),
+        sa.Column("approval_limit", sa.Float()),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_table(
+        "suppliers",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("contact_person", sa.String()),
+        sa.Column("email", sa.String()),
+        sa.Column("phone", sa.String()),
+        sa.Column("rating", sa.Float()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "items",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("sku", sa.String()),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("unit", sa.String()),
+        sa.Column("base_price", sa.Float()),
+        sa.Column("category", sa.String()),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_items_sku", "items", ["sku"], unique=True)
+    op.create_table(
+        "projects",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("code", sa.String()),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("owner_name", sa.String()),
+        sa.Column("budget", sa.Float()),
+        sa.Column("spent", sa.Float()),
+        sa.Column("status", sa.String()),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_projects_code", "projects", ["code"], unique=True)
+    op.create_table(
+        "project_boq",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("project_id", sa.String()),
+        sa.Column("item_id", sa.String()),
+        sa.Column("total_quantity", sa.Float()),
+        sa.Column("received_quantity", sa.Float()),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"]),
+        sa.ForeignKeyConstraint(["item_id"], ["items.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "material_requests",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("project_id", sa.String()),
+        sa.Column("requester_id", sa.String()),
+        sa.Column("status", sa.String()),
+        sa.Column("notes", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"]),
+        sa.ForeignKeyConstraint(["requester_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "request_items",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("request_id", sa.String()),
+        sa.Column("item_id", sa.String()),
+        sa.Column("quantity", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["request_id"], ["material_requests.id"]),
+        sa.ForeignKeyConstraint(["item_id"], ["items.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "rfqs",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("material_request_id", sa.String()),
+        sa.Column("created_by", sa.String()),
+        sa.Column("status", sa.String()),
+        sa.Column("deadline", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.ForeignKeyConstraint(["material_request_id"], ["material_requests.id"]),
+        sa.ForeignKeyConstraint(["created_by"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "quotations",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("rfq_id", sa.String(), nullable=True),
+        sa.Column("supplier_id", sa.String()),
+        sa.Column("total_amount", sa.Float()),
+        sa.Column("currency", sa.String()),
+        sa.Column("valid_until", sa.DateTime(), nullable=True),
+        sa.Column("is_selected", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.ForeignKeyConstraint(["rfq_id"], ["rfqs.id"]),
+        sa.ForeignKeyConstraint(["supplier_id"], ["suppliers.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "purchase_orders",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("project_id", sa.String()),
+        sa.Column("supplier_id", sa.String()),
+        sa.Column("material_request_id", sa.String(), nullable=True),
+        sa.Column("quotation_id", sa.String(), nullable=True),
+        sa.Column("status", sa.String()),
+        sa.Column("total_amount", sa.Float()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"]),
+        sa.ForeignKeyConstraint(["supplier_id"], ["suppliers.id"]),
+        sa.ForeignKeyConstraint(["material_request_id"], ["material_requests.id"]),
+        sa.ForeignKeyConstraint(["quotation_id"], ["quotations.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "po_items",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("po_id", sa.String()),
+        sa.Column("item_id", sa.String()),
+        sa.Column("quantity", sa.Float(), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("received_quantity", sa.Float()),
+        sa.ForeignKeyConstraint(["po_id"], ["purchase_orders.id"]),
+        sa.ForeignKeyConstraint(["item_id"], ["items.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "receipts",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("po_id", sa.String()),
+        sa.Column("received_by", sa.String()),
+        sa.Column("received_date", sa.DateTime()),
+        sa.ForeignKeyConstraint(["po_id"], ["purchase_orders.id"]),
+        sa.ForeignKeyConstraint(["received_by"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "receipt_items",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("receipt_id", sa.String()),
+        sa.Column("item_id", sa.String()),
+        sa.Column("quantity", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["receipt_id"], ["receipts.id"]),
+        sa.ForeignKeyConstraint(["item_id"], ["items.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "invoices",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("po_id", sa.String()),
+        sa.Column("supplier_invoice_number", sa.String()),
+        sa.Column("total_amount", sa.Float()),
+        sa.Column("status", sa.String()),
+        sa.Column("match_status_details", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.ForeignKeyConstraint(["po_id"], ["purchase_orders.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "system_settings",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("company_name", sa.String()),
+        sa.Column("tax_number", sa.String()),
+        sa.Column("currency", sa.String()),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_table(
+        "audit_logs",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.String()),
+        sa.Column("user_name", sa.String()),
+        sa.Column("action", sa.String()),
+        sa.Column("details", sa.Text()),
+        sa.Column("category", sa.String()),
+        sa.Column("timestamp", sa.DateTime()),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    for table in ("audit_logs", "system_settings", "invoices", "receipt_items", "receipts", "po_items",
+                  "purchase_orders", "quotations", "rfqs", "request_items", "material_requests", "project_boq"):
+        op.drop_table(table)
+    op.drop_index("ix_projects_code", table_name="projects")
+    op.drop_table("projects")
+    op.drop_index("ix_items_sku", table_name="items")
+    op.drop_table("items")
+    op.drop_table("suppliers")
+    op.drop_index("ix_users_email", table_name="users")
+    op.drop_table("users")
@@ -0,0 +1,102 @@
+"""Secondary, composite and partial indexes for the service queries
+
+Revision ID: 0002_secondary_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18 09:30:00
+
+Foreign keys used as filters, (filter, created_at, id) composites matching the keyset pagination
+order of the list endpoints, and partial indexes for the small "open" subsets (open RFQs past their
+deadline, POs awaiting approval, invoices waiting for a match). A project has one BOQ line per item:
+duplicate lines are merged first (quantities added up) and (project_id, item_id) is made unique; run
+`python -m backend.services.ledger_service --fix` afterwards to recompute the merged lines' received
+quantities from the receipts. On Postgres the indexes are built
+CONCURRENTLY so writes are not blocked while they build. Check the plans with
+`python -m backend.benchmarks.query_plans`.
+"""
+from contextlib import nullcontext
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_secondary_indexes"
+down_revision: Union[str, None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns, partial index predicate)
+INDEXES = [
+    ("ix_material_requests_project_created", "material_requests", ["project_id", "created_at", "id"], None),
+    ("ix_material_requests_status_created", "material_requests", ["status", "created_at", "id"], None),
+    ("ix_material_requests_requester", "material_requests", ["requester_id"], None),
+    ("ix_request_items_request", "request_items", ["request_id"], None),
+    ("ix_rfqs_material_request", "rfqs", ["material_request_id"], None),
+    ("ix_rfqs_status_created", "rfqs", ["status", "created_at", "id"], None),
+    ("ix_rfqs_open_deadline", "rfqs", ["deadline"], "status = 'OPEN'"),
+    ("ix_quotations_rfq", "quotations", ["rfq_id", "created_at", "id"], None),
+    ("ix_quotations_supplier", "quotations", ["supplier_id"], None),
+    ("ix_purchase_orders_created", "purchase_orders", ["created_at", "id"], None),
+    ("ix_purchase_orders_project_created", "purchase_orders", ["project_id", "created_at", "id"], None),
+    ("ix_purchase_orders_status_created", "purchase_orders", ["status", "created_at", "id"], None),
+    ("ix_purchase_orders_supplier", "purchase_orders", ["supplier_id"], None),
+    ("ix_purchase_orders_material_request", "purchase_orders", ["material_request_id"], None),
+    ("ix_purchase_orders_pending_approval", "purchase_orders", ["project_id", "created_at", "id"], "status = 'PENDING_APPROVAL'"),
+    ("ix_po_items_po", "po_items", ["po_id"], None),
+    ("ix_po_items_item", "po_items", ["item_id"], None),
+    ("ix_receipts_po_received", "receipts", ["po_id", "received_date", "id"], None),
+    ("ix_receipt_items_receipt", "receipt_items", ["receipt_id"], None),
+    ("ix_invoices_po", "invoices", ["po_id"], None),
+    ("ix_invoices_created", "invoices", ["created_at", "id"], None),
+    ("ix_invoices_status_created", "invoices", ["status", "created_at", "id"], None),
+    ("ix_invoices_unmatched", "invoices", ["id"], "status IN ('PENDING_MATCH', 'MISMATCH')"),
+]
+
+
+# Keep the first line of each (project, item) group, holding the group's total quantity
+_MERGE_DUPLICATE_BOQ_LINES = [
+    """
+    UPDATE project_boq SET total_quantity = (
+        SELECT sum(b.total_quantity) FROM project_boq b WHERE b.project_id = project_boq.project_id AND b.item_id = project_boq.item_id
+    )
+    WHERE id IN (
+        SELECT min(id) FROM project_boq WHERE project_id IS NOT NULL AND item_id IS NOT NULL
+        GROUP BY project_id, item_id HAVING count(*) > 1
+    )
+    """,
+    """
+    DELETE FROM project_boq WHERE project_id IS NOT NULL AND item_id IS NOT NULL AND id NOT IN (
+        SELECT min(id) FROM project_boq WHERE project_id IS NOT NULL AND item_id IS NOT NULL GROUP BY project_id, item_id
+    )
+    """,
+]
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def upgrade() -> None:
+    concurrently = _is_postgres()
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block() if concurrently else nullcontext():
+        for statement in _MERGE_DUPLICATE_BOQ_LINES:
+            op.execute(statement)
+        op.create_index("ix_project_boq_project_item", "project_boq", ["project_id", "item_id"], unique=True,
+                        if_not_exists=True, postgresql_concurrently=concurrently)
+        for name, table, columns, where in INDEXES:
+            kwargs = {"postgresql_where": sa.text(where), "sqlite_where": sa.text(where)} if where else {}
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=concurrently, **kwargs)
+    if not concurrently:
+        # Fresh statistics so SQLite's planner sees the new indexes as selective
+        op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    concurrently = _is_postgres()
+    with op.get_context().autocommit_block() if concurrently else nullcontext():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=concurrently)
+        op.drop_index("ix_project_boq_project_item", table_name="project_boq", if_exists=True,
+                      postgresql_concurrently=concurrently)
+
@@ -0,0 +1,104 @@
+"""Audit log: entity column, review indexes, monthly range partitions on Postgres
+
+Revision ID: 0003_audit_log_partitions
+Revises: 0002_secondary_indexes
+Create Date: 2026-10-18 14:00:00
+
+On Postgres audit_logs is rebuilt as a table partitioned by month on `timestamp` (primary key
+(id, timestamp), as partitioning requires), plus a DEFAULT partition so an insert never fails for lack
+of one. Existing rows are copied over. The writer creates the next AUDIT_PARTITION_MONTHS_AHEAD months
+as it goes, and `python -m backend.services.audit_service` does the same as a job, dropping whole
+months past AUDIT_RETENTION_MONTHS. Other databases keep the plain table and get the column, the
+NOT NULL timestamp and the indexes.
+"""
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.services.audit_service import AUDIT_PARTITION_MONTHS_AHEAD, AuditService
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_audit_log_partitions"
+down_revision: Union[str, None] = "0002_secondary_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns, partial index predicate)
+INDEXES = [
+    ("ix_audit_logs_timestamp", "audit_logs", ["timestamp", "id"], None),
+    ("ix_audit_logs_user_time", "audit_logs", ["user_id", "timestamp", "id"], None),
+    ("ix_audit_logs_entity_time", "audit_logs", ["entity_id", "timestamp", "id"], None),
+    ("ix_audit_logs_category_time", "audit_logs", ["category", "action", "timestamp", "id"], None),
+]
+
+_COLUMNS = "id, user_id, user_name, action, details, category"
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def upgrade() -> None:
+    if _is_postgres():
+        # Names of the old table's key and indexes are freed before the new table takes them
+        op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_unpartitioned")
+        op.execute("ALTER TABLE audit_logs_unpartitioned RENAME CONSTRAINT audit_logs_pkey TO audit_logs_unpartitioned_pkey")
+        for name, _, _, _ in INDEXES:
+            op.execute(f"DROP INDEX IF EXISTS {name}")
+        op.execute("""
+            CREATE TABLE audit_logs (
+                id VARCHAR NOT NULL,
+                user_id VARCHAR REFERENCES users (id),
+                user_name VARCHAR,
+                action VARCHAR,
+                details TEXT,
+                category VARCHAR,
+                entity_id VARCHAR,
+                timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp)
+        """)
+        op.execute("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT")
+        bind = op.get_bind()
+        oldest = bind.execute(sa.text("SELECT min(timestamp) FROM audit_logs_unpartitioned")).scalar()
+        AuditService.ensure_partitions(
+            bind, datetime.datetime.utcnow() + datetime.timedelta(days=31 * AUDIT_PARTITION_MONTHS_AHEAD), since=oldest)
+        op.execute(f"INSERT INTO audit_logs ({_COLUMNS}, timestamp) "
+                   f"SELECT {_COLUMNS}, coalesce(timestamp, now() AT TIME ZONE 'utc') FROM audit_logs_unpartitioned")
+        op.execute("DROP TABLE audit_logs_unpartitioned")
+    else:
+        op.execute("UPDATE audit_logs SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL")
+        with op.batch_alter_table("audit_logs") as batch:
+            batch.add_column(sa.Column("entity_id", sa.String()))
+            batch.alter_column("timestamp", existing_type=sa.DateTime(), nullable=False)
+    # On the partitioned parent each index is created on every partition, present and future
+    # (CONCURRENTLY is not available there; the table is new and holds only the copied rows)
+    for name, table, columns, _ in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
+    if _is_postgres():
+        op.execute("ALTER TABLE audit_logs RENAME TO audit_logs_partitioned")
+        op.execute("ALTER TABLE audit_logs_partitioned RENAME CONSTRAINT audit_logs_pkey TO audit_logs_partitioned_pkey")
+        op.execute("""
+            CREATE TABLE audit_logs (
+                id VARCHAR PRIMARY KEY,
+                user_id VARCHAR REFERENCES users (id),
+                user_name VARCHAR,
+                action VARCHAR,
+                details TEXT,
+                category VARCHAR,
+                timestamp TIMESTAMP WITHOUT TIME ZONE
+            )
+        """)
+        op.execute(f"INSERT INTO audit_logs ({_COLUMNS}, timestamp) SELECT {_COLUMNS}, timestamp FROM audit_logs_partitioned")
+        op.execute("DROP TABLE audit_logs_partitioned CASCADE")
+    else:
+        with op.batch_alter_table("audit_logs") as batch:
+            batch.alter_column("timestamp", existing_type=sa.DateTime(), nullable=True)
+            batch.drop_column("entity_id")
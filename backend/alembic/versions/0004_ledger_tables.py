@@ -0,0 +1,49 @@
+"""Project and BOQ spend ledger tables
+
+Revision ID: 0004_ledger_tables
+Revises: 0003_audit_log_partitions
+Create Date: 2026-10-18 16:00:00
+
+Running totals kept by LedgerService as POs are approved, goods received and invoices booked. They
+start empty; `LedgerService.reconcile(db, fix=True)` fills them from the existing rows.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_ledger_tables"
+down_revision: Union[str, None] = "0003_audit_log_partitions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "project_ledger",
+        sa.Column("project_id", sa.String(), nullable=False),
+        sa.Column("committed_amount", sa.Float()),
+        sa.Column("received_amount", sa.Float()),
+        sa.Column("invoiced_amount", sa.Float()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"]),
+        sa.PrimaryKeyConstraint("project_id"),
+    )
+    op.create_table(
+        "boq_ledger",
+        sa.Column("project_id", sa.String(), nullable=False),
+        sa.Column("item_id", sa.String(), nullable=False),
+        sa.Column("ordered_quantity", sa.Float()),
+        sa.Column("committed_amount", sa.Float()),
+        sa.Column("received_quantity", sa.Float()),
+        sa.Column("received_amount", sa.Float()),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"]),
+        sa.ForeignKeyConstraint(["item_id"], ["items.id"]),
+        sa.PrimaryKeyConstraint("project_id", "item_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("boq_ledger")
+    op.drop_table("project_ledger")
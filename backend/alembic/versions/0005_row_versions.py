@@ -0,0 +1,32 @@
+"""Row versions for optimistic locking on RFQs, purchase orders and PO lines
+
+Revision ID: 0005_row_versions
+Revises: 0004_ledger_tables
+Create Date: 2026-10-18 16:10:00
+
+The mappers use `version` as version_id_col: every UPDATE is guarded by the version that was read.
+Existing rows start at 1.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_row_versions"
+down_revision: Union[str, None] = "0004_ledger_tables"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("rfqs", "purchase_orders", "po_items")
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.add_column(table, sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("version")
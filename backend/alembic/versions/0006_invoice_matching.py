@@ -0,0 +1,55 @@
+"""Three-way match: tolerances, match results on invoices, per PO line breakdown
+
+Revision ID: 0006_invoice_matching
+Revises: 0005_row_versions
+Create Date: 2026-10-18 16:20:00
+
+Tolerances are nullable: a supplier's overrides its project's, which falls back to
+MATCH_TOLERANCE_DEFAULT. Existing invoices keep their status; the result columns stay empty until
+they are matched again.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_invoice_matching"
+down_revision: Union[str, None] = "0005_row_versions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INVOICE_COLUMNS = (("grn_value", sa.Float), ("variance", sa.Float), ("match_tolerance", sa.Float), ("matched_at", sa.DateTime))
+
+
+def upgrade() -> None:
+    op.add_column("suppliers", sa.Column("match_tolerance", sa.Float(), nullable=True))
+    op.add_column("projects", sa.Column("match_tolerance", sa.Float(), nullable=True))
+    for name, type_ in INVOICE_COLUMNS:
+        op.add_column("invoices", sa.Column(name, type_(), nullable=True))
+    op.create_table(
+        "invoice_match_lines",
+        sa.Column("invoice_id", sa.String(), nullable=False),
+        sa.Column("po_item_id", sa.String(), nullable=False),
+        sa.Column("item_id", sa.String()),
+        sa.Column("ordered_quantity", sa.Float()),
+        sa.Column("received_quantity", sa.Float()),
+        sa.Column("unit_price", sa.Float()),
+        sa.Column("received_value", sa.Float()),
+        sa.Column("billed_amount", sa.Float()),
+        sa.Column("variance", sa.Float()),
+        sa.ForeignKeyConstraint(["invoice_id"], ["invoices.id"]),
+        sa.ForeignKeyConstraint(["po_item_id"], ["po_items.id"]),
+        sa.ForeignKeyConstraint(["item_id"], ["items.id"]),
+        sa.PrimaryKeyConstraint("invoice_id", "po_item_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("invoice_match_lines")
+    with op.batch_alter_table("invoices") as batch:
+        for name, _ in reversed(INVOICE_COLUMNS):
+            batch.drop_column(name)
+    for table in ("projects", "suppliers"):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("match_tolerance")
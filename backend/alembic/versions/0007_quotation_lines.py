@@ -0,0 +1,42 @@
+"""Line-item quotations: per item unit price and lead time
+
+Revision ID: 0007_quotation_lines
+Revises: 0006_invoice_matching
+Create Date: 2026-10-18 16:30:00
+
+Quotations submitted before this have no lines; awarding one falls back to pricing the request
+items at its total, as before.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_quotation_lines"
+down_revision: Union[str, None] = "0006_invoice_matching"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("quotations", sa.Column("lead_time_days", sa.Integer(), nullable=True))
+    op.create_table(
+        "quotation_items",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("quotation_id", sa.String()),
+        sa.Column("item_id", sa.String()),
+        sa.Column("unit_price", sa.Float(), nullable=False),
+        sa.Column("lead_time_days", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["quotation_id"], ["quotations.id"]),
+        sa.ForeignKeyConstraint(["item_id"], ["items.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_quotation_items_quotation_id", "quotation_items", ["quotation_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_quotation_items_quotation_id", table_name="quotation_items")
+    op.drop_table("quotation_items")
+    with op.batch_alter_table("quotations") as batch:
+        batch.drop_column("lead_time_days")
@@ -0,0 +1,33 @@
+"""Write counters behind the master-data ETags
+
+Revision ID: 0008_table_versions
+Revises: 0007_quotation_lines
+Create Date: 2026-10-18 16:40:00
+
+One row per cached table, created by the first commit that writes it. Until then the table reports
+version 0.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0008_table_versions"
+down_revision: Union[str, None] = "0007_quotation_lines"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "table_versions",
+        sa.Column("table_name", sa.String(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.PrimaryKeyConstraint("table_name"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("table_versions")
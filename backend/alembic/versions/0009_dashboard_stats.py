@@ -0,0 +1,35 @@
+"""Dashboard read model: pre-aggregated counters
+
+Revision ID: 0009_dashboard_stats
+Revises: 0008_table_versions
+Create Date: 2026-10-18 16:50:00
+
+Created empty. Run `python -m backend.services.dashboard_service` once after upgrading so the counters
+start from the existing requests, RFQs, POs and invoices; from then on every commit keeps them current.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0009_dashboard_stats"
+down_revision: Union[str, None] = "0008_table_versions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "dashboard_stats",
+        sa.Column("metric", sa.String(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("count", sa.Integer()),
+        sa.Column("amount", sa.Float()),
+        sa.Column("updated_at", sa.DateTime()),
+        sa.PrimaryKeyConstraint("metric", "key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("dashboard_stats")
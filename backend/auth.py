@@ -1,9 +1,13 @@
 
+import asyncio
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from typing import Optional, Tuple
+from jose import jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from dotenv import load_dotenv
 
@@ -17,7 +21,10 @@ if not SECRET_KEY:
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Raising BCRYPT_ROUNDS later is picked up transparently: hashes are upgraded on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 def verify_password(plain_password, hashed_password):
@@ -26,6 +33,34 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# --- Password Worker Pool ---
+# bcrypt costs ~250ms of CPU per call. It runs on a small dedicated pool (bcrypt releases the GIL) so the
+# event loop keeps serving; once workers and queue are full, callers get an immediate 503 instead of piling up.
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "16"))
+
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+_password_slots = threading.BoundedSemaphore(PASSWORD_WORKERS + PASSWORD_QUEUE_LIMIT)
+
+async def _run_password_job(fn, *args):
+    if not _password_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service busy, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, fn, *args)
+    finally:
+        _password_slots.release()
+
+async def verify_password_async(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """Returns (valid, new_hash); new_hash is set when the stored hash uses outdated parameters."""
+    return await _run_password_job(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await _run_password_job(pwd_context.hash, password)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Decoded-token / principal cache for get_current_user.
+# Entries live until the token expires or AUTH_CACHE_TTL_SECONDS, whichever comes first, and are dropped
+# as soon as a change to the user's role, approval limit, activation or credentials commits.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CACHE_REDIS_URL = os.getenv("AUTH_CACHE_REDIS_URL")
+INVALIDATION_CHANNEL = "itqan:auth:invalidate"
+
+# Columns that change what a principal is allowed to do
+_WATCHED_COLUMNS = ("role", "approval_limit", "is_active", "email", "password_hash")
+_CHANGED_USERS = "auth_cache_changed_users"
+_ALL_USERS = "*"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Session-independent snapshot of the authenticated user (safe to share between requests)."""
+    id: str
+    name: str
+    email: str
+    role: str
+    approval_limit: float
+    is_active: bool
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(
+            id=user.id, name=user.name, email=user.email, role=user.role,
+            approval_limit=user.approval_limit or 0.0, is_active=bool(user.is_active),
+        )
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class PrincipalCache:
+    """In-process TTL + LRU cache of principals keyed by token hash."""
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, principal: Principal, token_exp: Optional[float] = None):
+        expires = time.time() + self.ttl
+        if token_exp is not None:
+            expires = min(expires, token_exp)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (expires, principal)
+            self._by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: str):
+        with self._lock:
+            for key in self._by_user.pop(user_id, set()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_user.get(entry[1].id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[entry[1].id]
+
+
+class RedisInvalidationBus:
+    """Fans user invalidations out to every worker process through Redis pub/sub."""
+
+    def __init__(self, url: str, cache: PrincipalCache):
+        import redis  # optional dependency, only needed for multi-worker deployments
+
+        self.cache = cache
+        self.client = redis.Redis.from_url(url)
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_message})
+        self.thread = self.pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _on_message(self, message):
+        try:
+            user_id = json.loads(message["data"])["user_id"]
+            if user_id == _ALL_USERS:
+                self.cache.clear()
+            else:
+                self.cache.invalidate_user(user_id)
+        except (KeyError, TypeError, ValueError):
+            logger.warning("Ignoring malformed auth invalidation message")
+
+    def publish(self, user_id: str):
+        try:
+            self.client.publish(INVALIDATION_CHANNEL, json.dumps({"user_id": user_id}))
+        except Exception as e:
+            # Local entry is already gone; other workers fall back to the TTL
+            logger.error(f"Auth cache invalidation publish failed: {e}")
+
+
+principal_cache = PrincipalCache()
+_bus: Optional[RedisInvalidationBus] = None
+if AUTH_CACHE_REDIS_URL:
+    try:
+        _bus = RedisInvalidationBus(AUTH_CACHE_REDIS_URL, principal_cache)
+    except Exception as e:
+        logger.error(f"Shared auth cache unavailable, using per-process invalidation only: {e}")
+
+
+def invalidate_user(user_id: str):
+    if user_id == _ALL_USERS:
+        principal_cache.clear()
+    else:
+        principal_cache.invalidate_user(user_id)
+    if _bus is not None:
+        _bus.publish(user_id)
+
+
+# --- Invalidation at commit ---
+# Changed users are collected while the transaction runs and dropped from the cache only once it has
+# committed: invalidating at flush would let a request that authenticates before the commit re-cache
+# the old row. Bulk UPDATE / DELETE statements on users cannot say which rows they hit, so they drop
+# every cached principal.
+def _changed(session: Optional[Session], user_id: str):
+    if session is not None:
+        session.info.setdefault(_CHANGED_USERS, set()).add(user_id)
+
+
+@event.listens_for(models.User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[col].history.has_changes() for col in _WATCHED_COLUMNS):
+        _changed(object_session(target), target.id)
+
+
+@event.listens_for(models.User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    _changed(object_session(target), target.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bulk_user_write(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        if getattr(getattr(orm_execute_state.statement, "table", None), "name", None) == models.User.__tablename__:
+            _changed(orm_execute_state.session, _ALL_USERS)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    changed = session.info.pop(_CHANGED_USERS, None)
+    if changed:
+        for user_id in ({_ALL_USERS} if _ALL_USERS in changed else changed):
+            invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed(session):
+    session.info.pop(_CHANGED_USERS, None)
@@ -0,0 +1,168 @@
+"""Deterministic multi-year procurement dataset for the benchmarks.
+
+Rows are bulk-inserted with Core INSERTs (no ORM events), with the status mix of a live system: most
+history closed out, a small open tail (pending approvals, open RFQs, unmatched invoices) near "now".
+The ledger and dashboard read models are then rebuilt from them.
+"""
+import datetime
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..services.dashboard_service import DashboardService
+from ..services.ledger_service import LedgerService
+
+CHUNK = 5000
+
+
+@dataclass
+class DatasetSize:
+    years: float = 3.0
+    projects: int = 30
+    suppliers: int = 200
+    items: int = 2000
+    requests_per_day: float = 30.0
+    lines_per_document: int = 4
+    quotations_per_rfq: int = 3
+
+    def scaled(self, factor: float) -> "DatasetSize":
+        return DatasetSize(self.years, max(2, int(self.projects * factor)), max(3, int(self.suppliers * factor)),
+                           max(10, int(self.items * factor)), self.requests_per_day * factor, self.lines_per_document,
+                           self.quotations_per_rfq)
+
+
+@dataclass
+class Dataset:
+    """Ids of representative rows, for scenarios that address one document."""
+    counts: Dict[str, int] = field(default_factory=dict)
+    projects: List[str] = field(default_factory=list)
+    suppliers: List[str] = field(default_factory=list)
+    items: List[str] = field(default_factory=list)
+    project_id: str = ""
+    supplier_id: str = ""
+    request_id: str = ""
+    rfq_id: str = ""
+    po_id: str = ""
+    pending_po_id: str = ""
+    invoice_id: str = ""
+    admin_email: str = "bench-admin@example.com"
+
+
+def _pick(rng: random.Random, weights: Dict[str, float]) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _flush(db: Session, model, rows: List[dict]):
+    for start in range(0, len(rows), CHUNK):
+        db.execute(insert(model), rows[start:start + CHUNK])
+    rows.clear()
+
+
+def generate(db: Session, size: DatasetSize = DatasetSize(), seed: int = 7,
+             now: datetime.datetime = datetime.datetime(2026, 1, 1)) -> Dataset:
+    rng = random.Random(seed)
+    out = Dataset()
+    counts = out.counts
+
+    db.execute(insert(models.User), [
+        {"id": "u-admin", "name": "Bench Admin", "email": out.admin_email, "password_hash": "x", "role": "ADMIN",
+         "approval_limit": 0.0},
+        {"id": "u-eng", "name": "Site Engineer", "email": "bench-eng@example.com", "password_hash": "x", "role": "SITE_ENGINEER",
+         "approval_limit": 0.0},
+    ])
+    projects = [f"p-{i:04d}" for i in range(size.projects)]
+    suppliers = [f"s-{i:05d}" for i in range(size.suppliers)]
+    items = [f"i-{i:06d}" for i in range(size.items)]
+    out.projects, out.suppliers, out.items = projects, suppliers, items
+    prices = {item_id: round(rng.uniform(5, 5000), 2) for item_id in items}
+    db.execute(insert(models.Project), [{"id": p, "code": f"PRJ-{i:04d}", "name": f"Project {i}", "budget": rng.uniform(1e6, 5e7),
+                                         "status": "ACTIVE"} for i, p in enumerate(projects)])
+    db.execute(insert(models.Supplier), [{"id": s, "name": f"Supplier {i}", "rating": rng.uniform(2, 5)} for i, s in enumerate(suppliers)])
+    db.execute(insert(models.Item), [{"id": i, "sku": f"SKU-{n:06d}", "name": f"Item {n}", "unit": "pc", "base_price": prices[i],
+                                      "category": f"C{n % 20}"} for n, i in enumerate(items)])
+    db.execute(insert(models.ProjectBOQ), [{"id": f"boq-{p}-{n}", "project_id": p, "item_id": i, "total_quantity": 1000.0}
+                                           for p in projects for n, i in enumerate(rng.sample(items, min(50, len(items))))])
+
+    buffers: Dict[type, List[dict]] = {m: [] for m in (
+        models.MaterialRequest, models.RequestItem, models.RFQ, models.Quotation, models.QuotationItem,
+        models.PurchaseOrder, models.POItem, models.Receipt, models.ReceiptItem, models.Invoice)}
+    total_requests = int(size.years * 365 * size.requests_per_day)
+    span = datetime.timedelta(days=size.years * 365)
+    for n in range(total_requests):
+        created = now - span + span * (n / max(total_requests, 1))
+        age_days = (now - created).days
+        recent = age_days < 30
+        project, supplier = rng.choice(projects), rng.choice(suppliers)
+        lines = [(rng.choice(items), float(rng.randint(1, 100))) for _ in range(size.lines_per_document)]
+
+        mr_id = f"mr-{n:07d}"
+        mr_status = _pick(rng, {"PENDING_TECHNICAL": 0.5, "APPROVED_TECHNICAL": 0.5}) if recent else "APPROVED_TECHNICAL"
+        buffers[models.MaterialRequest].append({"id": mr_id, "project_id": project, "requester_id": "u-eng", "status": mr_status,
+                                                "created_at": created})
+        buffers[models.RequestItem] += [{"id": f"{mr_id}-{k}", "request_id": mr_id, "item_id": i, "quantity": q}
+                                        for k, (i, q) in enumerate(lines)]
+        if mr_status != "APPROVED_TECHNICAL" or rng.random() < 0.2:
+            continue
+
+        rfq_id = f"rfq-{n:07d}"
+        rfq_status = _pick(rng, {"OPEN": 0.6, "CLOSED": 0.4}) if recent else "CLOSED"
+        buffers[models.RFQ].append({"id": rfq_id, "material_request_id": mr_id, "created_by": "u-admin", "status": rfq_status,
+                                    "deadline": created + datetime.timedelta(days=14), "created_at": created})
+        for k in range(size.quotations_per_rfq):
+            q_id = f"q-{n:07d}-{k}"
+            unit_prices = [prices[i] * rng.uniform(0.8, 1.4) for i, _ in lines]
+            buffers[models.Quotation].append({"id": q_id, "rfq_id": rfq_id, "supplier_id": rng.choice(suppliers),
+                                              "total_amount": sum(p * q for p, (_, q) in zip(unit_prices, lines)),
+                                              "lead_time_days": rng.randint(3, 60), "created_at": created})
+            buffers[models.QuotationItem] += [{"id": f"{q_id}-{j}", "quotation_id": q_id, "item_id": i, "unit_price": p}
+                                              for j, ((i, _), p) in enumerate(zip(lines, unit_prices))]
+        if rfq_status == "OPEN":
+            continue
+
+        po_id = f"po-{n:07d}"
+        po_status = (_pick(rng, {"PENDING_APPROVAL": 0.5, "APPROVED": 0.3, "PARTIALLY_RECEIVED": 0.2}) if recent
+                     else _pick(rng, {"RECEIVED": 0.95, "PARTIALLY_RECEIVED": 0.03, "APPROVED": 0.02}))
+        po_lines = [(f"{po_id}-{k}", i, q, round(prices[i] * rng.uniform(0.8, 1.3), 2)) for k, (i, q) in enumerate(lines)]
+        received = {"RECEIVED": 1.0, "PARTIALLY_RECEIVED": 0.5}.get(po_status, 0.0)
+        total = sum(q * p for _, _, q, p in po_lines)
+        buffers[models.PurchaseOrder].append({"id": po_id, "project_id": project, "supplier_id": supplier, "material_request_id": mr_id,
+                                              "status": po_status, "total_amount": total, "created_at": created})
+        buffers[models.POItem] += [{"id": line_id, "po_id": po_id, "item_id": i, "quantity": q, "price": p,
+                                    "received_quantity": q * received} for line_id, i, q, p in po_lines]
+        if received:
+            rec_id = f"rec-{n:07d}"
+            buffers[models.Receipt].append({"id": rec_id, "po_id": po_id, "received_by": "u-eng",
+                                            "received_date": created + datetime.timedelta(days=rng.randint(5, 40))})
+            buffers[models.ReceiptItem] += [{"id": f"{rec_id}-{k}", "receipt_id": rec_id, "item_id": i, "quantity": q * received}
+                                            for k, (_, i, q, _) in enumerate(po_lines)]
+            inv_status = _pick(rng, {"MATCHED": 0.9, "MISMATCH": 0.05, "PENDING_MATCH": 0.05}) if recent else \
+                _pick(rng, {"MATCHED": 0.98, "MISMATCH": 0.02})
+            buffers[models.Invoice].append({"id": f"inv-{n:07d}", "po_id": po_id, "supplier_invoice_number": f"SI-{n}",
+                                            "total_amount": total * received, "status": inv_status,
+                                            "created_at": created + datetime.timedelta(days=45)})
+            out.invoice_id = f"inv-{n:07d}"
+        out.po_id = po_id
+        if po_status == "PENDING_APPROVAL":
+            out.pending_po_id = po_id
+        out.project_id, out.supplier_id, out.request_id, out.rfq_id = project, supplier, mr_id, rfq_id
+
+        if sum(len(rows) for rows in buffers.values()) > 4 * CHUNK:
+            for model, rows in buffers.items():
+                counts[model.__tablename__] = counts.get(model.__tablename__, 0) + len(rows)
+                _flush(db, model, rows)
+    for model, rows in buffers.items():
+        counts[model.__tablename__] = counts.get(model.__tablename__, 0) + len(rows)
+        _flush(db, model, rows)
+    db.commit()
+    # Read models the ORM hooks would have maintained
+    LedgerService.reconcile(db, fix=True)
+    DashboardService.rebuild(db)
+    if db.get_bind().dialect.name in ("sqlite", "postgresql"):
+        # Planner statistics, as a live database would have them
+        db.execute(text("ANALYZE"))
+        db.commit()
+    return out
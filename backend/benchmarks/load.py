@@ -0,0 +1,263 @@
+"""Load test of the procurement lifecycle: latency percentiles, throughput and SQL per request.
+
+    python -m backend.benchmarks.load [--users 8] [--iterations 10] [--scale 0.2] [--years 3]
+                                      [--scenarios lifecycle,browse]
+                                      [--json load.json] [--baseline load.json] [--tolerance 0.3]
+
+Seeds a throw-away SQLite database (or BENCH_DATABASE_URL, e.g. a scratch Postgres) with the
+benchmarks.dataset history. Then, per scenario, `users` concurrent virtual users each run `iterations`
+scripted passes against the app in-process (httpx over ASGI, so no network in the numbers):
+  lifecycle  material request -> RFQ -> quotations -> comparison -> winner PO -> approve -> GRN -> invoice
+  browse     the list / dashboard / financials reads that accompany it
+Reported per endpoint: requests, requests/s, p50 and p99 latency, and SQL statements per request.
+--json writes the results; --baseline compares against an earlier --json run and exits 1 when an
+endpoint's p99 or SQL per request grows, or a scenario's throughput drops, beyond the tolerance.
+"""
+import argparse
+import asyncio
+import contextvars
+import datetime
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+_workdir = tempfile.mkdtemp(prefix="itqan-bench-")
+os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(_workdir, 'bench.db')}"
+os.environ.setdefault("ENV", "DEVELOPMENT")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("MATCH_WORKER_ENABLED", "false")  # started below, on the benchmark's own terms
+os.environ.setdefault("AUDIT_WAL_DIR", os.path.join(_workdir, "audit-wal"))
+
+import httpx
+from sqlalchemy import event, update
+
+from .. import auth, models
+from ..database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine
+from ..main import app
+from ..services.audit_service import audit_writer
+from ..services.matching_service import match_worker
+from .dataset import Dataset, DatasetSize, generate
+
+# Statements run on behalf of the request the current task is making (None outside a request)
+_current_request: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("bench_request", default=None)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _current_request.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statements: Dict[str, List[int]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def summary(self, wall: float) -> Dict[str, dict]:
+        return {
+            endpoint: {
+                "requests": len(samples),
+                "rps": round(len(samples) / wall, 1) if wall else 0.0,
+                "p50_ms": round(percentile(samples, 50), 2),
+                "p99_ms": round(percentile(samples, 99), 2),
+                "sql_per_request": round(sum(self.statements[endpoint]) / len(samples), 2),
+                "errors": self.errors.get(endpoint, 0),
+            }
+            for endpoint, samples in sorted(self.latencies.items())
+        }
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, data: Dataset, headers: dict, seed: int):
+        self.client = client
+        self.recorder = recorder
+        self.data = data
+        self.headers = headers
+        self.rng = random.Random(seed)
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """One request, recorded under `endpoint` (the route template, so ids do not split the stats)."""
+        counter = [0]
+        token = _current_request.set(counter)
+        started = time.perf_counter()
+        try:
+            res = await self.client.request(method, url, headers=self.headers, **kwargs)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            _current_request.reset(token)
+        self.recorder.latencies[endpoint].append(elapsed)
+        self.recorder.statements[endpoint].append(counter[0])
+        if res.status_code >= 400:
+            self.recorder.errors[endpoint] += 1
+            raise RuntimeError(f"{method} {url}: {res.status_code} {res.text[:200]}")
+        return res
+
+    async def lifecycle(self):
+        rng, data = self.rng, self.data
+        project = rng.choice(data.projects)
+        lines = [{"itemId": item_id, "quantity": float(rng.randint(1, 50))} for item_id in rng.sample(data.items, 4)]
+
+        mr = (await self.call("POST /api/material-requests", "POST", "/api/material-requests",
+                              json={"projectId": project, "notes": None, "items": lines})).json()
+        # Technical approval has no endpoint; flip it the way the approver's tool would
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(models.MaterialRequest).where(models.MaterialRequest.id == mr["id"])
+                             .values(status="APPROVED_TECHNICAL"))
+            await db.commit()
+
+        deadline = (datetime.datetime.utcnow() + datetime.timedelta(days=14)).isoformat()
+        rfq = (await self.call("POST /api/rfqs", "POST", "/api/rfqs",
+                               json={"materialRequestId": mr["id"], "deadline": deadline})).json()
+        quotes = []
+        for supplier in rng.sample(data.suppliers, 3):
+            quotes.append((await self.call("POST /api/quotations", "POST", "/api/quotations", json={
+                "rfqId": rfq["id"], "supplierId": supplier, "leadTimeDays": rng.randint(3, 30),
+                "items": [{"itemId": line["itemId"], "unitPrice": round(rng.uniform(5, 500), 2)} for line in lines],
+            })).json())
+        await self.call("GET /api/rfqs/{id}/comparison", "GET", f"/api/rfqs/{rfq['id']}/comparison")
+        po = (await self.call("POST /api/rfqs/{id}/select-winner", "POST", f"/api/rfqs/{rfq['id']}/select-winner",
+                              json={"quotationId": rng.choice(quotes)["id"]})).json()
+        await self.call("PUT /api/purchase-orders/{id}/approve", "PUT", f"/api/purchase-orders/{po['id']}/approve")
+        await self.call("POST /api/receipts", "POST", "/api/receipts", json={
+            "poId": po["id"], "items": [{"itemId": line["itemId"], "quantity": line["quantity"]} for line in po["items"]],
+        })
+        await self.call("POST /api/invoices", "POST", "/api/invoices", json={
+            "poId": po["id"], "supplierInvoiceNumber": f"LT-{po['id'][:8]}", "totalAmount": po["total_amount"],
+        })
+
+    async def browse(self):
+        project = self.rng.choice(self.data.projects)
+        await self.call("GET /api/purchase-orders", "GET", f"/api/purchase-orders?limit=50&project_id={project}")
+        await self.call("GET /api/purchase-orders?status", "GET", "/api/purchase-orders?limit=50&status=PENDING_APPROVAL")
+        await self.call("GET /api/material-requests", "GET", f"/api/material-requests?limit=50&project_id={project}")
+        await self.call("GET /api/rfqs?status", "GET", "/api/rfqs?limit=50&status=OPEN")
+        await self.call("GET /api/invoices?status", "GET", "/api/invoices?limit=50&status=MISMATCH")
+        await self.call("GET /api/projects/{id}/financials", "GET", f"/api/projects/{project}/financials")
+        await self.call("GET /api/projects/{id}/boq/progress", "GET", f"/api/projects/{project}/boq/progress")
+        await self.call("GET /api/dashboard", "GET", "/api/dashboard")
+
+
+async def run_scenario(name: str, data: Dataset, headers: dict, users: int, iterations: int) -> dict:
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        virtual_users = [VirtualUser(client, recorder, data, headers, seed=n) for n in range(users)]
+        await getattr(virtual_users[0], name)()  # warm-up pass, not recorded
+        recorder.__init__()
+
+        failures: List[str] = []
+
+        async def loop(user: VirtualUser):
+            for _ in range(iterations):
+                try:
+                    await getattr(user, name)()
+                except RuntimeError as e:  # a failed step abandons the pass; the rest of the run goes on
+                    failures.append(str(e))
+
+        started = time.perf_counter()
+        await asyncio.gather(*[loop(user) for user in virtual_users])
+        wall = time.perf_counter() - started
+    endpoints = recorder.summary(wall)
+    total = sum(e["requests"] for e in endpoints.values())
+    return {"wall_s": round(wall, 2), "passes_per_s": round((users * iterations - len(failures)) / wall, 2),
+            "failed_passes": len(failures), "first_failure": failures[0] if failures else None,
+            "requests": total, "rps": round(total / wall, 1), "endpoints": endpoints}
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    regressions = []
+    for scenario, now in results.items():
+        before = baseline.get(scenario)
+        if before is None:
+            continue
+        if now["failed_passes"] > before.get("failed_passes", 0):
+            regressions.append(f"{scenario}: {before.get('failed_passes', 0)} -> {now['failed_passes']} failed passes")
+        if now["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{scenario}: {before['rps']:.1f} -> {now['rps']:.1f} requests/s")
+        for endpoint, stats in now["endpoints"].items():
+            old = before["endpoints"].get(endpoint)
+            if old is None:
+                continue
+            if stats["sql_per_request"] > old["sql_per_request"] + 0.5:
+                regressions.append(f"{endpoint}: {old['sql_per_request']} -> {stats['sql_per_request']} SQL/request")
+            # Absolute floor: a few ms of scheduler jitter on a fast endpoint is not a regression
+            if stats["p99_ms"] > old["p99_ms"] * (1 + tolerance) and stats["p99_ms"] - old["p99_ms"] > 5.0:
+                regressions.append(f"{endpoint}: p99 {old['p99_ms']:.1f} -> {stats['p99_ms']:.1f} ms")
+    return regressions
+
+
+def _print(name: str, result: dict, users: int, iterations: int):
+    print(f"\n{name}: {users} users x {iterations} passes in {result['wall_s']:.1f}s, "
+          f"{result['passes_per_s']:.1f} passes/s, {result['rps']:.0f} requests/s")
+    if result["failed_passes"]:
+        print(f"{result['failed_passes']} failed pass(es), first: {result['first_failure']}")
+    print(f"{'endpoint':<42}{'n':>6}{'req/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'sql/req':>9}")
+    for endpoint, stats in result["endpoints"].items():
+        print(f"{endpoint:<42}{stats['requests']:>6}{stats['rps']:>8.1f}{stats['p50_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+              f"{stats['sql_per_request']:>9.1f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=10, help="scripted passes per user")
+    parser.add_argument("--scale", type=float, default=0.2, help="multiplier on the default history size")
+    parser.add_argument("--years", type=float, default=3.0)
+    parser.add_argument("--scenarios", default="lifecycle,browse")
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--baseline", help="compare against an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.3)
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        data = generate(db, DatasetSize(years=args.years).scaled(args.scale))
+    print(f"dataset: {', '.join(f'{k}={v:,}' for k, v in data.counts.items())} ({time.perf_counter() - started:.0f}s)")
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _count_statement)
+    match_worker.start(SessionLocal)  # invoices are matched and audit entries written in the background, as in production
+    audit_writer.start(SessionLocal)
+    headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': data.admin_email, 'role': 'ADMIN'})}"}
+    results = {}
+    try:
+        for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+            if name not in ("lifecycle", "browse"):
+                parser.error(f"unknown scenario {name!r}")
+            results[name] = asyncio.run(run_scenario(name, data, headers, args.users, args.iterations))
+            _print(name, results[name], args.users, args.iterations)
+        match_worker.drain()
+    finally:
+        match_worker.stop()
+        audit_writer.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print("\n" + ("\n".join(f"REGRESSION {r}" for r in regressions) if regressions else "no regressions against baseline"))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""Query plans and latency of every service query on a multi-year dataset.
+
+    python -m backend.benchmarks.query_plans [--scale 1.0] [--years 3] [--repeat 5]
+                                            [--json plans.json] [--baseline plans.json] [--tolerance 0.5]
+                                            [--without-indexes]
+
+Seeds a throw-away SQLite database (or BENCH_DATABASE_URL, e.g. a scratch Postgres) with the
+benchmarks.dataset history, then for each scenario (one API call):
+  * median latency and the number of SQL statements it runs,
+  * the EXPLAIN plan of every statement, with full table scans of large tables flagged.
+--json writes the results; --baseline compares against an earlier --json run and exits 1 on a
+regression (a new full scan, more statements, or latency above baseline * (1 + tolerance)).
+--without-indexes drops the secondary indexes first, to see what they buy.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+_workdir = tempfile.mkdtemp(prefix="itqan-bench-")
+os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(_workdir, 'bench.db')}"
+os.environ.setdefault("ENV", "DEVELOPMENT")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("MATCH_WORKER_ENABLED", "false")
+os.environ.setdefault("AUDIT_WAL_DIR", os.path.join(_workdir, "audit-wal"))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from .. import auth
+from ..database import Base, SessionLocal, async_engine, engine
+from ..main import app
+from .dataset import Dataset, DatasetSize, generate
+
+# Lookup / read-model tables: scanning them is cheaper than an index probe and never grows with history
+SMALL_TABLES = frozenset({"users", "projects", "suppliers", "items", "project_boq", "project_ledger", "boq_ledger",
+                          "dashboard_stats", "table_versions", "system_settings"})
+# Analytics aggregates over the whole history by design
+_ANALYTICS_SCANS = frozenset({"purchase_orders", "po_items", "quotations", "quotation_items", "invoices", "rfqs"})
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: Callable[[Dataset], str]
+    allowed_scans: FrozenSet[str] = frozenset()
+
+
+SCENARIOS = [
+    Scenario("list_pos", "GET", lambda d: "/api/purchase-orders?limit=50"),
+    Scenario("list_pos_by_project", "GET", lambda d: f"/api/purchase-orders?limit=50&project_id={d.project_id}"),
+    Scenario("approval_queue", "GET", lambda d: f"/api/purchase-orders?limit=50&status=PENDING_APPROVAL&project_id={d.project_id}"),
+    Scenario("list_requests_by_project", "GET", lambda d: f"/api/material-requests?limit=50&project_id={d.project_id}"),
+    Scenario("open_rfqs", "GET", lambda d: "/api/rfqs?limit=50&status=OPEN"),
+    Scenario("rfq_quotations", "GET", lambda d: f"/api/quotations?rfq_id={d.rfq_id}"),
+    Scenario("rfq_comparison", "GET", lambda d: f"/api/rfqs/{d.rfq_id}/comparison"),
+    Scenario("po_receipts", "GET", lambda d: f"/api/receipts?po_id={d.po_id}"),
+    Scenario("mismatched_invoices", "GET", lambda d: "/api/invoices?limit=50&status=MISMATCH"),
+    Scenario("invoice_match_lines", "GET", lambda d: f"/api/invoices/{d.invoice_id}/match-lines"),
+    Scenario("project_boq", "GET", lambda d: f"/api/projects/{d.project_id}/boq"),
+    Scenario("project_boq_progress", "GET", lambda d: f"/api/projects/{d.project_id}/boq/progress"),
+    Scenario("project_financials", "GET", lambda d: f"/api/projects/{d.project_id}/financials"),
+    Scenario("dashboard", "GET", lambda d: "/api/dashboard"),
+    Scenario("analytics_summary", "GET", lambda d: "/api/analytics/summary", _ANALYTICS_SCANS),
+    Scenario("analytics_project", "GET", lambda d: f"/api/analytics/summary?project_id={d.project_id}", _ANALYTICS_SCANS),
+    Scenario("rematch_invoices", "POST", lambda d: "/api/admin/matching/rematch"),
+]
+
+
+@dataclass
+class Statement:
+    sql: str
+    parameters: object
+    plan: List[str] = field(default_factory=list)
+    scans: List[str] = field(default_factory=list)
+
+
+class _Recorder:
+    """Every statement the app's engine runs while active, with its parameters."""
+
+    def __init__(self, sync_engine):
+        self.sync_engine = sync_engine
+        self.statements: List[Statement] = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(Statement(statement, parameters))
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.sync_engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.sync_engine, "before_cursor_execute", self._on_execute)
+        return False
+
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?! USING)")
+_PG_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def _scanned_tables(plan: List[str]) -> List[str]:
+    tables = set()
+    for line in plan:
+        match = _SQLITE_SCAN.match(line.strip()) or _PG_SCAN.search(line)
+        if match and match.group(1) in Base.metadata.tables and match.group(1) not in SMALL_TABLES:
+            tables.add(match.group(1))
+    return sorted(tables)
+
+
+async def _explain(statements: List[Statement]):
+    # Same driver as the app (aiosqlite / asyncpg), so captured SQL and parameters replay as they are
+    sqlite = async_engine.dialect.name == "sqlite"
+    async with async_engine.connect() as conn:
+        for stmt in statements:
+            if not stmt.sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            result = await conn.exec_driver_sql(("EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN ") + stmt.sql, stmt.parameters)
+            stmt.plan = [row[-1] for row in result]
+            stmt.scans = _scanned_tables(stmt.plan)
+
+
+def run_scenario(client: TestClient, headers: dict, scenario: Scenario, data: Dataset, repeat: int) -> dict:
+    recorder = _Recorder(async_engine.sync_engine)
+    samples, statements = [], None
+    for _ in range(repeat):
+        with recorder:
+            started = time.perf_counter()
+            res = client.request(scenario.method, scenario.path(data), headers=headers)
+            samples.append((time.perf_counter() - started) * 1000)
+        if res.status_code >= 400:
+            raise RuntimeError(f"{scenario.name}: {res.status_code} {res.text[:200]}")
+        statements = statements if statements is not None else recorder.statements
+    asyncio.run(_explain(statements))
+    return {
+        "ms": round(statistics.median(samples), 2),
+        "statements": len(statements),
+        "scans": sorted({t for s in statements for t in s.scans} - scenario.allowed_scans),
+        "plans": [{"sql": " ".join(s.sql.split())[:400], "plan": s.plan} for s in statements if s.plan],
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    regressions = []
+    for name, now in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        new_scans = sorted(set(now["scans"]) - set(before["scans"]))
+        if new_scans:
+            regressions.append(f"{name}: new full scan of {', '.join(new_scans)}")
+        if now["statements"] > before["statements"]:
+            regressions.append(f"{name}: {before['statements']} -> {now['statements']} statements")
+        # Absolute floor: sub-millisecond jitter is not a regression
+        if now["ms"] > before["ms"] * (1 + tolerance) and now["ms"] - before["ms"] > 2.0:
+            regressions.append(f"{name}: {before['ms']:.1f} -> {now['ms']:.1f} ms")
+    return regressions
+
+
+def drop_secondary_indexes():
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if not index.unique:
+                index.drop(bind=engine, checkfirst=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on the default dataset size")
+    parser.add_argument("--years", type=float, default=3.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write the results here")
+    parser.add_argument("--baseline", help="compare against an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed latency growth over the baseline")
+    parser.add_argument("--without-indexes", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(bind=engine)
+    if args.without_indexes:
+        drop_secondary_indexes()
+    size = DatasetSize(years=args.years).scaled(args.scale)
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        data = generate(db, size)
+    print(f"dataset: {', '.join(f'{k}={v:,}' for k, v in data.counts.items())} ({time.perf_counter() - started:.0f}s)\n")
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': data.admin_email, 'role': 'ADMIN'})}"}
+    client.get("/api/users/me", headers=headers)  # warm the principal cache
+
+    results = {}
+    print(f"{'scenario':<28}{'ms':>9}{'sql':>6}  full scans")
+    for scenario in SCENARIOS:
+        result = results[scenario.name] = run_scenario(client, headers, scenario, data, args.repeat)
+        print(f"{scenario.name:<28}{result['ms']:>9.1f}{result['statements']:>6}  {', '.join(result['scans']) or '-'}")
+        if args.verbose:
+            for entry in result["plans"]:
+                print(f"    {entry['sql'][:120]}")
+                for line in entry["plan"]:
+                    print(f"      {line}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print("\n" + ("\n".join(f"REGRESSION {r}" for r in regressions) if regressions else "no regressions against baseline"))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
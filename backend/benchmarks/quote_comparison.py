@@ -0,0 +1,76 @@
+"""Quote comparison time for a large RFQ (GET /api/rfqs/{rfq_id}/comparison).
+
+    python -m backend.benchmarks.quote_comparison [--suppliers 40] [--lines 300] [--repeat 5]
+
+Seeds a throw-away SQLite database with one RFQ of `lines` requested items, quoted by `suppliers`
+suppliers on three lines out of four each, then reports the median of QuoteComparisonService.compare:
+loading (the RFQ plus three queries) and the in-memory ranking, separately.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+_workdir = tempfile.mkdtemp(prefix="itqan-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'bench.db')}"
+os.environ.setdefault("ENV", "DEVELOPMENT")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("MATCH_WORKER_ENABLED", "false")
+
+from sqlalchemy import insert
+
+from .. import models
+from ..database import Base, SessionLocal, engine
+from ..services.comparison_service import QuoteComparisonService
+
+
+def _seed(suppliers: int, lines: int):
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(insert(models.MaterialRequest), [{"id": "mr-1", "project_id": "p-1", "status": "IN_PROCUREMENT"}])
+        db.execute(insert(models.RequestItem), [
+            {"id": f"ri-{j}", "request_id": "mr-1", "item_id": f"i-{j}", "quantity": 1.0 + j % 5} for j in range(lines)
+        ])
+        db.execute(insert(models.RFQ), [{"id": "rfq-1", "material_request_id": "mr-1", "status": "OPEN"}])
+        db.execute(insert(models.Quotation), [
+            {"id": f"q-{i:03d}", "rfq_id": "rfq-1", "supplier_id": f"s-{i}", "total_amount": 0.0, "lead_time_days": i % 9}
+            for i in range(suppliers)
+        ])
+        db.execute(insert(models.QuotationItem), [
+            {"id": f"q-{i:03d}-{j}", "quotation_id": f"q-{i:03d}", "item_id": f"i-{j}", "unit_price": 100.0 + (i * 7 + j) % 13}
+            for i in range(suppliers) for j in range(lines) if (i + j) % 4
+        ])
+        db.commit()
+
+
+def _median_ms(fn, repeat: int) -> float:
+    # Fresh session per run, so the RFQ lookup is not served from the identity map; first run discarded
+    samples = []
+    for _ in range(repeat + 1):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            fn(db)
+            samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suppliers", type=int, default=40)
+    parser.add_argument("--lines", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    _seed(args.suppliers, args.lines)
+    load_ms = _median_ms(lambda db: QuoteComparisonService._load(db, "rfq-1"), args.repeat)
+    total_ms = _median_ms(lambda db: QuoteComparisonService.compare(db, "rfq-1"), args.repeat)
+    print(f"compare: {args.suppliers} quotations x {args.lines} lines, median of {args.repeat}\n")
+    print(f"{'step':<20}{'ms':>10}")
+    print(f"{'load':<20}{load_ms:>10.1f}")
+    print(f"{'rank':<20}{total_ms - load_ms:>10.1f}")
+    print(f"{'total':<20}{total_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
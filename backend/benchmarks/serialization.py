@@ -0,0 +1,110 @@
+"""Serialization time and bytes on the wire for GET /api/purchase-orders (list_pos).
+
+    python -m backend.benchmarks.serialization [--rows 10000] [--lines 3] [--repeat 5]
+
+Seeds a throw-away SQLite database with `rows` POs of `lines` items each, then reports
+  * the serialization step alone, per encoder, on the same loaded rows, and
+  * the full request (query + serialization + compression) per Accept-Encoding, with the bytes sent.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import statistics
+import tempfile
+import time
+from typing import List
+
+_workdir = tempfile.mkdtemp(prefix="itqan-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'bench.db')}"
+os.environ.setdefault("ENV", "DEVELOPMENT")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("MAX_PAGE_SIZE", "100000")  # one page holds every row
+os.environ.setdefault("MATCH_WORKER_ENABLED", "false")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+
+from .. import models, schemas
+from ..database import Base, SessionLocal, engine
+from ..main import app
+from ..responses import brotli, render_json
+
+
+def _seed(rows: int, lines: int):
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        db.execute(insert(models.PurchaseOrder), [
+            {"id": f"po-{i:06d}", "project_id": "p-1", "supplier_id": f"s-{i % 50}", "status": "APPROVED",
+             "total_amount": 150.0 * lines} for i in range(rows)
+        ])
+        db.execute(insert(models.POItem), [
+            {"id": f"po-{i:06d}-{j}", "po_id": f"po-{i:06d}", "item_id": f"it-{j}", "quantity": 10.0, "price": 15.0,
+             "received_quantity": 0.0} for i in range(rows) for j in range(lines)
+        ])
+        db.commit()
+
+
+def _timed(fn, repeat: int):
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def _serializers(rows: List[models.PurchaseOrder], repeat: int):
+    adapter = TypeAdapter(List[schemas.POOut])
+    validated = adapter.validate_python(rows)
+    return [
+        # What a route without the Pydantic fast path pays: model -> dict tree -> stdlib json
+        ("jsonable_encoder + json.dumps", _timed(lambda: json.dumps(jsonable_encoder(validated), ensure_ascii=False,
+                                                                    separators=(",", ":")).encode(), repeat)),
+        # response_model routes: FastAPI validates and dumps straight to bytes in pydantic-core
+        ("pydantic dump_json (response_model)", _timed(lambda: adapter.dump_json(validated), repeat)),
+        # routes returning rows / dicts (FastJSONRoute): orjson in one pass
+        ("orjson render_json", _timed(lambda: render_json(adapter.dump_python(validated)), repeat)),
+    ]
+
+
+def _wire(client: TestClient, encoding: str, repeat: int):
+    def get():
+        res = client.get("/api/purchase-orders", params={"limit": 100000}, headers={"Accept-Encoding": encoding})
+        res.raise_for_status()
+        return res
+    ms, res = _timed(get, repeat)
+    return ms, int(res.headers.get("content-length", len(res.content))), res.headers.get("content-encoding", "identity")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--lines", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    _seed(args.rows, args.lines)
+    with SessionLocal() as db:
+        rows = db.scalars(select(models.PurchaseOrder).options(*schemas.loader_options(models.PurchaseOrder, schemas.POOut))).all()
+        print(f"list_pos: {len(rows)} POs x {args.lines} lines, median of {args.repeat}\n")
+        print(f"{'serializer':<40}{'ms':>10}{'bytes':>12}")
+        for name, (ms, body) in _serializers(rows, args.repeat):
+            print(f"{name:<40}{ms:>10.1f}{len(body):>12,}")
+        print(f"{'  + gzip -6':<40}{'':>10}{len(gzip.compress(body, 6)):>12,}")
+        if brotli is not None:
+            print(f"{'  + brotli q4':<40}{'':>10}{len(brotli.compress(body, quality=4)):>12,}")
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    client = TestClient(app)
+    print(f"\n{'GET /api/purchase-orders':<40}{'ms':>10}{'wire bytes':>12}")
+    for accept in ("identity", "gzip") + (("br",) if brotli is not None else ()):
+        ms, size, encoding = _wire(client, accept, args.repeat)
+        print(f"{'Accept-Encoding: ' + accept + ' -> ' + encoding:<40}{ms:>10.1f}{size:>12,}")
+
+
+if __name__ == "__main__":
+    main()
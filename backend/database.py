@@ -1,8 +1,15 @@
-
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,18 +23,169 @@ if not SQLALCHEMY_DATABASE_URL:
     else:
         raise ValueError("FATAL: DATABASE_URL is not set. Cannot start in Production mode.")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
-)
+def to_async_url(url: str) -> str:
+    # Same database, async driver: asyncpg for Postgres, aiosqlite for SQLite dev mode
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(SQLALCHEMY_DATABASE_URL)
+
+# --- Pool Settings (env tunable) ---
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 disables
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 disables
+# PgBouncer (transaction pooling) cannot keep server-side prepared statements across clients
+PGBOUNCER_MODE = os.getenv("DB_PGBOUNCER", "false").lower() in ("1", "true", "yes")
+
+
+_stats_lock = threading.Lock()
+# Called with each checkout's wait in seconds (per-request accounting in instrumentation)
+checkout_wait_observers = []
+
+class _TimedCheckout:
+    """Records how long callers wait on pool checkout (queueing once max_overflow is reached)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_stats = {"count": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with _stats_lock:
+                self.checkout_stats["count"] += 1
+                self.checkout_stats["wait_total"] += waited
+                self.checkout_stats["wait_max"] = max(self.checkout_stats["wait_max"], waited)
+            for observer in checkout_wait_observers:
+                observer(waited)
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def _engine_kwargs(url: str, is_async: bool) -> dict:
+    if url.startswith("sqlite"):
+        # SQLite dev mode: file databases share one pool per process; in-memory ones keep SQLAlchemy's default
+        if ":memory:" in url or url.rstrip("/").endswith(":"):
+            return {"connect_args": {"check_same_thread": False}} if not is_async else {}
+        kwargs = {"poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool}
+        if not is_async:
+            kwargs["connect_args"] = {"check_same_thread": False}
+        return kwargs
+
+    kwargs = {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING,
+    }
+    if PGBOUNCER_MODE and "asyncpg" in url:
+        kwargs["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return kwargs
+
+
+def _apply_statement_timeout(sync_engine):
+    # Session-level SET is not pinned under PgBouncer transaction pooling; configure it on the role there
+    if STATEMENT_TIMEOUT_MS <= 0 or PGBOUNCER_MODE or sync_engine.dialect.name != "postgresql":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def set_statement_timeout(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {STATEMENT_TIMEOUT_MS}")
+        cursor.close()
+
+
+# Sync engine: Alembic, scripts and background jobs
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_engine_kwargs(SQLALCHEMY_DATABASE_URL, is_async=False))
+_apply_statement_timeout(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: every HTTP route
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_kwargs(ASYNC_DATABASE_URL, is_async=True))
+_apply_statement_timeout(async_engine.sync_engine)
+
+# expire_on_commit=False: rows returned by a route are serialized after the commit, outside the greenlet
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_session_factory():
+    # For responses that outlive the request scope (streaming exports open their own session)
+    return AsyncSessionLocal
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def dialect_insert(db, model):
+    """INSERT construct with ON CONFLICT support for the session's dialect, or None where unsupported."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    return None
+
+
+# Bounded retries for writes that lose an optimistic-lock or lock-wait race
+WRITE_RETRY_ATTEMPTS = int(os.getenv("WRITE_RETRY_ATTEMPTS", "4"))
+WRITE_RETRY_BACKOFF_SECONDS = float(os.getenv("WRITE_RETRY_BACKOFF_SECONDS", "0.02"))
+# Postgres serialization failure, deadlock, lock timeout
+_RETRYABLE_SQLSTATES = {"40001", "40P01", "55P03"}
+
+def is_retryable_conflict(exc: Exception) -> bool:
+    if isinstance(exc, StaleDataError):
+        return True
+    if isinstance(exc, DBAPIError):
+        orig = exc.orig
+        code = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+        return code in _RETRYABLE_SQLSTATES or "database is locked" in str(orig)
+    return False
+
+
+def pool_status(sync_engine) -> dict:
+    pool = sync_engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    stats = getattr(pool, "checkout_stats", {"count": 0, "wait_total": 0.0, "wait_max": 0.0})
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "in_use": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        "checkouts": stats["count"],
+        "checkout_wait_avg_ms": round(stats["wait_total"] / stats["count"] * 1000, 3) if stats["count"] else 0.0,
+        "checkout_wait_max_ms": round(stats["wait_max"] * 1000, 3),
+    }
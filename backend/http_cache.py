@@ -0,0 +1,195 @@
+import datetime
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import event, func, inspect, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import dialect_insert
+from .responses import render_json
+
+# Conditional GET for master data. Every commit that writes one of CACHED_TABLES bumps that table's row in
+# table_versions; list endpoints answer If-None-Match / If-Modified-Since from that single row, so an
+# unchanged catalogue costs one primary-key lookup and a 304 instead of a page of rows.
+CACHED_TABLES = ("projects", "items", "suppliers", "project_boq")
+# Tables versioned per value of a column instead: a receipt bumps only its own project's BOQ counter, so
+# receipts for different projects never queue on one row. Writes whose scope cannot be told (a bulk
+# statement without the column in its parameters or a `version_scope` execution option) bump the
+# table-wide row, which every scope's ETag includes.
+SCOPED_TABLES = {"project_boq": "project_id"}
+MASTER_DATA_MAX_AGE = int(os.getenv("MASTER_DATA_MAX_AGE_SECONDS", "0"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+_TOUCHED = "http_cache_touched_tables"
+
+
+# --- Write tracking: collect touched tables per transaction, bump their versions just before commit ---
+def _key(table_name: str, scope: Optional[str] = None) -> str:
+    return table_name if scope is None else f"{table_name}:{scope}"
+
+
+def _touch(session: Session, table_name: Optional[str], scopes=()):
+    if table_name in CACHED_TABLES:
+        keys = {_key(table_name, scope) for scope in scopes if scope is not None} if table_name in SCOPED_TABLES else set()
+        session.info.setdefault(_TOUCHED, set()).update(keys or {table_name})
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        state = inspect(obj)
+        table_name = state.mapper.local_table.name
+        column = SCOPED_TABLES.get(table_name)
+        _touch(session, table_name, state.attrs[column].history.sum() if column else ())
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement(orm_execute_state):
+    # Bulk INSERT / UPDATE / DELETE statements (imports, ledger roll-ups) never go through a flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table_name = getattr(getattr(orm_execute_state.statement, "table", None), "name", None)
+        column = SCOPED_TABLES.get(table_name)
+        scopes = []
+        if column:
+            params = orm_execute_state.parameters
+            scopes = [row.get(column) for row in (params if isinstance(params, list) else [params or {}])]
+            scopes.append(orm_execute_state.execution_options.get("version_scope"))
+        _touch(orm_execute_state.session, table_name, scopes)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_versions(session):
+    session.flush()  # objects still pending are flushed by commit after this hook; track them now
+    tables = session.info.pop(_TOUCHED, None)
+    if not tables:
+        return
+    # Taken last in the transaction, so the counter row is locked only for the commit itself
+    now = datetime.datetime.utcnow()
+    version = models.TableVersion.__table__
+    rows = [{"table_name": name, "version": 1, "updated_at": now} for name in sorted(tables)]
+    stmt = dialect_insert(session, version)
+    if stmt is not None:
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=["table_name"], set_={"version": version.c.version + 1, "updated_at": stmt.excluded.updated_at}
+        ), rows)
+        return
+    for row in rows:
+        result = session.execute(update(version).where(version.c.table_name == row["table_name"])
+                                 .values(version=version.c.version + 1, updated_at=now))
+        if result.rowcount == 0:
+            session.execute(insert(version).values(**row))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched(session):
+    session.info.pop(_TOUCHED, None)
+
+
+# --- Conditional responses ---
+async def table_version(db: AsyncSession, table: str, scope: Optional[str] = None) -> Tuple[int, Optional[datetime.datetime]]:
+    if scope is None:
+        row = (await db.execute(
+            select(models.TableVersion.version, models.TableVersion.updated_at).where(models.TableVersion.table_name == table)
+        )).first()
+        return (row.version, row.updated_at) if row else (0, None)
+    # Scoped: table-wide plus the scope's counter; both only grow, so their sum changes whenever either does
+    version, updated_at = (await db.execute(
+        select(func.sum(models.TableVersion.version), func.max(models.TableVersion.updated_at))
+        .where(models.TableVersion.table_name.in_([table, _key(table, scope)]))
+    )).one()
+    return version or 0, updated_at
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, updated_at: Optional[datetime.datetime]) -> bool:
+    if updated_at is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return updated_at.replace(microsecond=0, tzinfo=datetime.timezone.utc) <= since
+
+
+async def conditional_get(request: Request, response: Response, db: AsyncSession, table: str,
+                          scope: Optional[str] = None) -> Tuple[Optional[Response], str]:
+    """Set ETag / Last-Modified / Cache-Control on `response`; return a 304 when the client's copy is current.
+
+    The ETag covers the table version (of `scope` for SCOPED_TABLES) and the full query string, so every
+    page / filter has its own tag.
+    """
+    version, updated_at = await table_version(db, table, scope)
+    variant = hashlib.sha1(f"{request.url.path}?{request.url.query}".encode()).hexdigest()[:12]
+    etag = f'W/"{table}-{version}-{variant}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={MASTER_DATA_MAX_AGE}, must-revalidate"}
+    if updated_at is not None:
+        headers["Last-Modified"] = format_datetime(updated_at.replace(tzinfo=datetime.timezone.utc), usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, etag)
+    else:
+        fresh = _not_modified_since(request.headers.get("if-modified-since", ""), updated_at)
+    return (Response(status_code=304, headers=headers) if fresh else None), etag
+
+
+# --- In-process response cache (item catalogue) ---
+class ResponseCache:
+    """Serialized response bodies keyed by ETag; a table version bump makes old keys unreachable."""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, body: bytes, headers: dict):
+        with self._lock:
+            self._entries[key] = (body, headers)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+item_catalog_cache = ResponseCache()
+
+
+async def serve_cached(cache: ResponseCache, key: str, response: Response, produce) -> Response:
+    """Return the cached body for `key`, or await `produce()` (rows or a JSONResponse) and cache its bytes."""
+    hit = cache.get(key)
+    if hit is None:
+        result = await produce()
+        if isinstance(result, Response):
+            body, extra = result.body, {k: v for k, v in result.headers.items() if k.startswith("x-")}
+        else:
+            body, extra = render_json(result), {}
+        extra.update({k: v for k, v in response.headers.items() if k.startswith("x-")})  # pagination headers
+        hit = (body, extra)
+        cache.set(key, body, extra)
+    body, extra = hit
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    return Response(content=body, media_type="application/json", headers={**headers, **extra})
@@ -0,0 +1,213 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Idempotency-Key support for POST routes under /api.
+# The first request with a key runs normally and its response is stored (compressed) for IDEMPOTENCY_TTL_SECONDS;
+# a retry with the same key, caller and route gets the stored response back without reaching the route.
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "50000"))
+IDEMPOTENCY_MAX_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", str(256 * 1024)))
+IDEMPOTENCY_REDIS_URL = os.getenv("IDEMPOTENCY_REDIS_URL")
+PENDING_TTL = 60.0  # a crashed request frees its key after this long
+
+HEADER = b"idempotency-key"
+REPLAY_HEADER = b"idempotent-replayed"
+MAX_KEY_LENGTH = 255
+_EXCLUDED_PATHS = ("/api/auth/login",)  # never keep issued tokens around
+# Transient answers the client is expected to retry: not stored
+_UNCACHED_STATUSES = {409, 429}
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str = ""
+    status: int = 0
+    headers: List[Tuple[bytes, bytes]] = field(default_factory=list)
+    body: bytes = b""  # zlib-compressed
+    pending: bool = True
+
+
+class MemoryIdempotencyStore:
+    """In-process TTL + LRU store (single worker or sticky sessions)."""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, StoredResponse]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str) -> Optional[StoredResponse]:
+        """Claim `key` for a new request; returns the existing entry instead if there is one."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+            self._entries[key] = (now + PENDING_TTL, StoredResponse())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return None
+
+    def complete(self, key: str, response: StoredResponse):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, response)
+
+    def release(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisIdempotencyStore:
+    """Shared store for multi-worker deployments (SET NX claims the key across processes)."""
+
+    PREFIX = "itqan:idem:"
+
+    def __init__(self, url: str, ttl: float = IDEMPOTENCY_TTL):
+        import redis  # optional dependency, only needed for multi-worker deployments
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+
+    @staticmethod
+    def _dump(response: StoredResponse) -> str:
+        return json.dumps({
+            "f": response.fingerprint, "s": response.status, "p": response.pending,
+            "h": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in response.headers],
+            "b": base64.b64encode(response.body).decode(),
+        })
+
+    @staticmethod
+    def _load(raw: bytes) -> StoredResponse:
+        data = json.loads(raw)
+        return StoredResponse(fingerprint=data["f"], status=data["s"], pending=data["p"],
+                              headers=[(k.encode("latin-1"), v.encode("latin-1")) for k, v in data["h"]],
+                              body=base64.b64decode(data["b"]))
+
+    def reserve(self, key: str) -> Optional[StoredResponse]:
+        if self.client.set(self.PREFIX + key, self._dump(StoredResponse()), nx=True, ex=int(PENDING_TTL)):
+            return None
+        raw = self.client.get(self.PREFIX + key)
+        return self._load(raw) if raw else StoredResponse()
+
+    def complete(self, key: str, response: StoredResponse):
+        self.client.set(self.PREFIX + key, self._dump(response), ex=self.ttl)
+
+    def release(self, key: str):
+        self.client.delete(self.PREFIX + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.PREFIX + "*"):
+            self.client.delete(key)
+
+
+idempotency_store = MemoryIdempotencyStore()
+if IDEMPOTENCY_REDIS_URL:
+    try:
+        idempotency_store = RedisIdempotencyStore(IDEMPOTENCY_REDIS_URL)
+    except Exception as e:
+        logger.error(f"Shared idempotency store unavailable, using per-process store: {e}")
+
+
+def _json_response(send, status: int, detail: str, extra_headers=()):
+    body = json.dumps({"detail": detail}).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *extra_headers]
+    async def respond():
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+    return respond()
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware: request bodies are hashed as they stream through, never buffered."""
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith("/api/") \
+                or scope["path"] in _EXCLUDED_PATHS:
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        raw_key = headers.get(HEADER)
+        if raw_key is None:
+            return await self.app(scope, receive, send)
+        if not raw_key or len(raw_key) > MAX_KEY_LENGTH:
+            return await _json_response(send, 400, f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+
+        store = self.store or idempotency_store
+        # Keys are scoped to the caller and the route: two users can never see each other's responses
+        caller = hashlib.sha256(headers.get(b"authorization", b"")).hexdigest()
+        key = hashlib.sha256(b"\0".join([caller.encode(), scope["path"].encode(), raw_key])).hexdigest()
+        digest = hashlib.sha256()
+        body_done = False
+
+        async def hashing_receive():
+            nonlocal body_done
+            message = await receive()
+            if message["type"] == "http.request":
+                digest.update(message.get("body", b""))
+                body_done = not message.get("more_body", False)
+            return message
+
+        async def drain_body():
+            while not body_done:
+                if (await hashing_receive())["type"] != "http.request":
+                    break
+
+        existing = store.reserve(key)
+        if existing is not None:
+            if existing.pending:
+                return await _json_response(send, 409, "A request with this Idempotency-Key is still in progress",
+                                            [(b"retry-after", b"1")])
+            await drain_body()
+            if digest.hexdigest() != existing.fingerprint:
+                return await _json_response(send, 422, "Idempotency-Key was already used with a different request body")
+            await send({"type": "http.response.start", "status": existing.status,
+                        "headers": existing.headers + [(REPLAY_HEADER, b"true")]})
+            await send({"type": "http.response.body", "body": zlib.decompress(existing.body)})
+            return
+
+        captured = StoredResponse(pending=False)
+        chunks: List[bytes] = []
+        size = 0
+
+        async def capturing_send(message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                captured.status = message["status"]
+                captured.headers = [(k, v) for k, v in message.get("headers", []) if k.lower() != b"set-cookie"]
+            elif message["type"] == "http.response.body" and size <= IDEMPOTENCY_MAX_BODY_BYTES:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                chunks.append(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, hashing_receive, capturing_send)
+        except BaseException:
+            store.release(key)
+            raise
+        await drain_body()
+        if captured.status >= 500 or captured.status in _UNCACHED_STATUSES or size > IDEMPOTENCY_MAX_BODY_BYTES:
+            store.release(key)
+            return
+        captured.fingerprint = digest.hexdigest()
+        captured.body = zlib.compress(b"".join(chunks))
+        store.complete(key, captured)
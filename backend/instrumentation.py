@@ -0,0 +1,278 @@
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import database
+
+logger = logging.getLogger(__name__)
+
+# Per-request instrumentation.
+# RequestTimingMiddleware opens a RequestStats for every HTTP request. It lives in a ContextVar, so it
+# follows the request into AsyncSession greenlets and threadpool handlers; engine events add SQL count and
+# time, the pool adds checkout wait, and FastJSONRoute adds handler and serialization time. The totals go
+# out as a Server-Timing header and into per-route histograms rendered at /metrics (Prometheus text format).
+TIMING_ENABLED = os.getenv("REQUEST_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_MAX_SQL_CHARS = 1000
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+class RequestStats:
+    __slots__ = ("scope", "started", "sql_count", "db_seconds", "pool_wait_seconds", "handler_seconds",
+                 "serialize_seconds", "endpoint_returned")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self.handler_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.endpoint_returned: Optional[float] = None
+
+    @property
+    def route(self) -> str:
+        """Route template (bounded label set); "unmatched" until / unless routing finds one."""
+        route = (self.scope or {}).get("route")
+        return getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+
+    def server_timing(self) -> str:
+        total = (time.perf_counter() - self.started) * 1000
+        return (f'db;dur={self.db_seconds * 1000:.1f};desc="{self.sql_count} queries", '
+                f"pool;dur={self.pool_wait_seconds * 1000:.1f}, app;dur={self.handler_seconds * 1000:.1f}, "
+                f"serialize;dur={self.serialize_seconds * 1000:.1f}, total;dur={total:.1f}")
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# --- Handler / serialization split (called by responses.FastJSONRoute) ---
+def endpoint_started() -> float:
+    return time.perf_counter()
+
+
+def endpoint_finished(started: float):
+    stats = _current.get()
+    if stats is not None:
+        now = time.perf_counter()
+        stats.handler_seconds += now - started
+        stats.endpoint_returned = now
+
+
+def response_ready():
+    # Whatever ran between the endpoint returning and the response object existing is serialization
+    stats = _current.get()
+    if stats is not None and stats.endpoint_returned is not None:
+        stats.serialize_seconds += time.perf_counter() - stats.endpoint_returned
+        stats.endpoint_returned = None
+
+
+# --- Slow query log ---
+def _type_runs(values) -> str:
+    runs: List[Tuple[str, int]] = []
+    for value in values:
+        name = type(value).__name__
+        if runs and runs[-1][0] == name:
+            runs[-1] = (name, runs[-1][1] + 1)
+        else:
+            runs.append((name, 1))
+    return ", ".join(name if count == 1 else f"{name} x {count}" for name, count in runs)
+
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """Types, not values, of the bound parameters: safe to log, and enough to spot an unbounded IN list."""
+    if executemany and isinstance(parameters, (list, tuple)):
+        return f"{len(parameters)} x {parameter_shape(parameters[0])}" if parameters else "[]"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return f"({_type_runs(parameters)})"
+    return type(parameters).__name__
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        route = stats.route if stats is not None else "-"
+        metrics.slow_query(route)
+        logger.warning("Slow query %.1fms route=%s params=%s sql=%s", elapsed * 1000, route,
+                       parameter_shape(parameters, executemany), " ".join(statement.split())[:SLOW_QUERY_MAX_SQL_CHARS])
+
+
+def _checkout_waited(seconds: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+
+database.checkout_wait_observers.append(_checkout_waited)
+
+
+# --- Metrics ---
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last: above the largest bucket
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+class MetricsRegistry:
+    # name -> (help, buckets)
+    HISTOGRAMS = {
+        "http_request_duration_seconds": ("Time to the end of the response, per route.", LATENCY_BUCKETS),
+        "http_request_db_seconds": ("Time spent executing SQL, per request.", LATENCY_BUCKETS),
+        "http_request_sql_statements": ("SQL statements executed, per request.", STATEMENT_BUCKETS),
+        "http_request_pool_wait_seconds": ("Time waiting for a pooled connection, per request.", LATENCY_BUCKETS),
+        "http_request_handler_seconds": ("Time inside the route function, per request.", LATENCY_BUCKETS),
+        "http_request_serialization_seconds": ("Time serializing the route's return value, per request.", LATENCY_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self._requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self._slow_queries: Dict[str, int] = defaultdict(int)
+
+    def _histogram(self, name: str, method: str, route: str) -> Histogram:
+        key = (name, method, route)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(self.HISTOGRAMS[name][1])
+        return histogram
+
+    def observe_request(self, method: str, status: int, stats: RequestStats, duration: float):
+        route = stats.route
+        with self._lock:
+            self._requests[(method, route, status)] += 1
+            for name, value in (("http_request_duration_seconds", duration), ("http_request_db_seconds", stats.db_seconds),
+                                ("http_request_sql_statements", stats.sql_count),
+                                ("http_request_pool_wait_seconds", stats.pool_wait_seconds),
+                                ("http_request_handler_seconds", stats.handler_seconds),
+                                ("http_request_serialization_seconds", stats.serialize_seconds)):
+                self._histogram(name, method, route).observe(value)
+
+    def slow_query(self, route: str):
+        with self._lock:
+            self._slow_queries[route] += 1
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._requests.clear()
+            self._slow_queries.clear()
+
+    def render(self, gauges: Optional[Dict[str, Tuple[str, Dict[str, dict]]]] = None) -> str:
+        lines = []
+        with self._lock:
+            lines += ["# HELP http_requests_total Requests served, per route and status.", "# TYPE http_requests_total counter"]
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+            lines += ["# HELP db_slow_queries_total Statements slower than SLOW_QUERY_MS, per route.",
+                      "# TYPE db_slow_queries_total counter"]
+            for route, count in sorted(self._slow_queries.items()):
+                lines.append(f"db_slow_queries_total{{{_labels(route=route)}}} {count}")
+            for name, (help_text, buckets) in self.HISTOGRAMS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (metric, method, route), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    labels = _labels(method=method, route=route)
+                    cumulative = 0
+                    for bound, count in zip(buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative + histogram.counts[-1]}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {cumulative + histogram.counts[-1]}")
+        for name, (help_text, series) in (gauges or {}).items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            for labels, value in series.items():
+                lines.append(f"{name}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def pool_gauges(engines: Dict[str, Engine]) -> Dict[str, Tuple[str, Dict[str, float]]]:
+    """database.pool_status of each engine as Prometheus gauges."""
+    fields = {"in_use": "db_pool_connections_in_use", "checked_in": "db_pool_connections_idle",
+              "overflow": "db_pool_overflow", "checkout_wait_max_ms": "db_pool_checkout_wait_max_ms"}
+    gauges = {name: (f"Connection pool {field.replace('_', ' ')}.", {}) for field, name in fields.items()}
+    for pool_name, sync_engine in engines.items():
+        status = database.pool_status(sync_engine)
+        for field, name in fields.items():
+            if field in status:
+                gauges[name][1][_labels(pool=pool_name)] = status[field]
+    return gauges
+
+
+class RequestTimingMiddleware:
+    """Pure ASGI middleware: one RequestStats per HTTP request, Server-Timing header, /metrics histograms."""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING_ENABLED):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TIMING_ENABLED:
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status = 500
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    message = {**message, "headers": list(message.get("headers", [])) +
+                               [(b"server-timing", stats.server_timing().encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _current.reset(token)
+            metrics.observe_request(scope["method"], status, stats, time.perf_counter() - stats.started)
@@ -1,9 +1,16 @@
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from .routers import api
-from .database import engine  # Keep engine for DB connection check if needed, but DO NOT import Base to create_all
+from .services.matching_service import match_worker
+from .services.audit_service import audit_writer
+from .idempotency import IdempotencyMiddleware
+from .responses import CompressionMiddleware
+from .instrumentation import RequestTimingMiddleware, metrics, pool_gauges
+from .profiling import ProfilingMiddleware
+from .database import engine, async_engine, pool_status, SessionLocal  # Keep engine for DB connection check if needed, but DO NOT import Base to create_all
+from contextlib import asynccontextmanager
 import os
 import logging
 
@@ -11,7 +18,27 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Itqan Enterprise API", version="2.2.0")
+# Background three-way-match worker (sync engine, like the other jobs)
+MATCH_WORKER_ENABLED = os.getenv("MATCH_WORKER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Batched audit log writer; when disabled, entries wait in the write-ahead log for a process that runs it
+AUDIT_WRITER_ENABLED = os.getenv("AUDIT_WRITER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MATCH_WORKER_ENABLED:
+        match_worker.start(SessionLocal)
+    if AUDIT_WRITER_ENABLED:
+        audit_writer.start(SessionLocal)
+    yield
+    match_worker.drain(timeout=5.0)
+    match_worker.stop()
+    audit_writer.stop()  # after the matcher, so its last entries are flushed too
+
+app = FastAPI(title="Itqan Enterprise API", version="2.2.0", lifespan=lifespan)
+
+# Retried POSTs carrying an Idempotency-Key get the first response back instead of running twice.
+# Registered before CORS so replayed responses still pass through the CORS middleware.
+app.add_middleware(IdempotencyMiddleware)
 
 # Security: CORS Hardening
 # Strict origin check required for credentials. No "*" allowed.
@@ -23,9 +50,23 @@ app.add_middleware(
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Authorization", "Content-Type"],
+    allow_headers=["Authorization", "Content-Type", "Idempotency-Key", "If-None-Match", "If-Modified-Since", "X-Profile"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Estimated", "Idempotent-Replayed", "ETag", "Last-Modified",
+                    "Server-Timing", "X-Profile-Id"],
 )
 
+# gzip / brotli above RESPONSE_COMPRESSION_MIN_BYTES. Outside CORS and idempotency, so idempotent replays
+# are stored uncompressed and compressed on the way out like any other response.
+app.add_middleware(CompressionMiddleware)
+
+# Opt-in sampling profiler (X-Profile header / armed by an admin); a flag check per request when off.
+# Inside the timing middleware, outside the rest, so the stacks cover CORS, idempotency and compression too.
+app.add_middleware(ProfilingMiddleware)
+
+# Per-request SQL count / DB time / pool wait / handler / serialization: Server-Timing header and /metrics.
+# Outermost, so the total includes every other middleware.
+app.add_middleware(RequestTimingMiddleware)
+
 # Global Exception Handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -43,3 +84,14 @@ app.include_router(api.router)
 @app.get("/health")
 def health_check():
     return {"status": "healthy", "mode": "production"}
+
+@app.get("/metrics/pool")
+def pool_metrics():
+    # Request pool (async) and job pool (sync): checkout wait, in-use and overflow counts
+    return {"async": pool_status(async_engine.sync_engine), "sync": pool_status(engine)}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # Prometheus text format: per-route request histograms plus pool gauges
+    return PlainTextResponse(metrics.render(pool_gauges({"async": async_engine.sync_engine, "sync": engine})),
+                             media_type="text/plain; version=0.0.4")
@@ -1,7 +1,7 @@
 
 import uuid
 import datetime
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text, Enum, Date
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Text, Enum, Date, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 from .database import Base
@@ -9,6 +9,10 @@ from .database import Base
 def generate_uuid():
     return str(uuid.uuid4())
 
+def partial_index(name, *columns, where: str):
+    # Partial index on both Postgres and SQLite; other dialects get the plain index
+    return Index(name, *columns, postgresql_where=text(where), sqlite_where=text(where))
+
 # --- RBAC & Users ---
 class User(Base):
     __tablename__ = "users"
@@ -32,6 +36,7 @@ class Supplier(Base):
     email = Column(String)
     phone = Column(String)
     rating = Column(Float, default=5.0)
+    match_tolerance = Column(Float, nullable=True)  # invoice vs GRN tolerance; overrides the project's
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 class Item(Base):
@@ -52,6 +57,7 @@ class Project(Base):
     budget = Column(Float, default=0.0)
     spent = Column(Float, default=0.0)
     status = Column(String, default="ACTIVE")
+    match_tolerance = Column(Float, nullable=True)  # invoice vs GRN tolerance; falls back to MATCH_TOLERANCE_DEFAULT
     
     boq_items = relationship("ProjectBOQ", back_populates="project")
 
@@ -61,11 +67,14 @@ class ProjectBOQ(Base):
     project_id = Column(String, ForeignKey("projects.id"))
     item_id = Column(String, ForeignKey("items.id"))
     total_quantity = Column(Float, default=0.0)
-    received_quantity = Column(Float, default=0.0) 
+    received_quantity = Column(Float, default=0.0)  # rolled up from receipts by LedgerService.record_receipt
     
     project = relationship("Project", back_populates="boq_items")
     item = relationship("Item")
 
+    # One line per item and project: receipts roll into it, imports upsert on it
+    __table_args__ = (Index("ix_project_boq_project_item", "project_id", "item_id", unique=True),)
+
 # --- Procurement Lifecycle ---
 
 class MaterialRequest(Base):
@@ -80,6 +89,13 @@ class MaterialRequest(Base):
     requester = relationship("User", back_populates="material_requests")
     items = relationship("RequestItem", back_populates="request", cascade="all, delete-orphan")
 
+    # List filters + keyset order (created_at, id)
+    __table_args__ = (
+        Index("ix_material_requests_project_created", "project_id", "created_at", "id"),
+        Index("ix_material_requests_status_created", "status", "created_at", "id"),
+        Index("ix_material_requests_requester", "requester_id"),
+    )
+
 class RequestItem(Base):
     __tablename__ = "request_items"
     id = Column(String, primary_key=True, default=generate_uuid)
@@ -90,6 +106,8 @@ class RequestItem(Base):
     request = relationship("MaterialRequest", back_populates="items")
     item = relationship("Item")
 
+    __table_args__ = (Index("ix_request_items_request", "request_id"),)
+
 class RFQ(Base):
     __tablename__ = "rfqs"
     id = Column(String, primary_key=True, default=generate_uuid)
@@ -98,9 +116,19 @@ class RFQ(Base):
     status = Column(String, default="OPEN")
     deadline = Column(DateTime)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     quotations = relationship("Quotation", back_populates="rfq")
 
+    __table_args__ = (
+        Index("ix_rfqs_material_request", "material_request_id"),
+        Index("ix_rfqs_status_created", "status", "created_at", "id"),
+        partial_index("ix_rfqs_open_deadline", "deadline", where="status = 'OPEN'"),  # late-RFQ scan
+    )
+
+    # Optimistic locking: an UPDATE from a stale read matches no row and raises StaleDataError
+    __mapper_args__ = {"version_id_col": version}
+
 class Quotation(Base):
     __tablename__ = "quotations"
     id = Column(String, primary_key=True, default=generate_uuid)
@@ -109,11 +137,28 @@ class Quotation(Base):
     total_amount = Column(Float)
     currency = Column(String, default="SAR")
     valid_until = Column(DateTime, nullable=True)
+    lead_time_days = Column(Integer, nullable=True)  # default for lines that do not quote their own
     is_selected = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     rfq = relationship("RFQ", back_populates="quotations")
     supplier = relationship("Supplier")
+    items = relationship("QuotationItem", back_populates="quotation", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_quotations_rfq", "rfq_id", "created_at", "id"),
+        Index("ix_quotations_supplier", "supplier_id"),
+    )
+
+class QuotationItem(Base):
+    __tablename__ = "quotation_items"
+    id = Column(String, primary_key=True, default=generate_uuid)
+    quotation_id = Column(String, ForeignKey("quotations.id"), index=True)
+    item_id = Column(String, ForeignKey("items.id"))
+    unit_price = Column(Float, nullable=False)
+    lead_time_days = Column(Integer, nullable=True)
+
+    quotation = relationship("Quotation", back_populates="items")
 
 class PurchaseOrder(Base):
     __tablename__ = "purchase_orders"
@@ -126,11 +171,24 @@ class PurchaseOrder(Base):
     status = Column(String, default="PENDING_APPROVAL")
     total_amount = Column(Float, default=0.0)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     items = relationship("POItem", back_populates="po", cascade="all, delete-orphan")
     supplier = relationship("Supplier")
     project = relationship("Project")
 
+    __table_args__ = (
+        Index("ix_purchase_orders_created", "created_at", "id"),
+        Index("ix_purchase_orders_project_created", "project_id", "created_at", "id"),
+        Index("ix_purchase_orders_status_created", "status", "created_at", "id"),
+        Index("ix_purchase_orders_supplier", "supplier_id"),
+        Index("ix_purchase_orders_material_request", "material_request_id"),
+        # Approval queue per project: pending POs only, a small fraction of the table
+        partial_index("ix_purchase_orders_pending_approval", "project_id", "created_at", "id", where="status = 'PENDING_APPROVAL'"),
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
 class POItem(Base):
     __tablename__ = "po_items"
     id = Column(String, primary_key=True, default=generate_uuid)
@@ -139,10 +197,18 @@ class POItem(Base):
     quantity = Column(Float, nullable=False)
     price = Column(Float, nullable=False)
     received_quantity = Column(Float, default=0.0)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     po = relationship("PurchaseOrder", back_populates="items")
     item = relationship("Item")
 
+    __table_args__ = (
+        Index("ix_po_items_po", "po_id"),
+        Index("ix_po_items_item", "item_id"),
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
 class Receipt(Base):
     __tablename__ = "receipts"
     id = Column(String, primary_key=True, default=generate_uuid)
@@ -152,6 +218,8 @@ class Receipt(Base):
     
     items = relationship("ReceiptItem", back_populates="receipt", cascade="all, delete-orphan")
 
+    __table_args__ = (Index("ix_receipts_po_received", "po_id", "received_date", "id"),)
+
 class ReceiptItem(Base):
     __tablename__ = "receipt_items"
     id = Column(String, primary_key=True, default=generate_uuid)
@@ -162,6 +230,8 @@ class ReceiptItem(Base):
     receipt = relationship("Receipt", back_populates="items")
     item = relationship("Item")
 
+    __table_args__ = (Index("ix_receipt_items_receipt", "receipt_id"),)
+
 class Invoice(Base):
     __tablename__ = "invoices"
     id = Column(String, primary_key=True, default=generate_uuid)
@@ -171,6 +241,66 @@ class Invoice(Base):
     status = Column(String, default="PENDING_MATCH")
     match_status_details = Column(Text)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Result of the last three-way match (MatchingService)
+    grn_value = Column(Float, nullable=True)
+    variance = Column(Float, nullable=True)
+    match_tolerance = Column(Float, nullable=True)
+    matched_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_invoices_po", "po_id"),
+        Index("ix_invoices_created", "created_at", "id"),
+        Index("ix_invoices_status_created", "status", "created_at", "id"),
+        # Re-match sweep walks unmatched invoices by id
+        partial_index("ix_invoices_unmatched", "id", where="status IN ('PENDING_MATCH', 'MISMATCH')"),
+    )
+
+class InvoiceMatchLine(Base):
+    """Per PO line breakdown of an invoice's last match: invoice total allocated by ordered value vs received value."""
+    __tablename__ = "invoice_match_lines"
+    invoice_id = Column(String, ForeignKey("invoices.id"), primary_key=True)
+    po_item_id = Column(String, ForeignKey("po_items.id"), primary_key=True)
+    item_id = Column(String, ForeignKey("items.id"))
+    ordered_quantity = Column(Float, default=0.0)
+    received_quantity = Column(Float, default=0.0)
+    unit_price = Column(Float, default=0.0)
+    received_value = Column(Float, default=0.0)
+    billed_amount = Column(Float, default=0.0)
+    variance = Column(Float, default=0.0)
+
+# --- Financial Ledger (maintained incrementally by LedgerService) ---
+class ProjectLedger(Base):
+    __tablename__ = "project_ledger"
+    project_id = Column(String, ForeignKey("projects.id"), primary_key=True)
+    committed_amount = Column(Float, default=0.0)  # approved PO value
+    received_amount = Column(Float, default=0.0)   # value of goods received (GRN)
+    invoiced_amount = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class BOQLedger(Base):
+    __tablename__ = "boq_ledger"
+    project_id = Column(String, ForeignKey("projects.id"), primary_key=True)
+    item_id = Column(String, ForeignKey("items.id"), primary_key=True)
+    ordered_quantity = Column(Float, default=0.0)
+    committed_amount = Column(Float, default=0.0)
+    received_quantity = Column(Float, default=0.0)
+    received_amount = Column(Float, default=0.0)
+
+class DashboardStat(Base):
+    """Dashboard read model: one counter per (metric, key), kept current by DashboardService at commit."""
+    __tablename__ = "dashboard_stats"
+    metric = Column(String, primary_key=True)  # e.g. pos.status, approvals.band, spend.project
+    key = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+    amount = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class TableVersion(Base):
+    """Write counter per cached table, bumped at commit by http_cache; drives ETag / Last-Modified."""
+    __tablename__ = "table_versions"
+    table_name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 class SystemSettings(Base):
     __tablename__ = "system_settings"
@@ -187,4 +317,14 @@ class AuditLog(Base):
     action = Column(String)
     details = Column(Text)
     category = Column(String)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    entity_id = Column(String)  # the PO / RFQ / invoice the action changed
+    # Range-partitioned by month on Postgres (migration 0003); every review query bounds it
+    timestamp = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+    # Newest-first keyset order (timestamp, id), behind each review filter
+    __table_args__ = (
+        Index("ix_audit_logs_timestamp", "timestamp", "id"),
+        Index("ix_audit_logs_user_time", "user_id", "timestamp", "id"),
+        Index("ix_audit_logs_entity_time", "entity_id", "timestamp", "id"),
+        Index("ix_audit_logs_category_time", "category", "action", "timestamp", "id"),
+    )
@@ -0,0 +1,201 @@
+import base64
+import datetime
+import json
+import os
+import time
+import threading
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import and_, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from .responses import FastJSONResponse
+from .schemas import loader_options
+
+# Keyset pagination shared by every list endpoint.
+# The body stays a plain JSON array (the React views expect lists); paging metadata travels in headers.
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+COUNT_CACHE_TTL = float(os.getenv("LIST_COUNT_TTL_SECONDS", "30"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+COUNT_ESTIMATED_HEADER = "X-Total-Count-Estimated"
+
+
+class PageParams:
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="Opaque cursor taken from the X-Next-Cursor header"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        fields: Optional[str] = Query(None, description="Comma separated list of fields to return"),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime.datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+# --- Total count cache ---
+class _CountCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def set(self, key: str, value: int):
+        with self._lock:
+            if len(self._entries) > 1024:
+                self._entries.clear()
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = _CountCache(COUNT_CACHE_TTL)
+
+
+def _count_key(stmt) -> str:
+    try:
+        return str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    except Exception:
+        compiled = stmt.compile()
+        return f"{compiled}|{sorted(compiled.params.items())!r}"
+
+
+async def _estimated_count(db: AsyncSession, stmt, table) -> Optional[int]:
+    # Postgres keeps a planner estimate per table; good enough for an unfiltered list header.
+    if stmt.whereclause is not None or db.bind.dialect.name != "postgresql":
+        return None
+    estimate = await db.scalar(
+        text("SELECT reltuples::bigint FROM pg_class WHERE relname = :name"), {"name": table.name}
+    )
+    return int(estimate) if estimate is not None and estimate >= 0 else None
+
+
+async def total_count(db: AsyncSession, stmt, table) -> Tuple[int, bool]:
+    key = _count_key(stmt)
+    cached = count_cache.get(key)
+    if cached is not None:
+        return cached, True
+    estimate = await _estimated_count(db, stmt, table)
+    if estimate is not None:
+        count_cache.set(key, estimate)
+        return estimate, True
+    exact = await db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery()))
+    count_cache.set(key, exact)
+    return exact, False
+
+
+# --- Projection ---
+def _allowed_fields(model, schema) -> set:
+    if schema is not None:
+        return set(schema.model_fields.keys())
+    return {c.key for c in model.__mapper__.column_attrs}
+
+
+def _check_fields(model, schema, fields):
+    allowed = _allowed_fields(model, schema)
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+
+def _attribute_for(schema, field: str) -> str:
+    if schema is None:
+        return field
+    alias = schema.model_fields[field].validation_alias
+    return alias if isinstance(alias, str) else field
+
+
+def _column_projection(model, schema, fields) -> Optional[list]:
+    # Only plain columns can be projected straight off the rows (and trimmed with load_only).
+    columns = {c.key for c in model.__mapper__.column_attrs}
+    attrs = [_attribute_for(schema, f) for f in fields]
+    return attrs if all(a in columns for a in attrs) else None
+
+
+def _project(rows, schema, fields, attrs):
+    if attrs is not None:
+        return [{f: getattr(row, a) for f, a in zip(fields, attrs)} for row in rows]
+    return [schema.model_validate(row).model_dump(include=set(fields)) for row in rows]
+
+
+async def paginate(db: AsyncSession, stmt, page: PageParams, response: Response, *, sort_column=None, schema=None):
+    """Apply keyset pagination on (sort_column, id) and optional `fields=` projection to a select().
+
+    Returns the ORM rows for the route's response_model, or a FastJSONResponse when a projection is requested.
+    """
+    model = stmt.column_descriptions[0]["entity"]
+    id_column = model.id
+    keys = (sort_column, id_column) if sort_column is not None else (id_column,)
+    if page.fields:
+        _check_fields(model, schema, page.fields)
+
+    # Totals are only reported on the first page; following pages reuse the client's copy.
+    count, estimated = await total_count(db, stmt, model.__table__) if not page.cursor else (None, False)
+
+    if page.cursor:
+        values = decode_cursor(page.cursor, len(keys))
+        if sort_column is not None:
+            try:
+                last_sort = datetime.datetime.fromisoformat(values[0])
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            stmt = stmt.where(or_(
+                sort_column > last_sort,
+                and_(sort_column == last_sort, id_column > values[1]),
+            ))
+        else:
+            stmt = stmt.where(id_column > values[0])
+
+    attrs = _column_projection(model, schema, page.fields) if page.fields else None
+    if attrs is not None:
+        stmt = stmt.options(load_only(*[getattr(model, a) for a in set(attrs) | {k.key for k in keys}]))
+    elif schema is not None:
+        stmt = stmt.options(*loader_options(model, schema))
+
+    rows = (await db.scalars(stmt.order_by(*keys).limit(page.limit + 1))).all()
+    has_more = len(rows) > page.limit
+    rows = rows[:page.limit]
+
+    headers = {}
+    if has_more:
+        last = rows[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(*[getattr(last, k.key) for k in keys])
+    if count is not None:
+        headers[TOTAL_COUNT_HEADER] = str(count)
+        if estimated:
+            headers[COUNT_ESTIMATED_HEADER] = "1"
+
+    if page.fields:
+        return FastJSONResponse(content=_project(rows, schema, page.fields, attrs), headers=headers)
+
+    response.headers.update(headers)
+    return rows
@@ -0,0 +1,305 @@
+import asyncio
+import collections
+import contextvars
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Opt-in sampling profiler for single requests.
+# A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or matches a window an admin armed
+# (POST /api/admin/profiling), within PROFILE_RATE_PER_MINUTE and PROFILE_MAX_CONCURRENT. While it is in
+# flight a background thread samples the stacks of the threads serving it every PROFILE_INTERVAL_MS:
+# the event loop thread only while the request's own task is the one running (other requests share that
+# thread), plus threadpool workers running its sync endpoint. Samples are folded into collapsed stacks
+# ("frame;frame;frame count"), the input format of flamegraph.pl / speedscope / inferno, kept in memory
+# for GET /api/admin/profiling/{id} and written to PROFILE_DIR when set.
+# Off (no token, nothing armed) it costs one attribute check per request; the sampler thread only runs
+# while a profile is active.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN") or None
+PROFILE_DIR = os.getenv("PROFILE_DIR") or None
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_RATE_PER_MINUTE = float(os.getenv("PROFILE_RATE_PER_MINUTE", "6"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_MAX_DEPTH = 200
+ARM_MAX_SECONDS = 3600
+
+# CPython keeps the running task per loop here; without it every loop-thread sample is kept
+_current_tasks = getattr(asyncio.tasks, "_current_tasks", None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse(frame, root=None) -> str:
+    """Leaf-to-root walk up to (and including) `root`, rendered root first and ';'-separated.
+
+    A stack that ends before reaching `root` is running in a greenlet (AsyncSession.run_sync), whose
+    frames are not chained to the task that switched into it; it is grafted under "(greenlet)".
+    """
+    labels = []
+    while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        if frame is root:
+            break
+        frame = frame.f_back
+    else:
+        if root is not None and frame is None:
+            labels += ["(greenlet)", _frame_label(root)]
+    return ";".join(reversed(labels))
+
+
+class Profile:
+    __slots__ = ("id", "method", "path", "scope", "trigger", "created_at", "started", "duration", "loop", "task",
+                 "loop_thread", "roots", "stacks", "samples")
+
+    def __init__(self, scope: dict, trigger: str, root_frame):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.scope = scope
+        self.trigger = trigger
+        self.created_at = time.time()
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.loop_thread = threading.get_ident()
+        self.roots: Dict[int, object] = {self.loop_thread: root_frame}  # thread id -> frame the stacks start at
+        self.stacks: Dict[str, int] = collections.Counter()
+        self.samples = 0
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route") if self.scope is not None else None
+        return getattr(route, "path_format", None) or getattr(route, "path", None) or self.path
+
+    def sample(self, frames: dict):
+        for thread_id, root in list(self.roots.items()):
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            if thread_id == self.loop_thread and _current_tasks is not None and _current_tasks.get(self.loop) is not self.task:
+                continue  # the loop is idle or running another request
+            self.stacks[collapse(frame, root)] += 1
+            self.samples += 1
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+        self.roots.clear()  # drop the frame references
+        self.scope = {"route": self.scope.get("route")}
+        self.loop = self.task = None
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items(), key=lambda kv: -kv[1]))
+
+    def summary(self) -> dict:
+        return {"id": self.id, "method": self.method, "path": self.path, "route": self.route, "trigger": self.trigger,
+                "samples": self.samples, "durationMs": round((self.duration or 0.0) * 1000, 1),
+                "createdAt": self.created_at}
+
+
+_current: contextvars.ContextVar[Optional[Profile]] = contextvars.ContextVar("profile", default=None)
+
+
+def enter_thread():
+    """Adds the calling worker thread to the current request's profile (responses.FastJSONRoute, sync endpoints)."""
+    profile = _current.get()
+    if profile is not None:
+        profile.roots[threading.get_ident()] = sys._getframe(1)
+    return profile
+
+
+def exit_thread(profile: Optional[Profile]):
+    if profile is not None:
+        profile.roots.pop(threading.get_ident(), None)
+
+
+class _Sampler:
+    """One daemon thread for all active profiles; exits when the last one finishes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: List[Profile] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: Profile):
+        with self._lock:
+            if profile in self._active:
+                self._active.remove(profile)
+
+    def _run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active)
+            frames = sys._current_frames()
+            frames.pop(own, None)
+            for profile in active:
+                profile.sample(frames)
+            del frames
+            time.sleep(interval)
+
+
+class Profiler:
+    """Decides which requests are profiled (token header, armed window, rate limit) and keeps the results."""
+
+    def __init__(self, token: Optional[str] = PROFILE_TOKEN, rate_per_minute: float = PROFILE_RATE_PER_MINUTE,
+                 max_concurrent: int = PROFILE_MAX_CONCURRENT, keep: int = PROFILE_KEEP, directory: Optional[str] = PROFILE_DIR):
+        self.token = token
+        self.rate_per_minute = rate_per_minute
+        self.max_concurrent = max_concurrent
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._sampler = _Sampler()
+        self._recent: "collections.OrderedDict[str, Profile]" = collections.OrderedDict()
+        self._keep = keep
+        self._running = 0
+        self._allowance = rate_per_minute
+        self._refilled = time.monotonic()
+        self.armed = 0  # requests left in the armed window; checked on every request, so a plain int
+        self._arm_path = "/"
+        self._arm_method: Optional[str] = None
+        self._arm_until = 0.0
+        self.skipped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.armed > 0 or self.token is not None
+
+    def arm(self, path_prefix: str, method: Optional[str], count: int, seconds: float) -> dict:
+        with self._lock:
+            self._arm_path, self._arm_method = path_prefix, method.upper() if method else None
+            self._arm_until = time.monotonic() + min(seconds, ARM_MAX_SECONDS)
+            self.armed = count
+        return self.status()
+
+    def disarm(self) -> dict:
+        with self._lock:
+            self.armed = 0
+        return self.status()
+
+    def _trigger(self, scope) -> Optional[str]:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == b"x-profile":
+                    if hmac.compare_digest(value, self.token.encode()):
+                        return "header"
+                    break
+        if self.armed > 0:
+            if time.monotonic() > self._arm_until:
+                self.armed = 0
+            elif scope["path"].startswith(self._arm_path) and self._arm_method in (None, scope["method"]):
+                return "armed"
+        return None
+
+    def _take_allowance(self) -> bool:
+        now = time.monotonic()
+        self._allowance = min(self.rate_per_minute, self._allowance + (now - self._refilled) * self.rate_per_minute / 60)
+        self._refilled = now
+        if self._allowance < 1 or self._running >= self.max_concurrent:
+            return False
+        self._allowance -= 1
+        return True
+
+    def start(self, scope, root_frame) -> Optional[Profile]:
+        with self._lock:
+            trigger = self._trigger(scope)
+            if trigger is None:
+                return None
+            if not self._take_allowance():
+                self.skipped += 1
+                return None
+            if trigger == "armed":
+                self.armed -= 1
+            self._running += 1
+        profile = Profile(scope, trigger, root_frame)
+        self._sampler.add(profile)
+        return profile
+
+    def finish(self, profile: Profile):
+        self._sampler.remove(profile)
+        profile.finish()
+        with self._lock:
+            self._running -= 1
+            self._recent[profile.id] = profile
+            while len(self._recent) > self._keep:
+                self._recent.popitem(last=False)
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(os.path.join(self.directory, f"{profile.id}.folded"), "w") as f:
+                    f.write(profile.folded())
+            except OSError:
+                logger.exception("Could not write profile %s", profile.id)
+        logger.info("Profiled %s %s: %d samples in %.1fms (id=%s)", profile.method, profile.route, profile.samples,
+                    profile.duration * 1000, profile.id)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return self._recent.get(profile_id)
+
+    def status(self) -> dict:
+        with self._lock:
+            armed = self.armed if time.monotonic() <= self._arm_until else 0
+            return {"armed": armed, "pathPrefix": self._arm_path if armed else None, "method": self._arm_method if armed else None,
+                    "headerEnabled": self.token is not None, "running": self._running, "skipped": self.skipped,
+                    "profiles": [p.summary() for p in reversed(self._recent.values())]}
+
+    def clear(self):
+        with self._lock:
+            self.armed = 0
+            self.skipped = 0
+            self._recent.clear()
+            self._allowance = self.rate_per_minute
+            self._refilled = time.monotonic()
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware: samples the requests the profiler selects and returns X-Profile-Id on them."""
+
+    def __init__(self, app, profiler: Profiler = profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled:
+            return await self.app(scope, receive, send)
+        profile = self.profiler.start(scope, sys._getframe())
+        if profile is None:
+            return await self.app(scope, receive, send)
+        token = _current.set(profile)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current.reset(token)
+            self.profiler.finish(profile)
@@ -0,0 +1,217 @@
+import functools
+import inspect
+import json
+import os
+import zlib
+from typing import Any, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+
+from . import instrumentation, profiling
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder, same bytes
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip is offered without it
+    brotli = None
+
+# JSON rendering and compression for API responses.
+# Routes with a response_model already go through Pydantic's single-pass dump_json (FastAPI's fast path,
+# which a custom response_class would switch off). Routes without one (ORM rows, plain dicts) are
+# rendered here by orjson in one pass instead of jsonable_encoder + json.dumps.
+COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))  # dynamic content: fast over smallest
+_COMPRESSIBLE_TYPES = (b"application/json", b"text/", b"application/x-ndjson", b"application/javascript")
+
+
+def _default(obj: Any):
+    # Mirrors jsonable_encoder for the types routes actually return
+    if hasattr(obj, "_sa_instance_state"):
+        return {k: v for k, v in vars(obj).items() if not k.startswith("_sa")}
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json", by_alias=True)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return jsonable_encoder(obj)
+
+
+def render_json(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson; accepts ORM rows and Pydantic models as they are."""
+
+    def render(self, content: Any) -> bytes:
+        return render_json(content)
+
+
+def _render_result(result, values: dict, status_code: Optional[int]):
+    if isinstance(result, Response):
+        return result
+    # Same status / header merge FastAPI applies for the injected `response: Response` parameter
+    sub_response = next((v for v in values.values() if isinstance(v, Response)), None)
+    response = FastJSONResponse(result, status_code=(sub_response and sub_response.status_code) or status_code or 200)
+    if sub_response is not None:
+        response.headers.raw.extend(sub_response.headers.raw)
+    return response
+
+
+class FastJSONRoute(APIRoute):
+    """Route class for routers whose endpoints return ORM rows / dicts without a response_model.
+
+    Also splits each request's time into handler (the endpoint function) and serialization (everything
+    from its return to the finished response object) for the request instrumentation.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        response_model = kwargs.get("response_model")
+        if isinstance(response_model, DefaultPlaceholder):
+            response_model = response_model.value
+        endpoint = self._timed(endpoint)
+        if response_model is None and "return" not in getattr(endpoint, "__annotations__", {}):
+            endpoint = self._direct(endpoint, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            instrumentation.response_ready()
+            return response
+        return timed_handler
+
+    @staticmethod
+    def _timed(endpoint):
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def timed(**values):
+                started = instrumentation.endpoint_started()
+                try:
+                    return await endpoint(**values)
+                finally:
+                    instrumentation.endpoint_finished(started)
+        else:
+            @functools.wraps(endpoint)
+            def timed(**values):
+                started = instrumentation.endpoint_started()
+                profile = profiling.enter_thread()  # threadpool worker: sampled too when the request is profiled
+                try:
+                    return endpoint(**values)
+                finally:
+                    profiling.exit_thread(profile)
+                    instrumentation.endpoint_finished(started)
+        return timed
+
+    @staticmethod
+    def _direct(endpoint, status_code: Optional[int]):
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def direct(**values):
+                return _render_result(await endpoint(**values), values, status_code)
+        else:
+            @functools.wraps(endpoint)
+            def direct(**values):
+                return _render_result(endpoint(**values), values, status_code)
+        return direct
+
+
+# --- Compression ---
+def _accepted_encoding(accept_encoding: str) -> Optional[str]:
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    for encoding in (("br",) if brotli is not None else ()) + ("gzip",):
+        if offered.get(encoding, offered.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + (self._compressor.finish() if final else self._compressor.flush())
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware: gzip / brotli (when installed) for responses of COMPRESSION_MIN_BYTES and up.
+
+    Single-body responses are compressed in one go once their size is known; streamed bodies (exports)
+    are compressed chunk by chunk so the stream keeps flowing.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = _accepted_encoding(dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                headers = dict((k.lower(), v) for k, v in message.get("headers", []))
+                content_type = headers.get(b"content-type", b"")
+                passthrough = (b"content-encoding" in headers or message["status"] in (204, 304)
+                               or not content_type.startswith(_COMPRESSIBLE_TYPES))
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                encoder = _Encoder(encoding)
+                headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in (b"content-length", b"vary")]
+                vary = [v for k, v in start.get("headers", []) if k.lower() == b"vary"] + [b"Accept-Encoding"]
+                headers += [(b"content-encoding", encoding.encode()), (b"vary", b", ".join(vary))]
+                if not more_body:
+                    compressed = encoder.compress(body, final=True)
+                    headers.append((b"content-length", str(len(compressed)).encode()))
+                    await send({**start, "headers": headers})
+                    return await send({"type": "http.response.body", "body": compressed})
+                await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": encoder.compress(body, final=not more_body), "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
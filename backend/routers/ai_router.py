@@ -1,33 +1,35 @@
-
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends
 from pydantic import BaseModel
-import os
-import google.generativeai as genai
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+from ..ai_client import ai_client, analysis_key
+from ..database import get_db
+from ..services.analytics_service import ProcurementAnalyticsService
+from ..services.procurement_service import AsyncProcurementService
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# Configure GenAI on Server Side
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+router = APIRouter()
 
 class AnalysisRequest(BaseModel):
     context_data: dict
     prompt_type: str
 
 @router.post("/analyze")
-async def analyze_data(request: AnalysisRequest):
+async def analyze_data(request: AnalysisRequest, db: AsyncSession = Depends(get_db)):
+    project_id = request.context_data.get("projectId")
+    summary = await AsyncProcurementService.procurement_summary(db, project_id if isinstance(project_id, str) else None)
+    context = ProcurementAnalyticsService.prompt_context(summary)
     try:
-        model = genai.GenerativeModel('gemini-pro')
-        
         prompt = f"""
-        Act as a procurement expert system (Itqan). Analyze the following data JSON:
-        {request.context_data}
+        Act as a procurement expert system (Itqan). Analyze the following procurement summary JSON:
+        {context}
         
         Task: Provide a concise executive summary in Arabic regarding risks, budget adherence, or anomalies.
         """
-        
-        response = model.generate_content(prompt)
-        return {"text": response.text}
+        text = await ai_client.generate(prompt, key=analysis_key("executive-summary", context))
+        return {"text": text}
     except Exception as e:
-        print(f"AI Error: {e}")
-        # Fallback for demo if key is missing or quota exceeded
-        return {"text": "النظام يعمل بكفاءة (محاكاة: لم يتم ضبط مفتاح Gemini في السيرفر)."}
+        logger.warning(f"AI Error: {e}")
+        # No model (missing key, quota, timeout): answer from the local analytics
+        return {"text": ProcurementAnalyticsService.describe(summary)}
@@ -1,161 +1,339 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from typing import List
+from datetime import datetime
+from typing import List, Literal, Optional
 from .. import models, auth, database, schemas
-from ..services.procurement_service import ProcurementService
-import google.generativeai as genai
-import os
+from ..ai_client import ai_client, analysis_key
+from ..auth_cache import Principal, principal_cache, token_key
+from ..http_cache import conditional_get, item_catalog_cache, serve_cached
+from ..pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, PageParams, paginate
+from ..profiling import profiler
+from ..responses import FastJSONRoute
+from ..services.procurement_service import AsyncProcurementService
+from ..services.analytics_service import ProcurementAnalyticsService
+from ..services.audit_service import AuditService
+from ..services.ledger_service import LedgerService
+from ..services.export_service import MEDIA_TYPES, ExportFilters, ExportService
+from ..services.import_service import ImportService, detect_format, item_values, project_values, supplier_values
 
-router = APIRouter(prefix="/api")
+# Routes without a response_model are rendered by orjson straight from their ORM rows / dicts
+router = APIRouter(prefix="/api", route_class=FastJSONRoute)
 get_db = database.get_db
 
 # --- Auth ---
-async def get_current_user(token: str = Depends(auth.oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(auth.oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    key = token_key(token)
+    principal = principal_cache.get(key)
+    if principal is not None:
+        return principal
     try:
         payload = auth.jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
         email = payload.get("sub")
         if email is None: raise HTTPException(status_code=401)
     except:
         raise HTTPException(status_code=401, detail="Token invalid")
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None: raise HTTPException(status_code=401)
-    return user
+    user = await db.scalar(select(models.User).where(models.User.email == email))
+    if user is None or not user.is_active: raise HTTPException(status_code=401)
+    principal = Principal.from_user(user)
+    principal_cache.set(key, principal, token_exp=payload.get("exp"))
+    return principal
 
-async def get_admin_user(current_user: models.User = Depends(get_current_user)):
+async def get_admin_user(current_user: Principal = Depends(get_current_user)):
     if current_user.role != "ADMIN":
         raise HTTPException(status_code=403, detail="Admins only")
     return current_user
 
 @router.post("/auth/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.password_hash):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == form_data.username))
+    if not user:
         raise HTTPException(status_code=401, detail="Incorrect credentials")
+    valid, new_hash = await auth.verify_password_async(form_data.password, user.password_hash)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Incorrect credentials")
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
     return {"access_token": auth.create_access_token(data={"sub": user.email, "role": user.role}), "token_type": "bearer"}
 
 @router.get("/users/me", response_model=schemas.UserOut)
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     return current_user
 
 # --- Master Data ---
+# List endpoints answer conditional GETs (If-None-Match / If-Modified-Since) from the table's version row
 @router.get("/projects")
-def get_projects(db: Session = Depends(get_db)): return db.query(models.Project).all()
+async def get_projects(request: Request, response: Response, page: PageParams = Depends(), status: Optional[str] = None,
+                       db: AsyncSession = Depends(get_db)):
+    not_modified, _ = await conditional_get(request, response, db, "projects")
+    if not_modified: return not_modified
+    q = select(models.Project)
+    if status: q = q.where(models.Project.status == status)
+    return await paginate(db, q, page, response)
 
 @router.get("/projects/{project_id}/boq", response_model=List[schemas.ProjectBOQOut])
-def get_project_boq(project_id: str, db: Session = Depends(get_db)):
-    return ProcurementService.get_project_boq(db, project_id)
+async def get_project_boq(project_id: str, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    not_modified, _ = await conditional_get(request, response, db, "project_boq", project_id)
+    if not_modified: return not_modified
+    return await AsyncProcurementService.get_project_boq(db, project_id)
+
+@router.get("/projects/{project_id}/boq/progress", response_model=List[schemas.BOQProgressOut])
+async def get_boq_progress(project_id: str, db: AsyncSession = Depends(get_db)):
+    return await AsyncProcurementService.get_boq_progress(db, project_id)
+
+@router.get("/projects/{project_id}/financials", response_model=schemas.ProjectFinancialsOut)
+async def get_project_financials(project_id: str, db: AsyncSession = Depends(get_db)):
+    return await AsyncProcurementService.get_project_financials(db, project_id)
 
 @router.post("/projects")
-def create_project(proj: schemas.ProjectCreate, db: Session = Depends(get_db), user: models.User = Depends(get_admin_user)):
-    db_proj = models.Project(**proj.dict())
+async def create_project(proj: schemas.ProjectCreate, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_admin_user)):
+    db_proj = models.Project(**project_values(proj))
     db.add(db_proj)
-    db.commit()
-    db.refresh(db_proj)
+    await db.commit()
+    await db.refresh(db_proj)
     return db_proj
 
 @router.get("/suppliers")
-def get_suppliers(db: Session = Depends(get_db)): return db.query(models.Supplier).all()
+async def get_suppliers(request: Request, response: Response, page: PageParams = Depends(), db: AsyncSession = Depends(get_db)):
+    not_modified, _ = await conditional_get(request, response, db, "suppliers")
+    if not_modified: return not_modified
+    return await paginate(db, select(models.Supplier), page, response, sort_column=models.Supplier.created_at)
 
 @router.post("/suppliers")
-def create_supplier(sup: schemas.SupplierCreate, db: Session = Depends(get_db)):
-    db_sup = models.Supplier(**sup.dict())
+async def create_supplier(sup: schemas.SupplierCreate, db: AsyncSession = Depends(get_db)):
+    db_sup = models.Supplier(**supplier_values(sup))
     db.add(db_sup)
-    db.commit()
+    await db.commit()
     return db_sup
 
 @router.get("/items")
-def get_items(db: Session = Depends(get_db)): return db.query(models.Item).all()
+async def get_items(request: Request, response: Response, page: PageParams = Depends(), category: Optional[str] = None,
+                    db: AsyncSession = Depends(get_db)):
+    not_modified, etag = await conditional_get(request, response, db, "items")
+    if not_modified: return not_modified
+    q = select(models.Item)
+    if category: q = q.where(models.Item.category == category)
+    # The catalogue is read far more than written: keep serialized pages per ETag
+    return await serve_cached(item_catalog_cache, etag, response, lambda: paginate(db, q, page, response))
 
 @router.post("/items")
-def create_item(item: schemas.ItemCreate, db: Session = Depends(get_db)):
-    db_item = models.Item(**item.dict())
+async def create_item(item: schemas.ItemCreate, db: AsyncSession = Depends(get_db)):
+    db_item = models.Item(**item_values(item))
     db.add(db_item)
-    db.commit()
+    await db.commit()
+    item_catalog_cache.clear()
     return db_item
 
-@router.get("/users")
-def get_users(db: Session = Depends(get_db)): return db.query(models.User).all()
+@router.get("/users", response_model=List[schemas.UserOut])
+async def get_users(response: Response, page: PageParams = Depends(), role: Optional[str] = None, is_active: Optional[bool] = None, db: AsyncSession = Depends(get_db)):
+    q = select(models.User)
+    if role: q = q.where(models.User.role == role)
+    if is_active is not None: q = q.where(models.User.is_active == is_active)
+    return await paginate(db, q, page, response, sort_column=models.User.created_at, schema=schemas.UserOut)
 
-@router.post("/users")
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+@router.post("/users", response_model=schemas.UserOut)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     db_user = models.User(
         name=user.name, email=user.email, role=user.role, approval_limit=user.approvalLimit,
-        password_hash=auth.get_password_hash(user.password)
+        password_hash=await auth.get_password_hash_async(user.password)
     )
     db.add(db_user)
-    db.commit()
+    await db.commit()
     return db_user
 
+# --- Bulk Import ---
+@router.post("/import/{entity}", response_model=schemas.ImportReport)
+async def bulk_import(entity: str, file: UploadFile = File(...), format: Optional[str] = None, db: AsyncSession = Depends(get_db),
+                      user: Principal = Depends(get_admin_user)):
+    # entity: items | suppliers | projects | boq. Rows are validated and written per chunk; see ImportReport.errors
+    fmt = detect_format(file.filename, format)
+    report = await ImportService.import_upload(db, entity, file.file, fmt)
+    if entity == "items": item_catalog_cache.clear()
+    return report
+
+# --- Bulk Export ---
+@router.get("/export/{entity}")
+async def bulk_export(entity: str, format: Literal["ndjson", "csv", "parquet"] = "ndjson", date_from: Optional[datetime] = None,
+                      date_to: Optional[datetime] = None, project_id: Optional[str] = None,
+                      session_factory = Depends(database.get_session_factory), user: Principal = Depends(get_current_user)):
+    # entity: purchase-orders | po-items | receipts | receipt-items | invoices
+    body = ExportService.stream(session_factory, entity, format, ExportFilters(date_from, date_to, project_id))
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{entity}.{format}"'})
+
 # --- Procurement Lifecycle ---
 @router.get("/material-requests", response_model=List[schemas.RequestOut])
-def list_requests(db: Session = Depends(get_db)): return db.query(models.MaterialRequest).all()
+async def list_requests(response: Response, page: PageParams = Depends(), status: Optional[str] = None, project_id: Optional[str] = None,
+                        requester_id: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    q = select(models.MaterialRequest)
+    if status: q = q.where(models.MaterialRequest.status == status)
+    if project_id: q = q.where(models.MaterialRequest.project_id == project_id)
+    if requester_id: q = q.where(models.MaterialRequest.requester_id == requester_id)
+    return await paginate(db, q, page, response, sort_column=models.MaterialRequest.created_at, schema=schemas.RequestOut)
 
 @router.post("/material-requests", response_model=schemas.RequestOut)
-def create_request(req: schemas.RequestCreate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    return ProcurementService.create_material_request(db, req, user.id)
+async def create_request(req: schemas.RequestCreate, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    return await AsyncProcurementService.create_material_request(db, req, user.id)
 
 # RFQ & Quotes
 @router.get("/rfqs", response_model=List[schemas.RFQOut])
-def list_rfqs(db: Session = Depends(get_db)): return db.query(models.RFQ).all()
+async def list_rfqs(response: Response, page: PageParams = Depends(), status: Optional[str] = None, material_request_id: Optional[str] = None,
+                    db: AsyncSession = Depends(get_db)):
+    q = select(models.RFQ)
+    if status: q = q.where(models.RFQ.status == status)
+    if material_request_id: q = q.where(models.RFQ.material_request_id == material_request_id)
+    return await paginate(db, q, page, response, sort_column=models.RFQ.created_at, schema=schemas.RFQOut)
 
 @router.post("/rfqs", response_model=schemas.RFQOut)
-def create_rfq(rfq: schemas.RFQCreate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    return ProcurementService.create_rfq(db, rfq, user.id)
+async def create_rfq(rfq: schemas.RFQCreate, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    return await AsyncProcurementService.create_rfq(db, rfq, user.id)
 
 @router.get("/quotations", response_model=List[schemas.QuotationOut])
-def list_quotations(db: Session = Depends(get_db)): return db.query(models.Quotation).all()
+async def list_quotations(response: Response, page: PageParams = Depends(), rfq_id: Optional[str] = None, supplier_id: Optional[str] = None,
+                          db: AsyncSession = Depends(get_db)):
+    q = select(models.Quotation)
+    if rfq_id: q = q.where(models.Quotation.rfq_id == rfq_id)
+    if supplier_id: q = q.where(models.Quotation.supplier_id == supplier_id)
+    return await paginate(db, q, page, response, sort_column=models.Quotation.created_at, schema=schemas.QuotationOut)
 
 @router.post("/quotations", response_model=schemas.QuotationOut)
-def create_quotation(quote: schemas.QuotationCreate, db: Session = Depends(get_db)):
-    return ProcurementService.create_quotation(db, quote)
+async def create_quotation(quote: schemas.QuotationCreate, db: AsyncSession = Depends(get_db)):
+    return await AsyncProcurementService.create_quotation(db, quote)
+
+@router.get("/rfqs/{rfq_id}/comparison", response_model=schemas.QuoteComparisonOut)
+async def compare_quotations(rfq_id: str, top: int = Query(3, ge=0, le=1000), db: AsyncSession = Depends(get_db)):
+    # top: offers listed per line (0 = all)
+    return await AsyncProcurementService.compare_quotations(db, rfq_id, top)
 
 @router.post("/rfqs/{rfq_id}/select-winner", response_model=schemas.POOut)
-def select_winner(rfq_id: str, selection: schemas.WinnerSelectionRequest, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    return ProcurementService.select_winning_quotation(db, rfq_id, selection.quotationId)
+async def select_winner(rfq_id: str, selection: schemas.WinnerSelectionRequest, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    return await AsyncProcurementService.select_winning_quotation(db, rfq_id, selection.quotationId, user)
 
 # POs
 @router.get("/purchase-orders", response_model=List[schemas.POOut])
-def list_pos(db: Session = Depends(get_db)): return db.query(models.PurchaseOrder).all()
+async def list_pos(response: Response, page: PageParams = Depends(), status: Optional[str] = None, project_id: Optional[str] = None,
+                   supplier_id: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    q = select(models.PurchaseOrder)
+    if status: q = q.where(models.PurchaseOrder.status == status)
+    if project_id: q = q.where(models.PurchaseOrder.project_id == project_id)
+    if supplier_id: q = q.where(models.PurchaseOrder.supplier_id == supplier_id)
+    return await paginate(db, q, page, response, sort_column=models.PurchaseOrder.created_at, schema=schemas.POOut)
 
 @router.post("/purchase-orders", response_model=schemas.POOut)
-def create_po(po: schemas.POCreate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    return ProcurementService.create_po(db, po, user.id)
+async def create_po(po: schemas.POCreate, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    return await AsyncProcurementService.create_po(db, po, user.id)
 
 @router.put("/purchase-orders/{po_id}/approve")
-def approve_po(po_id: str, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    return ProcurementService.approve_po(db, po_id, user)
+async def approve_po(po_id: str, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    return await AsyncProcurementService.approve_po(db, po_id, user)
 
 # GRN
 @router.get("/receipts", response_model=List[schemas.ReceiptOut])
-def list_receipts(db: Session = Depends(get_db)): return db.query(models.Receipt).all()
+async def list_receipts(response: Response, page: PageParams = Depends(), po_id: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    q = select(models.Receipt)
+    if po_id: q = q.where(models.Receipt.po_id == po_id)
+    return await paginate(db, q, page, response, sort_column=models.Receipt.received_date, schema=schemas.ReceiptOut)
 
-@router.post("/receipts")
-def create_receipt(rec: schemas.ReceiptCreate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
-    return ProcurementService.create_receipt(db, rec, user.id)
+@router.post("/receipts", response_model=schemas.ReceiptOut)
+async def create_receipt(rec: schemas.ReceiptCreate, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    return await AsyncProcurementService.create_receipt(db, rec, user)
 
 # Invoices
 @router.get("/invoices", response_model=List[schemas.InvoiceOut])
-def list_invoices(db: Session = Depends(get_db)): return db.query(models.Invoice).all()
+async def list_invoices(response: Response, page: PageParams = Depends(), status: Optional[str] = None, po_id: Optional[str] = None,
+                        db: AsyncSession = Depends(get_db)):
+    q = select(models.Invoice)
+    if status: q = q.where(models.Invoice.status == status)
+    if po_id: q = q.where(models.Invoice.po_id == po_id)
+    return await paginate(db, q, page, response, sort_column=models.Invoice.created_at, schema=schemas.InvoiceOut)
 
 @router.post("/invoices", response_model=schemas.InvoiceOut)
-def create_invoice(inv: schemas.InvoiceCreate, db: Session = Depends(get_db)):
-    return ProcurementService.create_invoice(db, inv)
+async def create_invoice(inv: schemas.InvoiceCreate, db: AsyncSession = Depends(get_db)):
+    return await AsyncProcurementService.create_invoice(db, inv)
 
 @router.post("/invoices/{invoice_id}/match", response_model=schemas.InvoiceOut)
-def match_invoice(invoice_id: str, db: Session = Depends(get_db)):
-    return ProcurementService.match_invoice_manually(db, invoice_id)
+async def match_invoice(invoice_id: str, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    return await AsyncProcurementService.match_invoice_manually(db, invoice_id, user)
+
+@router.get("/invoices/{invoice_id}/match-lines", response_model=List[schemas.InvoiceMatchLineOut])
+async def get_invoice_match_lines(invoice_id: str, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    return await AsyncProcurementService.get_invoice_match_lines(db, invoice_id)
+
+# --- Admin ---
+@router.post("/admin/matching/rematch", response_model=schemas.MatchRunReport)
+async def rematch_invoices(db: AsyncSession = Depends(get_db), user: Principal = Depends(get_admin_user)):
+    # Bulk re-match of every PENDING_MATCH / MISMATCH invoice, chunked set-based SQL
+    return await AsyncProcurementService.rematch_invoices(db, user)
+
+@router.post("/admin/ledger/reconcile", response_model=schemas.LedgerReconciliation)
+async def reconcile_ledger(fix: bool = False, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_admin_user)):
+    return await db.run_sync(LedgerService.reconcile, fix)
+
+# --- Dashboard ---
+@router.get("/dashboard", response_model=schemas.DashboardOut)
+async def get_dashboard(db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    # Pre-aggregated counters (dashboard_stats): a few indexed reads whatever the history size
+    return await AsyncProcurementService.get_dashboard(db)
+
+@router.post("/admin/dashboard/rebuild", response_model=schemas.DashboardOut)
+async def rebuild_dashboard(db: AsyncSession = Depends(get_db), user: Principal = Depends(get_admin_user)):
+    return await AsyncProcurementService.rebuild_dashboard(db)
+
+# --- Audit ---
+@router.get("/admin/audit", response_model=List[schemas.AuditLogOut])
+async def search_audit_log(response: Response, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                           user_id: Optional[str] = None, category: Optional[str] = None, action: Optional[str] = None,
+                           entity_id: Optional[str] = None, cursor: Optional[str] = None,
+                           limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_db),
+                           user: Principal = Depends(get_admin_user)):
+    # Newest first within [date_from, date_to) (default: the last 7 days); next page via X-Next-Cursor
+    rows, next_cursor = await db.run_sync(AuditService.search, date_from, date_to, user_id=user_id, category=category,
+                                          action=action, entity_id=entity_id, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
+# --- Profiling ---
+@router.get("/admin/profiling", response_model=schemas.ProfilerStatus)
+async def profiling_status(user: Principal = Depends(get_admin_user)):
+    return profiler.status()
+
+@router.post("/admin/profiling", response_model=schemas.ProfilerStatus)
+async def arm_profiling(arm: schemas.ProfilerArm, user: Principal = Depends(get_admin_user)):
+    # The next `count` requests under pathPrefix (within `seconds`) are sampled, subject to the rate limit
+    return profiler.arm(arm.pathPrefix, arm.method, arm.count, arm.seconds)
+
+@router.delete("/admin/profiling", response_model=schemas.ProfilerStatus)
+async def disarm_profiling(user: Principal = Depends(get_admin_user)):
+    return profiler.disarm()
+
+@router.get("/admin/profiling/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, user: Principal = Depends(get_admin_user)):
+    # Collapsed stacks: flamegraph.pl, speedscope and inferno read this as is
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile.folded())
+
+# --- Analytics & AI ---
+@router.get("/analytics/summary", response_model=schemas.ProcurementSummary)
+async def procurement_summary(project_id: Optional[str] = None, db: AsyncSession = Depends(get_db),
+                              user: Principal = Depends(get_current_user)):
+    return await AsyncProcurementService.procurement_summary(db, project_id)
 
-# --- AI ---
 @router.post("/ai/analyze")
-def ai_analyze(req: schemas.AIRequest, user: models.User = Depends(get_current_user)):
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key: return {"text": "AI Service Unavailable (Missing Key)"}
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-pro')
+async def ai_analyze(req: schemas.AIRequest, db: AsyncSession = Depends(get_db), user: Principal = Depends(get_current_user)):
+    # The model gets the locally computed summary, not the raw client payload; the summary is also the fallback
+    project_id = req.data.get("projectId") or req.data.get("project_id")
+    summary = await AsyncProcurementService.procurement_summary(db, project_id if isinstance(project_id, str) else None)
+    context = ProcurementAnalyticsService.prompt_context(summary)
     try:
-        response = model.generate_content(f"Context: {req.context}. Data: {req.data}. Analyze risks and budget.")
-        return {"text": response.text}
+        text = await ai_client.generate(f"Context: {req.context}. Procurement summary: {context}. Analyze risks and budget.",
+                                        key=analysis_key("analyze", req.context, context))
+        return {"text": text, "source": "ai"}
     except Exception as e:
-        return {"text": f"AI Error: {str(e)}"}
+        return {"text": ProcurementAnalyticsService.describe(summary), "source": "local", "detail": str(e)}
@@ -1,7 +1,8 @@
 
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, EmailStr, Field, Json
+from typing import ClassVar, Dict, List, Optional
 from datetime import datetime
+from sqlalchemy.orm import joinedload, selectinload
 
 # --- Shared ---
 class ItemBase(BaseModel):
@@ -21,15 +22,17 @@ class UserOut(BaseModel):
     name: str
     email: str
     role: str
-    approvalLimit: float
+    approvalLimit: float = Field(validation_alias="approval_limit")
     class Config:
         from_attributes = True
+        populate_by_name = True
 
 # --- Master Data ---
 class SupplierCreate(BaseModel):
     name: str
-    email: Optional[str]
-    contact: Optional[str]
+    email: Optional[str] = None
+    contact: Optional[str] = None
+    matchTolerance: Optional[float] = None
 
 class ItemCreate(BaseModel):
     name: str
@@ -42,14 +45,65 @@ class ProjectCreate(BaseModel):
     code: str
     ownerName: str
     budget: float
+    matchTolerance: Optional[float] = None
 
 class ProjectBOQOut(BaseModel):
+    id: str
+    itemId: str = Field(validation_alias="item_id")
+    totalQuantity: float = Field(validation_alias="total_quantity")
+    receivedQuantity: float = Field(validation_alias="received_quantity")
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+
+class BOQProgressOut(BaseModel):
     id: str
     itemId: str
     totalQuantity: float
     receivedQuantity: float
-    class Config:
-        from_attributes = True
+    outstandingQuantity: float
+    onOrderQuantity: float
+    percentComplete: float
+
+class ProjectFinancialsOut(BaseModel):
+    projectId: str
+    budget: float
+    committed: float
+    received: float
+    invoiced: float
+    remainingBudget: float
+    utilization: float
+
+class LedgerDiscrepancy(BaseModel):
+    table: str = "project_ledger"  # project_ledger, boq_ledger or project_boq
+    projectId: str
+    itemId: Optional[str] = None
+    boqId: Optional[str] = None
+    field: str
+    ledger: float
+    expected: float
+
+class LedgerReconciliation(BaseModel):
+    projectsChecked: int
+    fixed: bool
+    discrepancies: List[LedgerDiscrepancy] = []
+
+# --- Bulk Import ---
+class BOQLineImport(BaseModel):
+    projectCode: str
+    sku: str
+    totalQuantity: float
+
+class ImportRowError(BaseModel):
+    row: int
+    errors: List[str]
+
+class ImportReport(BaseModel):
+    entity: str
+    processed: int = 0
+    imported: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
 
 # --- PR ---
 class RequestItemCreate(ItemBase):
@@ -60,25 +114,43 @@ class RequestCreate(BaseModel):
     items: List[RequestItemCreate]
     notes: Optional[str]
 
+class RequestItemOut(BaseModel):
+    id: str
+    itemId: str = Field(validation_alias="item_id")
+    quantity: float
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+
 class RequestOut(BaseModel):
     id: str
-    projectId: str
+    projectId: str = Field(validation_alias="project_id")
     status: str
     created_at: datetime
+    items: List[RequestItemOut] = []
+    eager_load: ClassVar[Dict[str, str]] = {"items": "selectin"}
     class Config:
         from_attributes = True
+        populate_by_name = True
 
 # --- RFQ & Quotation ---
 class RFQCreate(BaseModel):
     materialRequestId: str
     deadline: datetime
 
+class QuotationItemCreate(BaseModel):
+    itemId: str
+    unitPrice: float
+    leadTimeDays: Optional[int] = None
+
 class QuotationCreate(BaseModel):
     rfqId: str
     supplierId: str
-    totalAmount: float
+    totalAmount: Optional[float] = None  # lump-sum quotes; derived from the lines when items are given
     currency: Optional[str] = "SAR"
     validUntil: Optional[datetime] = None
+    leadTimeDays: Optional[int] = None
+    items: List[QuotationItemCreate] = []
 
 class RFQOut(BaseModel):
     id: str
@@ -88,17 +160,58 @@ class RFQOut(BaseModel):
     class Config:
         from_attributes = True
 
+class QuotationItemOut(BaseModel):
+    id: str
+    itemId: str = Field(validation_alias="item_id")
+    unitPrice: float = Field(validation_alias="unit_price")
+    leadTimeDays: Optional[int] = Field(None, validation_alias="lead_time_days")
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+
 class QuotationOut(BaseModel):
     id: str
     supplier_id: str
     total_amount: float
     currency: str
     valid_until: Optional[datetime]
+    lead_time_days: Optional[int] = None
     is_selected: bool
     rfq_id: Optional[str]
+    items: List[QuotationItemOut] = []
+    eager_load: ClassVar[Dict[str, str]] = {"items": "selectin"}
     class Config:
         from_attributes = True
 
+class LineOffer(BaseModel):
+    quotationId: str
+    supplierId: str
+    unitPrice: float
+    leadTimeDays: Optional[int]
+    score: float
+    rank: int
+
+class LineComparison(BaseModel):
+    itemId: str
+    quantity: float
+    bestQuotationId: Optional[str]
+    offers: List[LineOffer] = []
+
+class SupplierRanking(BaseModel):
+    quotationId: str
+    supplierId: str
+    rating: float
+    linesQuoted: int
+    coverage: float
+    total: float
+    score: float
+    rank: int
+
+class QuoteComparisonOut(BaseModel):
+    rfqId: str
+    lines: List[LineComparison] = []
+    suppliers: List[SupplierRanking] = []
+
 class WinnerSelectionRequest(BaseModel):
     quotationId: str
 
@@ -114,13 +227,24 @@ class POCreate(BaseModel):
     quotationId: Optional[str] = None
     items: List[POItemCreate]
 
+class POItemOut(BaseModel):
+    id: str
+    itemId: str = Field(validation_alias="item_id")
+    quantity: float
+    price: float
+    receivedQuantity: float = Field(0.0, validation_alias="received_quantity")
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+
 class POOut(BaseModel):
     id: str
     total_amount: float
     status: str
     created_at: datetime
     supplier_id: str
-    items: List[POItemCreate] = [] # Simplified for list view
+    items: List[POItemOut] = []
+    eager_load: ClassVar[Dict[str, str]] = {"items": "selectin"}
     class Config:
         from_attributes = True
 
@@ -132,11 +256,21 @@ class ReceiptCreate(BaseModel):
     poId: str
     items: List[ReceiptItemCreate]
 
+class ReceiptItemOut(BaseModel):
+    id: str
+    itemId: str = Field(validation_alias="item_id")
+    quantity: float
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+
 class ReceiptOut(BaseModel):
     id: str
     po_id: str
     received_date: datetime
     received_by: str
+    items: List[ReceiptItemOut] = []
+    eager_load: ClassVar[Dict[str, str]] = {"items": "selectin"}
     class Config:
         from_attributes = True
 
@@ -153,10 +287,155 @@ class InvoiceOut(BaseModel):
     match_status_details: Optional[str]
     total_amount: float
     created_at: datetime
+    grn_value: Optional[float] = None
+    variance: Optional[float] = None
+    match_tolerance: Optional[float] = None
+    matched_at: Optional[datetime] = None
     class Config:
         from_attributes = True
 
+class InvoiceMatchLineOut(BaseModel):
+    poItemId: str = Field(validation_alias="po_item_id")
+    itemId: str = Field(validation_alias="item_id")
+    orderedQuantity: float = Field(validation_alias="ordered_quantity")
+    receivedQuantity: float = Field(validation_alias="received_quantity")
+    unitPrice: float = Field(validation_alias="unit_price")
+    receivedValue: float = Field(validation_alias="received_value")
+    billedAmount: float = Field(validation_alias="billed_amount")
+    variance: float
+    class Config:
+        from_attributes = True
+        populate_by_name = True
+
+class MatchRunReport(BaseModel):
+    processed: int = 0
+    matched: int = 0
+    mismatched: int = 0
+
+# --- Procurement analytics (pre-digested AI context) ---
+class BudgetBurn(BaseModel):
+    projectId: str
+    code: Optional[str] = None
+    budget: float
+    committed: float
+    invoiced: float
+    burn: float
+
+class SupplierShare(BaseModel):
+    supplierId: str
+    name: Optional[str] = None
+    amount: float
+    share: float
+
+class PriceOutlier(BaseModel):
+    source: str  # PO | QUOTE
+    documentId: str
+    itemId: str
+    sku: Optional[str] = None
+    price: float
+    basePrice: float
+    deviation: float
+
+class LateRFQ(BaseModel):
+    rfqId: str
+    deadline: datetime
+    daysLate: int
+    quotations: int
+
+class ProcurementSummary(BaseModel):
+    projectId: Optional[str] = None
+    totalBudget: float = 0.0
+    totalCommitted: float = 0.0
+    totalInvoiced: float = 0.0
+    projectsOverBudget: int = 0
+    projectsAtRisk: int = 0
+    budgetBurn: List[BudgetBurn] = []
+    supplierCount: int = 0
+    supplierHHI: float = 0.0
+    topSuppliers: List[SupplierShare] = []
+    priceOutlierCount: int = 0
+    priceOutliers: List[PriceOutlier] = []
+    lateRfqCount: int = 0
+    lateRfqs: List[LateRFQ] = []
+    invoiceMismatches: int = 0
+    invoiceMismatchVariance: float = 0.0
+
+# --- Dashboard ---
+class StatusTotal(BaseModel):
+    count: int = 0
+    amount: float = 0.0
+
+class ApprovalBand(BaseModel):
+    band: str
+    minAmount: float
+    maxAmount: Optional[float] = None
+    count: int = 0
+    amount: float = 0.0
+
+class SpendBucket(BaseModel):
+    key: str
+    name: Optional[str] = None
+    count: int = 0
+    amount: float = 0.0
+
+class DashboardOut(BaseModel):
+    requestsByStatus: Dict[str, int] = {}
+    rfqsByStatus: Dict[str, int] = {}
+    posByStatus: Dict[str, StatusTotal] = {}
+    invoicesByStatus: Dict[str, StatusTotal] = {}
+    pendingApprovals: List[ApprovalBand] = []
+    spendByProject: List[SpendBucket] = []
+    spendBySupplier: List[SpendBucket] = []
+    spendByMonth: List[SpendBucket] = []
+
+# --- Audit ---
+class AuditLogOut(BaseModel):
+    id: str
+    userId: Optional[str] = Field(None, validation_alias="user_id")
+    userName: Optional[str] = Field(None, validation_alias="user_name")
+    action: str
+    category: Optional[str] = None
+    entityId: Optional[str] = Field(None, validation_alias="entity_id")
+    details: Optional[Json[dict]] = None
+    timestamp: datetime
+    class Config:
+        from_attributes = True
+
+# --- Profiling ---
+class ProfilerArm(BaseModel):
+    pathPrefix: str = "/api/"
+    method: Optional[str] = None
+    count: int = Field(1, ge=1, le=100)
+    seconds: float = Field(600, gt=0, le=3600)
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    route: str
+    trigger: str
+    samples: int
+    durationMs: float
+    createdAt: float
+
+class ProfilerStatus(BaseModel):
+    armed: int
+    pathPrefix: Optional[str] = None
+    method: Optional[str] = None
+    headerEnabled: bool
+    running: int
+    skipped: int
+    profiles: List[ProfileSummary] = []
+
 # --- AI ---
 class AIRequest(BaseModel):
     data: dict
     context: str
+
+# --- Loading strategies ---
+# Out schemas that nest relationships declare `eager_load` ({relationship: "selectin" | "joined"}),
+# so endpoints returning them load every row's children in one round trip instead of one per row.
+_LOADERS = {"selectin": selectinload, "joined": joinedload}
+
+def loader_options(model, schema) -> list:
+    return [_LOADERS[strategy](getattr(model, rel)) for rel, strategy in getattr(schema, "eager_load", {}).items()]
@@ -0,0 +1,172 @@
+import datetime
+import os
+from typing import Optional
+
+from sqlalchemy import case, func, literal, select, true, union_all
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from .ledger_service import COMMITTED_STATUSES
+
+# Thresholds for what the summary flags
+BURN_WARNING = float(os.getenv("ANALYTICS_BURN_WARNING", "0.9"))  # committed / budget
+PRICE_OUTLIER_THRESHOLD = float(os.getenv("ANALYTICS_PRICE_OUTLIER_THRESHOLD", "0.25"))  # |price / base - 1|
+ANALYTICS_TOP_N = int(os.getenv("ANALYTICS_TOP_N", "5"))
+
+
+class ProcurementAnalyticsService:
+    """Deterministic procurement KPIs computed in the database, compact enough to hand to the model.
+
+    Every figure is one aggregate query (GROUP BY / SUM / COUNT over the whole table, no row-by-row
+    Python), so the summary costs the same handful of statements whatever the history size. It replaces
+    the raw dashboard payload in AI prompts and is the answer when no model is available.
+    """
+
+    @staticmethod
+    def _budget(db: Session, summary: schemas.ProcurementSummary, project_id: Optional[str], top: int):
+        project, ledger = models.Project, models.ProjectLedger
+        committed = func.coalesce(ledger.committed_amount, 0.0)
+        invoiced = func.coalesce(ledger.invoiced_amount, 0.0)
+        budget = func.coalesce(project.budget, 0.0)
+        scope = project.id == project_id if project_id else true()
+
+        totals = db.execute(
+            select(func.coalesce(func.sum(budget), 0.0), func.coalesce(func.sum(committed), 0.0),
+                   func.coalesce(func.sum(invoiced), 0.0),
+                   func.coalesce(func.sum(case((committed > budget, 1), else_=0)), 0),
+                   func.coalesce(func.sum(case(((committed >= budget * BURN_WARNING) & (committed <= budget) & (budget > 0), 1),
+                                               else_=0)), 0))
+            .select_from(project).outerjoin(ledger, ledger.project_id == project.id).where(scope)
+        ).one()
+        (summary.totalBudget, summary.totalCommitted, summary.totalInvoiced,
+         summary.projectsOverBudget, summary.projectsAtRisk) = totals
+
+        burn = committed / budget
+        for row in db.execute(
+            select(project.id, project.code, budget, committed, invoiced, burn)
+            .outerjoin(ledger, ledger.project_id == project.id)
+            .where(scope, budget > 0).order_by(burn.desc(), project.id).limit(top)
+        ):
+            summary.budgetBurn.append(schemas.BudgetBurn(projectId=row[0], code=row[1], budget=row[2], committed=row[3],
+                                                         invoiced=row[4], burn=round(row[5], 4)))
+
+    @staticmethod
+    def _suppliers(db: Session, summary: schemas.ProcurementSummary, project_id: Optional[str], top: int):
+        po = models.PurchaseOrder
+        per_supplier = (
+            select(po.supplier_id, func.sum(po.total_amount).label("amount"))
+            .where(po.status.in_(COMMITTED_STATUSES), *([po.project_id == project_id] if project_id else []))
+            .group_by(po.supplier_id)
+            .subquery()
+        )
+        count, total, squares = db.execute(
+            select(func.count(), func.coalesce(func.sum(per_supplier.c.amount), 0.0),
+                   func.coalesce(func.sum(per_supplier.c.amount * per_supplier.c.amount), 0.0))
+        ).one()
+        summary.supplierCount = count
+        # Herfindahl-Hirschman index of committed spend: 1 = single supplier, 1/n = evenly spread
+        summary.supplierHHI = round(squares / (total * total), 4) if total else 0.0
+        for supplier_id, name, amount in db.execute(
+            select(per_supplier.c.supplier_id, models.Supplier.name, per_supplier.c.amount)
+            .outerjoin(models.Supplier, models.Supplier.id == per_supplier.c.supplier_id)
+            .order_by(per_supplier.c.amount.desc(), per_supplier.c.supplier_id).limit(top)
+        ):
+            summary.topSuppliers.append(schemas.SupplierShare(supplierId=supplier_id, name=name, amount=amount,
+                                                              share=round(amount / total, 4) if total else 0.0))
+
+    @staticmethod
+    def _price_outliers(db: Session, summary: schemas.ProcurementSummary, project_id: Optional[str], top: int):
+        item, po, po_line = models.Item, models.PurchaseOrder, models.POItem
+        quote, quote_line, rfq, mr = models.Quotation, models.QuotationItem, models.RFQ, models.MaterialRequest
+
+        po_prices = (
+            select(literal("PO").label("source"), po_line.po_id.label("document_id"), po_line.item_id, po_line.price)
+            .join(po, po.id == po_line.po_id)
+            .where(*([po.project_id == project_id] if project_id else []))
+        )
+        quote_prices = (
+            select(literal("QUOTE").label("source"), quote_line.quotation_id.label("document_id"), quote_line.item_id,
+                   quote_line.unit_price.label("price"))
+            .join(quote, quote.id == quote_line.quotation_id)
+        )
+        if project_id:
+            quote_prices = (quote_prices.join(rfq, rfq.id == quote.rfq_id)
+                            .join(mr, mr.id == rfq.material_request_id).where(mr.project_id == project_id))
+        prices = union_all(po_prices, quote_prices).subquery()
+        deviation = (prices.c.price - item.base_price) / item.base_price
+        outliers = (
+            select(prices.c.source, prices.c.document_id, prices.c.item_id, item.sku, prices.c.price, item.base_price,
+                   deviation.label("deviation"))
+            .join(item, item.id == prices.c.item_id)
+            .where(item.base_price > 0, func.abs(deviation) > PRICE_OUTLIER_THRESHOLD)
+        )
+        summary.priceOutlierCount = db.scalar(select(func.count()).select_from(outliers.subquery()))
+        for row in db.execute(outliers.order_by(func.abs(deviation).desc(), prices.c.document_id).limit(top)):
+            summary.priceOutliers.append(schemas.PriceOutlier(source=row[0], documentId=row[1], itemId=row[2], sku=row[3],
+                                                              price=row[4], basePrice=row[5], deviation=round(row[6], 4)))
+
+    @staticmethod
+    def _late_rfqs(db: Session, summary: schemas.ProcurementSummary, project_id: Optional[str], top: int, now: datetime.datetime):
+        rfq, quote, mr = models.RFQ, models.Quotation, models.MaterialRequest
+        late = select(rfq.id, rfq.deadline).where(rfq.status == "OPEN", rfq.deadline < now)
+        if project_id:
+            late = late.join(mr, mr.id == rfq.material_request_id).where(mr.project_id == project_id)
+        late = late.subquery()
+        summary.lateRfqCount = db.scalar(select(func.count()).select_from(late))
+        for rfq_id, deadline, quotations in db.execute(
+            select(late.c.id, late.c.deadline, func.count(quote.id))
+            .outerjoin(quote, quote.rfq_id == late.c.id)
+            .group_by(late.c.id, late.c.deadline).order_by(late.c.deadline, late.c.id).limit(top)
+        ):
+            summary.lateRfqs.append(schemas.LateRFQ(rfqId=rfq_id, deadline=deadline, daysLate=(now - deadline).days,
+                                                    quotations=quotations))
+
+    @staticmethod
+    def _invoices(db: Session, summary: schemas.ProcurementSummary, project_id: Optional[str]):
+        inv, po = models.Invoice, models.PurchaseOrder
+        stmt = select(func.count(), func.coalesce(func.sum(func.abs(inv.variance)), 0.0)).where(inv.status == "MISMATCH")
+        if project_id:
+            stmt = stmt.join(po, po.id == inv.po_id).where(po.project_id == project_id)
+        summary.invoiceMismatches, summary.invoiceMismatchVariance = db.execute(stmt).one()
+
+    @staticmethod
+    def summarize(db: Session, project_id: Optional[str] = None, top: int = ANALYTICS_TOP_N,
+                  now: Optional[datetime.datetime] = None) -> schemas.ProcurementSummary:
+        now = now or datetime.datetime.utcnow()
+        summary = schemas.ProcurementSummary(projectId=project_id)
+        ProcurementAnalyticsService._budget(db, summary, project_id, top)
+        ProcurementAnalyticsService._suppliers(db, summary, project_id, top)
+        ProcurementAnalyticsService._price_outliers(db, summary, project_id, top)
+        ProcurementAnalyticsService._late_rfqs(db, summary, project_id, top, now)
+        ProcurementAnalyticsService._invoices(db, summary, project_id)
+        return summary
+
+    @staticmethod
+    def prompt_context(summary: schemas.ProcurementSummary) -> str:
+        """Compact JSON for the model: empty lists and zero counters are dropped."""
+        return summary.model_dump_json(exclude_defaults=True)
+
+    @staticmethod
+    def describe(summary: schemas.ProcurementSummary) -> str:
+        """Plain-text reading of the summary; the answer when no model is available."""
+        lines = []
+        if summary.totalBudget:
+            lines.append(f"Budget: {summary.totalCommitted:,.0f} committed of {summary.totalBudget:,.0f} "
+                         f"({summary.totalCommitted / summary.totalBudget:.0%}), {summary.totalInvoiced:,.0f} invoiced; "
+                         f"{summary.projectsOverBudget} project(s) over budget, {summary.projectsAtRisk} above {BURN_WARNING:.0%}.")
+        if summary.budgetBurn and summary.budgetBurn[0].burn >= BURN_WARNING:
+            worst = summary.budgetBurn[0]
+            lines.append(f"Highest burn: {worst.code or worst.projectId} at {worst.burn:.0%} of budget.")
+        if summary.topSuppliers:
+            lead = summary.topSuppliers[0]
+            lines.append(f"Suppliers: {summary.supplierCount} with committed spend; {lead.name or lead.supplierId} holds "
+                         f"{lead.share:.0%} (HHI {summary.supplierHHI:.2f}).")
+        if summary.priceOutlierCount:
+            worst = summary.priceOutliers[0]
+            lines.append(f"Price outliers: {summary.priceOutlierCount} line(s) more than {PRICE_OUTLIER_THRESHOLD:.0%} off base "
+                         f"price; worst {worst.sku or worst.itemId} at {worst.deviation:+.0%} ({worst.source} {worst.documentId}).")
+        if summary.lateRfqCount:
+            lines.append(f"Late RFQs: {summary.lateRfqCount} still open past deadline, oldest {summary.lateRfqs[0].daysLate} day(s) late.")
+        if summary.invoiceMismatches:
+            lines.append(f"Invoices: {summary.invoiceMismatches} mismatched, {summary.invoiceMismatchVariance:,.2f} total variance.")
+        return "\n".join(lines) or "No procurement risks detected."
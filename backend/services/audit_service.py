@@ -0,0 +1,400 @@
+import datetime
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import IO, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: segments are only guarded within this process
+    fcntl = None
+
+from fastapi import HTTPException
+from sqlalchemy import and_, insert, or_, select, text
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Write-ahead segments of entries not yet in audit_logs; "" keeps them in memory only
+AUDIT_WAL_DIR = os.getenv("AUDIT_WAL_DIR", "audit-wal")
+# Each entry reaches the OS before record() returns, which survives a process crash; fsync also survives
+# a power loss, at the cost of a disk flush per audited request
+AUDIT_WAL_FSYNC = os.getenv("AUDIT_WAL_FSYNC", "false").lower() in ("1", "true", "yes")
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))  # rows per multi-row INSERT; a full batch flushes early
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+AUDIT_RETRY_MAX_SECONDS = 30.0
+AUDIT_PARTITION_MONTHS_AHEAD = int(os.getenv("AUDIT_PARTITION_MONTHS_AHEAD", "3"))
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "0"))  # 0: keep everything
+AUDIT_MAX_QUERY_DAYS = int(os.getenv("AUDIT_MAX_QUERY_DAYS", "93"))
+AUDIT_DEFAULT_QUERY_DAYS = 7
+SYSTEM_ACTOR = "system"
+
+# Audited actions and their category (the review filters index on category, action)
+ACTIONS = {
+    "PO_APPROVED": "PO",
+    "WINNER_SELECTED": "RFQ",
+    "GOODS_RECEIVED": "RECEIPT",
+    "INVOICE_MATCHED": "INVOICE",
+    "INVOICE_MISMATCHED": "INVOICE",
+}
+
+
+def _month_start(moment: datetime.datetime) -> datetime.datetime:
+    return datetime.datetime(moment.year, moment.month, 1)
+
+
+def _next_month(month: datetime.datetime) -> datetime.datetime:
+    return datetime.datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _utc(moment: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    # Stored timestamps are naive UTC
+    if moment is not None and moment.tzinfo is not None:
+        return moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+class AuditService:
+    """Audit review queries and the monthly partitions behind them.
+
+    Every search is bounded to a time window (at most AUDIT_MAX_QUERY_DAYS), which on Postgres prunes
+    it to the few monthly partitions covering the window; inside them a (filter, timestamp, id) index
+    serves the newest-first keyset page directly. No total count: that is the one query that does not
+    stay fast at hundreds of millions of rows.
+    """
+
+    @staticmethod
+    def search(db: Session, date_from: Optional[datetime.datetime] = None, date_to: Optional[datetime.datetime] = None, *,
+               user_id: Optional[str] = None, category: Optional[str] = None, action: Optional[str] = None,
+               entity_id: Optional[str] = None, limit: int = 100,
+               cursor: Optional[str] = None) -> Tuple[List[models.AuditLog], Optional[str]]:
+        date_to = _utc(date_to) or datetime.datetime.utcnow()
+        date_from = _utc(date_from) or date_to - datetime.timedelta(days=AUDIT_DEFAULT_QUERY_DAYS)
+        if date_from >= date_to:
+            raise HTTPException(status_code=400, detail="date_from must be before date_to")
+        if date_to - date_from > datetime.timedelta(days=AUDIT_MAX_QUERY_DAYS):
+            raise HTTPException(status_code=400, detail=f"Time window is limited to {AUDIT_MAX_QUERY_DAYS} days")
+        if action is not None and category is None:
+            category = ACTIONS.get(action)  # keeps the (category, action, timestamp) index usable
+
+        log = models.AuditLog
+        stmt = select(log).where(log.timestamp >= date_from, log.timestamp < date_to)
+        if user_id is not None: stmt = stmt.where(log.user_id == user_id)
+        if entity_id is not None: stmt = stmt.where(log.entity_id == entity_id)
+        if category is not None: stmt = stmt.where(log.category == category)
+        if action is not None: stmt = stmt.where(log.action == action)
+        if cursor:
+            last_timestamp, last_id = decode_cursor(cursor, 2)
+            try:
+                last_timestamp = datetime.datetime.fromisoformat(last_timestamp)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            stmt = stmt.where(or_(log.timestamp < last_timestamp, and_(log.timestamp == last_timestamp, log.id < last_id)))
+
+        rows = list(db.scalars(stmt.order_by(log.timestamp.desc(), log.id.desc()).limit(limit + 1)))
+        if len(rows) <= limit:
+            return rows, None
+        last = rows[limit - 1]
+        return rows[:limit], encode_cursor(last.timestamp, last.id)
+
+    @staticmethod
+    def ensure_partitions(conn, through: datetime.datetime, since: Optional[datetime.datetime] = None) -> List[str]:
+        """Monthly partitions of audit_logs from `since` (default: this month) through `through`; Postgres only."""
+        if conn.dialect.name != "postgresql":
+            return []
+        names = []
+        month = _month_start(since or datetime.datetime.utcnow())
+        while month <= through:
+            following = _next_month(month)
+            name = f"audit_logs_{month:%Y_%m}"
+            conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF audit_logs "
+                              f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"))
+            names.append(name)
+            month = following
+        return names
+
+    @staticmethod
+    def drop_partitions_before(conn, cutoff: datetime.datetime) -> List[str]:
+        """Retention: drops the monthly partitions that end before `cutoff`, instead of a row-by-row DELETE."""
+        if conn.dialect.name != "postgresql":
+            return []
+        partitions = conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'audit_logs'"
+        )).scalars()
+        dropped = []
+        for name in sorted(partitions):
+            try:
+                month = datetime.datetime.strptime(name, "audit_logs_%Y_%m")
+            except ValueError:
+                continue  # the default partition
+            if _next_month(month) <= cutoff:
+                conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+        return dropped
+
+
+class AuditWriter:
+    """Batched, crash-safe writer for audit entries.
+
+    record() appends the entry to the current write-ahead segment in AUDIT_WAL_DIR and queues it in
+    memory; a background thread writes the queue every AUDIT_FLUSH_INTERVAL (or as soon as a batch is
+    full) with multi-row INSERTs on its own session, then deletes the segments it covered. Mutations
+    pay a file append instead of an INSERT and a commit.
+
+    Segments are flock'ed by the process writing them. On start the writer replays the segments no live
+    process holds (a crash, or a failed flush at shutdown), skipping entries already stored. Entries
+    recorded before the writer starts (jobs, scripts) wait in memory and in their segment until it does.
+    """
+
+    def __init__(self, wal_dir: Optional[str] = AUDIT_WAL_DIR, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL, fsync: bool = AUDIT_WAL_FSYNC):
+        self.wal_dir = wal_dir or None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self._cond = threading.Condition()
+        self._pending: List[dict] = []
+        self._segment: Optional[Tuple[str, IO]] = None  # segment being appended to
+        self._sealed: List[Tuple[str, IO]] = []  # rotated segments whose entries are not all stored yet
+        self._seq = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._session_factory = None
+        self._partitions_checked: Optional[float] = None
+        self.flushed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self, session_factory):
+        if self.running:
+            return
+        self._session_factory = session_factory
+        self._stopping = False
+        self._thread = threading.Thread(target=self._loop, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Final flush and stop; whatever cannot be stored stays in the WAL for the next start."""
+        if not self.running:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def record(self, actor, action: str, entity_id: Optional[str] = None, **details) -> dict:
+        """Queue one entry; `actor` is the acting user / principal, None for background jobs."""
+        entry = {
+            "id": models.generate_uuid(),
+            "user_id": getattr(actor, "id", None),
+            "user_name": getattr(actor, "name", None) if actor is not None else SYSTEM_ACTOR,
+            "action": action,
+            "category": ACTIONS.get(action),
+            "entity_id": entity_id,
+            "details": json.dumps(details, default=str, separators=(",", ":")),
+            "timestamp": datetime.datetime.utcnow(),
+        }
+        with self._cond:
+            if self.wal_dir:
+                self._append(entry)
+            self._pending.append(entry)
+            if len(self._pending) == self.batch_size:
+                self._cond.notify()
+        return entry
+
+    def flush(self) -> int:
+        """Store everything recorded so far; returns the number of entries written.
+
+        On a database error the unwritten entries go back to the front of the queue and their segments
+        are kept, then the error is raised.
+        """
+        with self._cond:
+            batch, self._pending = self._pending, []
+            if self._segment is not None:
+                self._sealed.append(self._segment)
+                self._segment = None
+            sealed, self._sealed = self._sealed, []
+        written = 0
+        try:
+            if batch:
+                with self._session_factory() as db:
+                    self._ensure_partitions(db)
+                    for start in range(0, len(batch), self.batch_size):
+                        chunk = batch[start:start + self.batch_size]
+                        db.execute(insert(models.AuditLog).values(chunk))
+                        db.commit()
+                        written += len(chunk)
+        except Exception:
+            with self._cond:
+                self._pending[:0] = batch[written:]
+                self._sealed[:0] = sealed
+            raise
+        finally:
+            self.flushed += written
+        # Unlinked before the lock is released, so no other process replays them
+        self._discard(sealed)
+        return written
+
+    def clear(self):
+        """Drop queued entries and this process's segments (tests)."""
+        with self._cond:
+            self._pending.clear()
+            segments = self._sealed + ([self._segment] if self._segment is not None else [])
+            self._sealed, self._segment = [], None
+        self._discard(segments)
+
+    # --- Write-ahead segments ---
+    def _open_segment(self) -> Tuple[str, IO]:
+        os.makedirs(self.wal_dir, exist_ok=True)
+        self._seq += 1
+        path = os.path.join(self.wal_dir, f"audit-{os.getpid()}-{time.time_ns()}-{self._seq}.wal")
+        f = open(path, "ab")
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return path, f
+
+    @staticmethod
+    def _discard(segments: List[Tuple[str, IO]]):
+        for path, f in segments:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def _append(self, entry: dict):
+        if self._segment is None:
+            self._segment = self._open_segment()
+        f = self._segment[1]
+        f.write(json.dumps({**entry, "timestamp": entry["timestamp"].isoformat()}, separators=(",", ":")).encode() + b"\n")
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def _claim_orphans(self) -> List[Tuple[str, IO]]:
+        with self._cond:
+            owned = {path for path, _ in self._sealed} | ({self._segment[0]} if self._segment is not None else set())
+        claimed = []
+        for path in sorted(glob.glob(os.path.join(self.wal_dir, "audit-*.wal"))):
+            if path in owned:
+                continue
+            try:
+                f = open(path, "rb+")
+            except FileNotFoundError:
+                continue
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    f.close()  # a live process is still writing it
+                    continue
+            if not os.path.exists(path):
+                f.close()  # stored and removed by its owner meanwhile
+                continue
+            claimed.append((path, f))
+        return claimed
+
+    def _recover(self) -> int:
+        if not self.wal_dir or not os.path.isdir(self.wal_dir):
+            return 0
+        segments = self._claim_orphans()
+        entries = []
+        try:
+            for path, f in segments:
+                for number, line in enumerate(f.read().splitlines(), 1):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        logger.warning("Skipping torn audit WAL line %s:%d", path, number)
+                        continue
+                    entry["timestamp"] = datetime.datetime.fromisoformat(entry["timestamp"])
+                    entries.append(entry)
+            entries = self._unstored(entries)
+        except Exception:
+            for _, f in segments:
+                f.close()
+            raise
+        with self._cond:
+            self._pending[:0] = entries
+            self._sealed[:0] = segments
+        if segments:
+            logger.info("Replaying %d audit entries from %d WAL segments", len(entries), len(segments))
+        return len(entries)
+
+    def _unstored(self, entries: List[dict]) -> List[dict]:
+        # A crash between commit and segment removal leaves stored entries in the WAL
+        log = models.AuditLog
+        kept = []
+        with self._session_factory() as db:
+            for start in range(0, len(entries), self.batch_size):
+                chunk = entries[start:start + self.batch_size]
+                stamps = [e["timestamp"] for e in chunk]
+                stored = set(db.scalars(select(log.id).where(
+                    log.id.in_([e["id"] for e in chunk]), log.timestamp.between(min(stamps), max(stamps)))))
+                kept += [e for e in chunk if e["id"] not in stored]
+        return kept
+
+    def _ensure_partitions(self, db: Session):
+        # Next months' partitions exist before the first entry needs them; checked once a day
+        if db.get_bind().dialect.name != "postgresql":
+            return
+        if self._partitions_checked is not None and time.monotonic() - self._partitions_checked < 86400:
+            return
+        until = datetime.datetime.utcnow() + datetime.timedelta(days=31 * AUDIT_PARTITION_MONTHS_AHEAD)
+        AuditService.ensure_partitions(db.connection(), until)
+        db.commit()
+        self._partitions_checked = time.monotonic()
+
+    def _loop(self):
+        recovered = False
+        backoff = 0.0
+        while True:
+            with self._cond:
+                if not self._stopping and (backoff or len(self._pending) < self.batch_size):
+                    self._cond.wait(backoff or self.flush_interval)
+                stopping = self._stopping
+            try:
+                if not recovered:
+                    self._recover()
+                    recovered = True
+                self.flush()
+                backoff = 0.0
+            except Exception as e:
+                backoff = min(max(backoff * 2, self.flush_interval), AUDIT_RETRY_MAX_SECONDS)
+                logger.error(f"Audit flush failed ({self.pending} entries queued, retrying in {backoff:.0f}s): {e}")
+            if stopping:
+                return
+
+
+audit_writer = AuditWriter()
+
+
+if __name__ == "__main__":
+    # Partition maintenance job: python -m backend.services.audit_service
+    from ..database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    now = datetime.datetime.utcnow()
+    with engine.begin() as conn:
+        created = AuditService.ensure_partitions(conn, now + datetime.timedelta(days=31 * AUDIT_PARTITION_MONTHS_AHEAD))
+        dropped = []
+        if AUDIT_RETENTION_MONTHS > 0:
+            cutoff = _month_start(now)
+            for _ in range(AUDIT_RETENTION_MONTHS):
+                cutoff = _month_start(cutoff - datetime.timedelta(days=1))
+            dropped = AuditService.drop_partitions_before(conn, cutoff)
+    print(json.dumps({"ensured": created, "dropped": dropped}, indent=2))
@@ -0,0 +1,119 @@
+import os
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+
+# Score weights (normalised at load): cheaper, faster and better-rated offers score higher
+QUOTE_WEIGHT_PRICE = float(os.getenv("QUOTE_WEIGHT_PRICE", "0.6"))
+QUOTE_WEIGHT_LEAD_TIME = float(os.getenv("QUOTE_WEIGHT_LEAD_TIME", "0.25"))
+QUOTE_WEIGHT_RATING = float(os.getenv("QUOTE_WEIGHT_RATING", "0.15"))
+_WEIGHT_TOTAL = (QUOTE_WEIGHT_PRICE + QUOTE_WEIGHT_LEAD_TIME + QUOTE_WEIGHT_RATING) or 1.0
+MAX_SUPPLIER_RATING = 5.0
+
+
+class QuoteComparisonService:
+    """Ranks an RFQ's quotations per requested line and overall.
+
+    Prices and lead times are laid out as a line x quotation matrix (None where a supplier did not quote
+    a line) and scored line by line in one pass: each offer is compared against its line's best price and
+    lead time, then blended with the supplier rating. Three queries load everything, whatever the size.
+    """
+
+    @staticmethod
+    def _load(db: Session, rfq_id: str):
+        rfq = db.get(models.RFQ, rfq_id)
+        if not rfq:
+            raise HTTPException(status_code=404, detail="RFQ not found")
+        requested: Dict[str, float] = {}
+        for item_id, qty in db.execute(
+            select(models.RequestItem.item_id, models.RequestItem.quantity)
+            .where(models.RequestItem.request_id == rfq.material_request_id).order_by(models.RequestItem.item_id)
+        ):
+            requested[item_id] = requested.get(item_id, 0.0) + qty
+        quotes = db.execute(
+            select(models.Quotation.id, models.Quotation.supplier_id, models.Quotation.lead_time_days, models.Supplier.rating)
+            .outerjoin(models.Supplier, models.Supplier.id == models.Quotation.supplier_id)
+            .where(models.Quotation.rfq_id == rfq_id).order_by(models.Quotation.id)
+        ).all()
+        lines = db.execute(
+            select(models.QuotationItem.quotation_id, models.QuotationItem.item_id,
+                   models.QuotationItem.unit_price, models.QuotationItem.lead_time_days)
+            .join(models.Quotation, models.Quotation.id == models.QuotationItem.quotation_id)
+            .where(models.Quotation.rfq_id == rfq_id)
+        ).all()
+        return requested, quotes, lines
+
+    @staticmethod
+    def compare(db: Session, rfq_id: str, top: int = 3) -> schemas.QuoteComparisonOut:
+        """`top` caps the offers listed per line (0 lists every offer); rankings always use all of them."""
+        requested, quotes, quote_lines = QuoteComparisonService._load(db, rfq_id)
+        items = list(requested)
+        col = {item_id: j for j, item_id in enumerate(items)}
+        row = {q.id: i for i, q in enumerate(quotes)}
+        n_quotes, n_lines = len(quotes), len(items)
+
+        # line x quotation matrices (column-major: one list per requested line)
+        price: List[List[Optional[float]]] = [[None] * n_quotes for _ in range(n_lines)]
+        lead: List[List[Optional[int]]] = [[None] * n_quotes for _ in range(n_lines)]
+        for quotation_id, item_id, unit_price, lead_days in quote_lines:
+            j = col.get(item_id)
+            if j is None:
+                continue
+            i = row[quotation_id]
+            price[j][i] = unit_price
+            lead[j][i] = lead_days if lead_days is not None else quotes[i].lead_time_days
+        rating = [min(max((q.rating if q.rating is not None else MAX_SUPPLIER_RATING) / MAX_SUPPLIER_RATING, 0.0), 1.0)
+                  for q in quotes]
+        rating_part = [QUOTE_WEIGHT_RATING * r for r in rating]
+
+        result = schemas.QuoteComparisonOut(rfqId=rfq_id)
+        overall = [0.0] * n_quotes
+        quoted = [0] * n_quotes
+        totals = [0.0] * n_quotes
+        line_weights = 0.0
+        for j, item_id in enumerate(items):
+            prices, leads, qty = price[j], lead[j], requested[item_id]
+            offered = [i for i in range(n_quotes) if prices[i] is not None]
+            if not offered:
+                result.lines.append(schemas.LineComparison(itemId=item_id, quantity=qty, bestQuotationId=None))
+                continue
+            best_price = min(prices[i] for i in offered)
+            best_lead = min((leads[i] for i in offered if leads[i] is not None), default=None)
+
+            scored = []
+            for i in offered:
+                p, d = prices[i], leads[i]
+                price_score = best_price / p if p > 0 else 1.0
+                lead_score = (best_lead + 1) / (d + 1) if d is not None and best_lead is not None else 0.0
+                scored.append(((QUOTE_WEIGHT_PRICE * price_score + QUOTE_WEIGHT_LEAD_TIME * lead_score + rating_part[i]) / _WEIGHT_TOTAL, i))
+            scored.sort(key=lambda pair: -pair[0])
+
+            # Overall: line scores weighted by line value at the best price; unquoted lines count as zero
+            weight = qty * best_price
+            line_weights += weight
+            for value, i in scored:
+                overall[i] += weight * value
+                quoted[i] += 1
+                totals[i] += qty * prices[i]
+
+            listed = scored[:top] if top else scored
+            result.lines.append(schemas.LineComparison(
+                itemId=item_id, quantity=qty, bestQuotationId=quotes[scored[0][1]].id,
+                offers=[schemas.LineOffer(quotationId=quotes[i].id, supplierId=quotes[i].supplier_id, unitPrice=prices[i],
+                                          leadTimeDays=leads[i], score=round(value, 4), rank=rank)
+                        for rank, (value, i) in enumerate(listed, start=1)],
+            ))
+
+        overall = [value / (line_weights or 1.0) for value in overall]
+        for rank, i in enumerate(sorted(range(n_quotes), key=lambda i: -overall[i]), start=1):
+            result.suppliers.append(schemas.SupplierRanking(
+                quotationId=quotes[i].id, supplierId=quotes[i].supplier_id,
+                rating=quotes[i].rating if quotes[i].rating is not None else MAX_SUPPLIER_RATING,
+                linesQuoted=quoted[i], coverage=round(quoted[i] / n_lines, 4) if n_lines else 0.0,
+                total=round(totals[i], 2), score=round(overall[i], 4), rank=rank,
+            ))
+        return result
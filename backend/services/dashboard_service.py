@@ -0,0 +1,257 @@
+import datetime
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, event, func, insert, inspect, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from .ledger_service import COMMITTED_STATUSES, LedgerService
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the approval bands pending POs are grouped into (the last band is open-ended)
+APPROVAL_BANDS = tuple(float(v) for v in os.getenv("DASHBOARD_APPROVAL_BANDS", "10000,50000,250000,1000000").split(",") if v.strip())
+DASHBOARD_TOP_N = int(os.getenv("DASHBOARD_TOP_N", "10"))
+DASHBOARD_MONTHS = int(os.getenv("DASHBOARD_MONTHS", "12"))
+_PENDING = "dashboard_pending_deltas"
+
+_STATUS_METRICS = {
+    models.MaterialRequest: "requests.status",
+    models.RFQ: "rfqs.status",
+    models.PurchaseOrder: "pos.status",
+    models.Invoice: "invoices.status",
+}
+_TRACKED_ATTRS = ("status", "total_amount", "project_id", "supplier_id")
+
+
+def _band_bounds() -> List[Tuple[float, Optional[float]]]:
+    lower, bounds = 0.0, []
+    for upper in APPROVAL_BANDS:
+        bounds.append((lower, upper))
+        lower = upper
+    return bounds + [(lower, None)]
+
+
+def _band_label(lower: float, upper: Optional[float]) -> str:
+    return f"{lower:.0f}-{upper:.0f}" if upper is not None else f"{lower:.0f}+"
+
+
+def approval_band(amount: Optional[float]) -> str:
+    for lower, upper in _band_bounds():
+        if upper is None or (amount or 0.0) <= upper:
+            return _band_label(lower, upper)
+
+
+def _month(value: Optional[datetime.datetime]) -> str:
+    return (value or datetime.datetime.utcnow()).strftime("%Y-%m")
+
+
+def _facts(model, values: dict) -> List[Tuple[str, str, float]]:
+    """(metric, key, amount) counters a row with these values contributes to."""
+    status = values.get("status")
+    if status is None:
+        return []
+    amount = values.get("total_amount") or 0.0
+    facts = [(_STATUS_METRICS[model], status, amount)]
+    if model is models.PurchaseOrder:
+        if status == "PENDING_APPROVAL":
+            facts.append(("approvals.band", approval_band(amount), amount))
+        if status in COMMITTED_STATUSES:
+            facts += [("spend.project", values.get("project_id") or "", amount),
+                      ("spend.supplier", values.get("supplier_id") or "", amount),
+                      ("spend.month", _month(values.get("created_at")), amount)]
+    return facts
+
+
+class DashboardService:
+    """Dashboard KPIs as pre-aggregated counters (dashboard_stats), so the read is a few indexed lookups.
+
+    ORM writes to requests, RFQs, POs and invoices are turned into +/- deltas at flush and applied as
+    atomic increments just before commit, in the same transaction as the write. Set-based writes that
+    bypass the ORM (invoice re-matching) report their deltas through `record`. `rebuild` recomputes
+    everything from the base tables (first deployment, or repair after out-of-band edits).
+    """
+
+    @staticmethod
+    def record(db: Session, deltas: Iterable[Tuple[str, str, int, float]]):
+        pending = db.info.setdefault(_PENDING, defaultdict(lambda: [0, 0.0]))
+        for metric, key, count, amount in deltas:
+            entry = pending[(metric, key)]
+            entry[0] += count
+            entry[1] += amount
+
+    @staticmethod
+    def record_status_change(db: Session, model, before: Iterable[Tuple[str, int, float]], after: Iterable[Tuple[str, int, float]]):
+        """Deltas for a bulk status UPDATE given (status, count, amount) groups before and after it."""
+        metric = _STATUS_METRICS[model]
+        DashboardService.record(db, [(metric, s, -c, -(a or 0.0)) for s, c, a in before] +
+                                    [(metric, s, c, a or 0.0) for s, c, a in after])
+
+    @staticmethod
+    def _apply(db: Session):
+        pending = db.info.pop(_PENDING, None)
+        rows = [{"metric": metric, "key": key, "count": count, "amount": amount}
+                for (metric, key), (count, amount) in sorted(pending.items()) if count or amount] if pending else []
+        # Sorted keys: concurrent commits take the counter row locks in the same order
+        LedgerService._increment(db, models.DashboardStat, ("metric", "key"), rows)
+
+    # --- Read ---
+    @staticmethod
+    def _buckets(db: Session, metric: str, name_column=None, id_column=None, order_by_key: bool = False,
+                 limit: int = DASHBOARD_TOP_N) -> List[schemas.SpendBucket]:
+        stat = models.DashboardStat
+        columns = [stat.key, stat.count, stat.amount]
+        stmt = select(*columns, name_column if name_column is not None else literal(None))
+        if name_column is not None:
+            stmt = stmt.outerjoin(name_column.class_, id_column == stat.key)
+        stmt = stmt.where(stat.metric == metric, stat.count != 0)
+        stmt = stmt.order_by(stat.key.desc() if order_by_key else stat.amount.desc(), stat.key).limit(limit)
+        return [schemas.SpendBucket(key=key, name=name, count=count, amount=amount) for key, count, amount, name in db.execute(stmt)]
+
+    @staticmethod
+    def get_dashboard(db: Session) -> schemas.DashboardOut:
+        stat = models.DashboardStat
+        out = schemas.DashboardOut()
+        bands: Dict[str, Tuple[int, float]] = {}
+        for metric, key, count, amount in db.execute(
+            select(stat.metric, stat.key, stat.count, stat.amount)
+            .where(stat.metric.in_(list(_STATUS_METRICS.values()) + ["approvals.band"]), stat.count != 0)
+        ):
+            if metric == "requests.status": out.requestsByStatus[key] = count
+            elif metric == "rfqs.status": out.rfqsByStatus[key] = count
+            elif metric == "pos.status": out.posByStatus[key] = schemas.StatusTotal(count=count, amount=amount)
+            elif metric == "invoices.status": out.invoicesByStatus[key] = schemas.StatusTotal(count=count, amount=amount)
+            else: bands[key] = (count, amount)
+        for lower, upper in _band_bounds():
+            count, amount = bands.get(_band_label(lower, upper), (0, 0.0))
+            out.pendingApprovals.append(schemas.ApprovalBand(band=_band_label(lower, upper), minAmount=lower, maxAmount=upper,
+                                                             count=count, amount=amount))
+        out.spendByProject = DashboardService._buckets(db, "spend.project", models.Project.name, models.Project.id)
+        out.spendBySupplier = DashboardService._buckets(db, "spend.supplier", models.Supplier.name, models.Supplier.id)
+        out.spendByMonth = sorted(DashboardService._buckets(db, "spend.month", order_by_key=True, limit=DASHBOARD_MONTHS),
+                                  key=lambda bucket: bucket.key)
+        return out
+
+    # --- Rebuild ---
+    @staticmethod
+    def _month_column(db: Session, column):
+        if db.get_bind().dialect.name == "postgresql":
+            return func.to_char(column, "YYYY-MM")
+        return func.strftime("%Y-%m", column)
+
+    @staticmethod
+    def rebuild(db: Session) -> schemas.DashboardOut:
+        po = models.PurchaseOrder
+        amount = func.coalesce(func.sum(po.total_amount), 0.0)
+        grouped = [
+            select(literal("requests.status"), models.MaterialRequest.status, func.count(), literal(0.0))
+            .group_by(models.MaterialRequest.status),
+            select(literal("rfqs.status"), models.RFQ.status, func.count(), literal(0.0)).group_by(models.RFQ.status),
+            select(literal("pos.status"), po.status, func.count(), amount).group_by(po.status),
+            select(literal("invoices.status"), models.Invoice.status, func.count(),
+                   func.coalesce(func.sum(models.Invoice.total_amount), 0.0)).group_by(models.Invoice.status),
+        ]
+        band = case(*[(func.coalesce(po.total_amount, 0.0) <= upper, _band_label(lower, upper))
+                      for lower, upper in _band_bounds() if upper is not None],
+                    else_=_band_label(*_band_bounds()[-1]))
+        grouped.append(select(literal("approvals.band"), band, func.count(), amount)
+                       .where(po.status == "PENDING_APPROVAL").group_by(band))
+        committed = po.status.in_(COMMITTED_STATUSES)
+        for metric, column in (("spend.project", func.coalesce(po.project_id, "")), ("spend.supplier", func.coalesce(po.supplier_id, "")),
+                               ("spend.month", DashboardService._month_column(db, po.created_at))):
+            grouped.append(select(literal(metric), column, func.count(), amount).where(committed).group_by(column))
+
+        db.info.pop(_PENDING, None)
+        db.execute(delete(models.DashboardStat))
+        counters = union_all(*[stmt.where(stmt.selected_columns[1].isnot(None)) for stmt in grouped]).subquery()
+        db.execute(insert(models.DashboardStat).from_select(
+            ["metric", "key", "count", "amount", "updated_at"],
+            select(*counters.c, func.now()),
+        ))
+        db.commit()
+        return DashboardService.get_dashboard(db)
+
+
+# --- Change capture ---
+def _values(state, attrs: Iterable[str], old: bool) -> dict:
+    values = {}
+    for attr in attrs:
+        if attr not in state.mapper.attrs:
+            continue
+        history = state.attrs[attr].history
+        if old:
+            # deleted holds the replaced value; an added value with nothing deleted means the old one is unknown
+            if history.deleted:
+                values[attr] = history.deleted[0]
+            elif history.unchanged:
+                values[attr] = history.unchanged[0]
+            else:
+                return {}
+        else:
+            values[attr] = state.dict.get(attr)
+    values["created_at"] = state.dict.get("created_at")
+    return values
+
+
+def _stored_values(session, model, ids: List[str]) -> Dict[str, dict]:
+    """Current row values for objects whose previous values were never loaded (e.g. expired after a commit)."""
+    names = [a for a in _TRACKED_ATTRS + ("created_at",) if a in model.__mapper__.attrs]
+    with session.no_autoflush:
+        rows = session.execute(select(model.id, *[getattr(model, a) for a in names]).where(model.id.in_(ids))).all()
+    return {row[0]: dict(zip(names, row[1:])) for row in rows}
+
+
+@event.listens_for(Session, "before_flush")
+def _capture_deltas(session, flush_context, instances):
+    deltas = []
+    for obj in session.new:
+        if type(obj) in _STATUS_METRICS:
+            deltas += [(m, k, 1, a) for m, k, a in _facts(type(obj), _values(inspect(obj), _TRACKED_ATTRS, old=False))]
+    for obj in session.deleted:
+        if type(obj) in _STATUS_METRICS:
+            deltas += [(m, k, -1, -a) for m, k, a in _facts(type(obj), _values(inspect(obj), _TRACKED_ATTRS, old=True))]
+    changed, unknown = [], defaultdict(list)
+    for obj in session.dirty:
+        if type(obj) not in _STATUS_METRICS:
+            continue
+        state = inspect(obj)
+        if not any(a in state.mapper.attrs and state.attrs[a].history.has_changes() for a in _TRACKED_ATTRS):
+            continue
+        before = _values(state, _TRACKED_ATTRS, old=True)
+        if not before:
+            unknown[type(obj)].append(obj)
+        changed.append((obj, before))
+    stored = {}
+    for model, objs in unknown.items():
+        stored.update(_stored_values(session, model, [o.id for o in objs]))
+    for obj, before in changed:
+        before = before or stored.get(obj.id, {})
+        deltas += [(m, k, -1, -a) for m, k, a in _facts(type(obj), before)]
+        deltas += [(m, k, 1, a) for m, k, a in _facts(type(obj), _values(inspect(obj), _TRACKED_ATTRS, old=False))]
+    if deltas:
+        DashboardService.record(session, deltas)
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_deltas(session):
+    session.flush()
+    if session.info.get(_PENDING):
+        DashboardService._apply(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_deltas(session):
+    session.info.pop(_PENDING, None)
+
+
+if __name__ == "__main__":
+    # Backfill / repair: python -m backend.services.dashboard_service
+    from ..database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as session:
+        result = DashboardService.rebuild(session)
+    print(result.model_dump_json(indent=2))
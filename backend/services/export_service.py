@@ -0,0 +1,157 @@
+import csv
+import datetime
+import io
+import json
+import os
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Boolean, DateTime, Float, Integer, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .. import models
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class ExportFilters:
+    def __init__(self, date_from: Optional[datetime.datetime] = None, date_to: Optional[datetime.datetime] = None,
+                 project_id: Optional[str] = None):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.project_id = project_id
+
+
+def _parquet_modules():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise HTTPException(status_code=415, detail="Parquet export requires pyarrow on the server; use ndjson or csv")
+    return pyarrow, pyarrow.parquet
+
+
+class ExportService:
+
+    # entity -> (table model, parent holding created/received date + project, join condition)
+    ENTITIES = {
+        "purchase-orders": (models.PurchaseOrder, None, None),
+        "po-items": (models.POItem, models.PurchaseOrder, models.POItem.po_id == models.PurchaseOrder.id),
+        "receipts": (models.Receipt, None, None),
+        "receipt-items": (models.ReceiptItem, models.Receipt, models.ReceiptItem.receipt_id == models.Receipt.id),
+        "invoices": (models.Invoice, None, None),
+    }
+
+    @staticmethod
+    def _date_column(model):
+        return model.received_date if model is models.Receipt else model.created_at
+
+    @staticmethod
+    def build_statement(entity: str, filters: ExportFilters):
+        spec = ExportService.ENTITIES.get(entity)
+        if spec is None:
+            raise HTTPException(status_code=404, detail=f"Unknown export entity '{entity}'")
+        model, parent, on = spec
+        table = model.__table__
+        stmt = select(*table.columns)
+        dated = model
+        if parent is not None:
+            stmt = stmt.join(parent, on)
+            dated = parent
+
+        date_col = ExportService._date_column(dated)
+        if filters.date_from: stmt = stmt.where(date_col >= filters.date_from)
+        if filters.date_to: stmt = stmt.where(date_col < filters.date_to)
+        if filters.project_id:
+            if hasattr(dated, "project_id"):
+                stmt = stmt.where(dated.project_id == filters.project_id)
+            else:
+                # Receipts and invoices reach their project through the PO
+                po_ids = select(models.PurchaseOrder.id).where(models.PurchaseOrder.project_id == filters.project_id)
+                stmt = stmt.where(dated.po_id.in_(po_ids))
+        # Primary key order keeps the scan on the index and the output deterministic
+        return stmt.order_by(table.c.id), list(table.columns)
+
+    @staticmethod
+    def stream(session_factory: async_sessionmaker, entity: str, fmt: str, filters: ExportFilters) -> AsyncIterator[bytes]:
+        stmt, columns = ExportService.build_statement(entity, filters)
+        names = [c.name for c in columns]
+        encode = {"ndjson": _ndjson_encoder, "csv": _csv_encoder, "parquet": _parquet_encoder}[fmt](columns)
+        if fmt == "parquet":
+            _parquet_modules()  # fail with 415 before any bytes are sent
+
+        async def body():
+            async with session_factory() as db:
+                # yield_per -> server-side cursor on Postgres; at most one batch of rows is held in memory
+                result = await db.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+                async for batch in result.partitions():
+                    chunk = encode([dict(zip(names, row)) for row in batch])
+                    if chunk:
+                        yield chunk
+            tail = encode(None)
+            if tail:
+                yield tail
+
+        return body()
+
+
+# --- Encoders: called with each batch of row dicts, then once with None to flush ---
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+def _ndjson_encoder(columns):
+    def encode(rows):
+        if rows is None:
+            return b""
+        return "".join(json.dumps(row, default=_json_default, ensure_ascii=False) + "\n" for row in rows).encode()
+    return encode
+
+def _csv_encoder(columns):
+    names = [c.name for c in columns]
+    state = {"header": False}
+
+    def encode(rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if not state["header"]:
+            writer.writerow(names)
+            state["header"] = True
+        for row in rows or []:
+            writer.writerow([row[n].isoformat() if isinstance(row[n], datetime.datetime) else row[n] for n in names])
+        return buf.getvalue().encode()
+    return encode
+
+def _parquet_encoder(columns):
+    state = {"writer": None, "sink": None}
+
+    def arrow_type(pa, column):
+        if isinstance(column.type, Float): return pa.float64()
+        if isinstance(column.type, Integer): return pa.int64()
+        if isinstance(column.type, Boolean): return pa.bool_()
+        if isinstance(column.type, DateTime): return pa.timestamp("us")
+        return pa.string()
+
+    def encode(rows):
+        pa, pq = _parquet_modules()
+        if state["writer"] is None:
+            schema = pa.schema([(c.name, arrow_type(pa, c)) for c in columns])
+            state["sink"] = io.BytesIO()
+            state["writer"] = pq.ParquetWriter(state["sink"], schema)
+        if rows is None:
+            state["writer"].close()
+        elif rows:
+            state["writer"].write_table(pa.Table.from_pylist(rows, schema=state["writer"].schema))
+        # Hand over whatever the writer flushed so far (one row group per batch)
+        data = state["sink"].getvalue()
+        state["sink"].seek(0)
+        state["sink"].truncate()
+        return data
+    return encode
@@ -0,0 +1,234 @@
+import csv
+import io
+import json
+import os
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple
+
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import models, schemas
+from ..database import dialect_insert
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+MAX_REPORTED_ERRORS = 1000
+SUPPORTED_FORMATS = ("csv", "ndjson", "xlsx")
+
+
+# --- Create schema -> column mapping (shared with the single-row create endpoints) ---
+def item_values(item: schemas.ItemCreate) -> dict:
+    return {"sku": item.sku, "name": item.name, "unit": item.unit, "base_price": item.basePrice}
+
+def supplier_values(sup: schemas.SupplierCreate) -> dict:
+    return {"name": sup.name, "email": sup.email, "contact_person": sup.contact, "match_tolerance": sup.matchTolerance}
+
+def project_values(proj: schemas.ProjectCreate) -> dict:
+    return {"code": proj.code, "name": proj.name, "owner_name": proj.ownerName, "budget": proj.budget,
+            "match_tolerance": proj.matchTolerance}
+
+
+# --- Readers: lazily yield one dict per source row ---
+def _blank_to_none(row: dict) -> dict:
+    return {k.strip(): (v if not (isinstance(v, str) and v.strip() == "") else None) for k, v in row.items() if k}
+
+def _read_csv(stream) -> Iterator[dict]:
+    for row in csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")):
+        yield _blank_to_none(row)
+
+def _read_ndjson(stream) -> Iterator[dict]:
+    for line in io.TextIOWrapper(stream, encoding="utf-8"):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError as e:
+            value = {"__parse_error__": str(e)}
+        yield value if isinstance(value, dict) else {"__parse_error__": "Row is not a JSON object"}
+
+def _read_xlsx(stream) -> Iterator[dict]:
+    try:
+        from openpyxl import load_workbook  # optional dependency
+    except ImportError:
+        raise HTTPException(status_code=415, detail="XLSX import requires openpyxl on the server; upload CSV or NDJSON")
+    sheet = load_workbook(stream, read_only=True, data_only=True).active
+    rows = sheet.iter_rows(values_only=True)
+    header = [str(h).strip() if h is not None else "" for h in next(rows, [])]
+    for values in rows:
+        if values is None or all(v is None for v in values):
+            continue
+        yield _blank_to_none(dict(zip(header, values)))
+
+_READERS = {"csv": _read_csv, "ndjson": _read_ndjson, "xlsx": _read_xlsx}
+
+def detect_format(filename: str, requested: str = None) -> str:
+    fmt = (requested or os.path.splitext(filename or "")[1].lstrip(".")).lower()
+    fmt = {"jsonl": "ndjson", "json": "ndjson"}.get(fmt, fmt)
+    if fmt not in SUPPORTED_FORMATS:
+        raise HTTPException(status_code=415, detail=f"Unsupported import format. Use one of: {', '.join(SUPPORTED_FORMATS)}")
+    return fmt
+
+
+def _chunks(rows: Iterable, size: int) -> Iterator[List]:
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ImportService:
+
+    # Per entity: the validating schema and the chunk writer
+    ENTITIES = {
+        "items": schemas.ItemCreate,
+        "suppliers": schemas.SupplierCreate,
+        "projects": schemas.ProjectCreate,
+        "boq": schemas.BOQLineImport,
+    }
+
+    @staticmethod
+    def import_file(db: Session, entity: str, stream, fmt: str) -> schemas.ImportReport:
+        """Synchronous import (scripts, jobs): parse, validate and write chunk by chunk on one thread."""
+        report = schemas.ImportReport(entity=entity)
+        for valid in ImportService.read_chunks(entity, stream, fmt, report):
+            ImportService.write_chunk(db, entity, valid, report)
+        return report
+
+    @staticmethod
+    async def import_upload(db: AsyncSession, entity: str, stream, fmt: str) -> schemas.ImportReport:
+        """Import for the API: reading, decoding and validating run in the threadpool, one chunk at a time,
+        so the event loop only ever awaits; each validated chunk is then written through the request's session."""
+        report = schemas.ImportReport(entity=entity)
+        chunks = ImportService.read_chunks(entity, stream, fmt, report)
+        while (valid := await run_in_threadpool(next, chunks, None)) is not None:
+            await db.run_sync(ImportService.write_chunk, entity, valid, report)
+        return report
+
+    @staticmethod
+    def read_chunks(entity: str, stream, fmt: str, report: schemas.ImportReport) -> Iterator[List[Tuple[int, BaseModel]]]:
+        """Validated rows, IMPORT_CHUNK_SIZE source rows at a time; rejected rows are recorded on `report`."""
+        schema = ImportService.ENTITIES.get(entity)
+        if schema is None:
+            raise HTTPException(status_code=404, detail=f"Unknown import entity '{entity}'")
+        return ImportService._validated_chunks(schema, _READERS[fmt](stream), report)
+
+    @staticmethod
+    def _validated_chunks(schema, rows: Iterable[dict], report: schemas.ImportReport) -> Iterator[List[Tuple[int, BaseModel]]]:
+        for chunk in _chunks(enumerate(rows, start=1), IMPORT_CHUNK_SIZE):
+            valid = ImportService._validate(schema, chunk, report)
+            if valid:
+                yield valid
+
+    @staticmethod
+    def write_chunk(db: Session, entity: str, valid: List[Tuple[int, BaseModel]], report: schemas.ImportReport):
+        try:
+            written, row_errors = ImportService._write(db, entity, valid)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            written, row_errors = 0, [(line, [f"Database error: {e.__class__.__name__}"]) for line, _ in valid]
+        report.imported += written
+        for line, messages in row_errors:
+            ImportService._fail(report, line, messages)
+
+    @staticmethod
+    def _validate(schema, chunk: List[Tuple[int, dict]], report: schemas.ImportReport) -> List[Tuple[int, BaseModel]]:
+        valid = []
+        for line, raw in chunk:
+            report.processed += 1
+            if "__parse_error__" in raw:
+                ImportService._fail(report, line, [raw["__parse_error__"]])
+                continue
+            try:
+                valid.append((line, schema.model_validate(raw)))
+            except ValidationError as e:
+                ImportService._fail(report, line, [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()])
+        return valid
+
+    @staticmethod
+    def _fail(report: schemas.ImportReport, line: int, messages: List[str]):
+        report.failed += 1
+        if len(report.errors) < MAX_REPORTED_ERRORS:
+            report.errors.append(schemas.ImportRowError(row=line, errors=messages))
+
+    @staticmethod
+    def _write(db: Session, entity: str, valid: List[Tuple[int, BaseModel]]):
+        if entity == "items":
+            rows, errors = ImportService._last_per_key([(line, item_values(r)) for line, r in valid], ("sku",), "sku")
+            return ImportService._upsert(db, models.Item, ("sku",), rows), errors
+        if entity == "projects":
+            rows, errors = ImportService._last_per_key([(line, project_values(r)) for line, r in valid], ("code",), "code")
+            return ImportService._upsert(db, models.Project, ("code",), rows), errors
+        if entity == "suppliers":
+            rows = [dict(supplier_values(r), id=models.generate_uuid()) for _, r in valid]
+            db.execute(insert(models.Supplier), rows)
+            return len(rows), []
+        return ImportService._write_boq(db, valid)
+
+    @staticmethod
+    def _last_per_key(rows: List[Tuple[int, dict]], keys: Tuple[str, ...], label: str):
+        """Last occurrence wins when a chunk repeats a key; each earlier row is reported as not imported."""
+        kept, errors = {}, []
+        for line, row in rows:
+            key = tuple(row[k] for k in keys)
+            if key in kept:
+                errors.append((kept[key][0], [f"{label}: repeated on row {line}, which replaces this row"]))
+            kept[key] = (line, row)
+        return [row for _, row in kept.values()], errors
+
+    @staticmethod
+    def _upsert(db: Session, model, keys: Tuple[str, ...], rows: List[dict]) -> int:
+        """Insert or update on the natural key `keys` (a unique index); rows must not repeat a key."""
+        stmt = dialect_insert(db, model)
+        if stmt is not None:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=list(keys),
+                set_={col: getattr(stmt.excluded, col) for col in rows[0] if col not in keys},
+            )
+            db.execute(stmt, [dict(row, id=models.generate_uuid()) for row in rows])
+            return len(rows)
+
+        columns = [getattr(model, k) for k in keys]
+        existing = {tuple(key): row_id for *key, row_id in db.execute(
+            select(*columns, model.id).where(tuple_(*columns).in_([tuple(r[k] for k in keys) for r in rows]))
+        ).all()}
+        new_rows = [dict(row, id=models.generate_uuid()) for row in rows if tuple(row[k] for k in keys) not in existing]
+        updates = [dict(row, id=existing[tuple(row[k] for k in keys)]) for row in rows if tuple(row[k] for k in keys) in existing]
+        if new_rows:
+            db.execute(insert(model), new_rows)
+        if updates:
+            db.execute(update(model), updates)
+        return len(rows)
+
+    @staticmethod
+    def _write_boq(db: Session, valid: List[Tuple[int, BaseModel]]):
+        # Resolve natural keys (project code, SKU) for the whole chunk in two queries
+        codes = {r.projectCode for _, r in valid}
+        skus = {r.sku for _, r in valid}
+        project_ids = dict(db.execute(select(models.Project.code, models.Project.id).where(models.Project.code.in_(codes))).all())
+        item_ids = dict(db.execute(select(models.Item.sku, models.Item.id).where(models.Item.sku.in_(skus))).all())
+
+        errors, resolved = [], []
+        for line, r in valid:
+            problems = []
+            if r.projectCode not in project_ids: problems.append(f"projectCode: unknown project '{r.projectCode}'")
+            if r.sku not in item_ids: problems.append(f"sku: unknown item '{r.sku}'")
+            if problems:
+                errors.append((line, problems))
+                continue
+            resolved.append((line, {"project_id": project_ids[r.projectCode], "item_id": item_ids[r.sku],
+                                    "total_quantity": r.totalQuantity}))
+        rows, repeated = ImportService._last_per_key(resolved, ("project_id", "item_id"), "projectCode/sku")
+        errors += repeated
+        if not rows:
+            return 0, errors
+        # Upsert on the unique (project_id, item_id): received_quantity is left to the receipts. project_id is
+        # in every row, so http_cache bumps only these projects' BOQ versions
+        return ImportService._upsert(db, models.ProjectBOQ, ("project_id", "item_id"), rows), errors
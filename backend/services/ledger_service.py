@@ -0,0 +1,259 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, case, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..database import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# PO statuses whose value counts as committed spend
+COMMITTED_STATUSES = ("APPROVED", "PARTIALLY_RECEIVED", "RECEIVED")
+RECONCILE_TOLERANCE = 0.01
+_PROJECT_COLUMNS = ("committed_amount", "received_amount", "invoiced_amount")
+_BOQ_COLUMNS = ("ordered_quantity", "committed_amount", "received_quantity", "received_amount")
+
+
+class LedgerService:
+    """Per-project and per-BOQ-line spend totals, updated in the same transaction as the lifecycle write.
+
+    Every change is an atomic `column = column + delta` upsert, so concurrent writers never lose updates
+    and the financials read is a primary-key lookup no matter how much history a project has.
+    """
+
+    @staticmethod
+    def _increment(db: Session, model, keys: Tuple[str, ...], rows: List[dict]):
+        if not rows:
+            return
+        table = model.__table__
+        deltas = [c for c in rows[0] if c not in keys]
+        stmt = dialect_insert(db, table)
+        if stmt is not None:
+            set_ = {c: table.c[c] + stmt.excluded[c] for c in deltas}
+            if "updated_at" in table.c:
+                set_["updated_at"] = func.now()
+            db.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=set_), rows)
+            return
+        for row in rows:
+            result = db.execute(
+                update(table).where(*[table.c[k] == row[k] for k in keys]).values({c: table.c[c] + row[c] for c in deltas})
+            )
+            if result.rowcount == 0:
+                db.execute(insert(table).values(**row))
+
+    @staticmethod
+    def _project_delta(project_id: str, committed=0.0, received=0.0, invoiced=0.0) -> dict:
+        return {"project_id": project_id, "committed_amount": committed, "received_amount": received, "invoiced_amount": invoiced}
+
+    @staticmethod
+    def record_po_approval(db: Session, po: models.PurchaseOrder):
+        LedgerService._increment(db, models.ProjectLedger, ("project_id",),
+                                 [LedgerService._project_delta(po.project_id, committed=po.total_amount or 0.0)])
+        per_item: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0.0])
+        for line in po.items:
+            per_item[line.item_id][0] += line.quantity
+            per_item[line.item_id][1] += line.quantity * line.price
+        LedgerService._increment(db, models.BOQLedger, ("project_id", "item_id"), [
+            {"project_id": po.project_id, "item_id": item_id, "ordered_quantity": qty, "committed_amount": amount,
+             "received_quantity": 0.0, "received_amount": 0.0}
+            for item_id, (qty, amount) in per_item.items()
+        ])
+        # Project.spent tracks committed spend
+        db.execute(update(models.Project).where(models.Project.id == po.project_id)
+                   .values(spent=func.coalesce(models.Project.spent, 0.0) + (po.total_amount or 0.0)))
+
+    @staticmethod
+    def record_receipt(db: Session, project_id: str, lines: Iterable[Tuple[str, float, float]]):
+        """lines: (item_id, received quantity, unit price)"""
+        per_item: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0.0])
+        for item_id, qty, price in lines:
+            per_item[item_id][0] += qty
+            per_item[item_id][1] += qty * price
+        if not per_item:
+            return
+        total = sum(amount for _, amount in per_item.values())
+        LedgerService._increment(db, models.ProjectLedger, ("project_id",),
+                                 [LedgerService._project_delta(project_id, received=total)])
+        LedgerService._increment(db, models.BOQLedger, ("project_id", "item_id"), [
+            {"project_id": project_id, "item_id": item_id, "ordered_quantity": 0.0, "committed_amount": 0.0,
+             "received_quantity": qty, "received_amount": amount}
+            for item_id, (qty, amount) in per_item.items()
+        ])
+        # Roll the same quantities into the project's BOQ line for each item (unique on project_id, item_id)
+        boq = models.ProjectBOQ.__table__
+        db.execute(
+            update(boq)
+            .where(boq.c.project_id == bindparam("p_id"), boq.c.item_id == bindparam("i_id"))
+            .values(received_quantity=func.coalesce(boq.c.received_quantity, 0.0) + bindparam("qty"))
+            .execution_options(version_scope=project_id),  # http_cache: bump this project's BOQ version only
+            [{"p_id": project_id, "i_id": item_id, "qty": qty} for item_id, (qty, _) in per_item.items()],
+        )
+
+    @staticmethod
+    def record_invoice(db: Session, project_id: str, amount: float):
+        LedgerService._increment(db, models.ProjectLedger, ("project_id",),
+                                 [LedgerService._project_delta(project_id, invoiced=amount or 0.0)])
+
+    @staticmethod
+    def get_financials(db: Session, project_id: str) -> schemas.ProjectFinancialsOut:
+        row = db.execute(
+            select(models.Project.budget, models.ProjectLedger)
+            .outerjoin(models.ProjectLedger, models.ProjectLedger.project_id == models.Project.id)
+            .where(models.Project.id == project_id)
+        ).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        budget, ledger = row
+        committed = ledger.committed_amount if ledger else 0.0
+        return schemas.ProjectFinancialsOut(
+            projectId=project_id,
+            budget=budget or 0.0,
+            committed=committed,
+            received=ledger.received_amount if ledger else 0.0,
+            invoiced=ledger.invoiced_amount if ledger else 0.0,
+            remainingBudget=(budget or 0.0) - committed,
+            utilization=round(committed / budget, 4) if budget else 0.0,
+        )
+
+    @staticmethod
+    def get_boq_progress(db: Session, project_id: str) -> List[schemas.BOQProgressOut]:
+        """Per BOQ line progress from the maintained counters only (no PO / receipt history scan)."""
+        boq, ledger = models.ProjectBOQ, models.BOQLedger
+        rows = db.execute(
+            select(boq.id, boq.item_id, boq.total_quantity, boq.received_quantity, ledger.ordered_quantity, ledger.received_quantity)
+            .outerjoin(ledger, (ledger.project_id == boq.project_id) & (ledger.item_id == boq.item_id))
+            .where(boq.project_id == project_id)
+            .order_by(boq.id)
+        ).all()
+        progress = []
+        for boq_id, item_id, total, received, ordered, ledger_received in rows:
+            total, received = total or 0.0, received or 0.0
+            progress.append(schemas.BOQProgressOut(
+                id=boq_id,
+                itemId=item_id,
+                totalQuantity=total,
+                receivedQuantity=received,
+                outstandingQuantity=max(total - received, 0.0),
+                onOrderQuantity=max((ordered or 0.0) - (ledger_received or 0.0), 0.0),
+                percentComplete=round(min(received / total, 1.0) * 100, 2) if total else 0.0,
+            ))
+        return progress
+
+    # --- Reconciliation ---
+    @staticmethod
+    def _expected_totals(db: Session) -> Dict[str, Dict[str, float]]:
+        po = models.PurchaseOrder
+        expected: Dict[str, Dict[str, float]] = defaultdict(lambda: dict.fromkeys(_PROJECT_COLUMNS, 0.0))
+        for project_id, total in db.execute(
+            select(po.project_id, func.sum(po.total_amount)).where(po.status.in_(COMMITTED_STATUSES)).group_by(po.project_id)
+        ):
+            expected[project_id]["committed_amount"] = total or 0.0
+        for project_id, total in db.execute(
+            select(po.project_id, func.sum(models.POItem.received_quantity * models.POItem.price))
+            .join(models.POItem, models.POItem.po_id == po.id).group_by(po.project_id)
+        ):
+            expected[project_id]["received_amount"] = total or 0.0
+        for project_id, total in db.execute(
+            select(po.project_id, func.sum(models.Invoice.total_amount))
+            .join(models.Invoice, models.Invoice.po_id == po.id).group_by(po.project_id)
+        ):
+            expected[project_id]["invoiced_amount"] = total or 0.0
+        expected.pop(None, None)
+        return expected
+
+    @staticmethod
+    def _expected_boq_lines(db: Session, project_ids: Optional[set] = None) -> Dict[Tuple[str, str], Dict[str, float]]:
+        """BOQ ledger rows recomputed from the PO lines, keyed by (project_id, item_id)."""
+        po, line = models.PurchaseOrder, models.POItem
+        committed = po.status.in_(COMMITTED_STATUSES)
+        query = select(
+            po.project_id, line.item_id,
+            func.sum(case((committed, line.quantity), else_=0.0)),
+            func.sum(case((committed, line.quantity * line.price), else_=0.0)),
+            func.sum(line.received_quantity),
+            func.sum(line.received_quantity * line.price),
+        ).join(line, line.po_id == po.id).group_by(po.project_id, line.item_id)
+        if project_ids is not None:
+            query = query.where(po.project_id.in_(project_ids))
+        return {
+            (p, i): {"ordered_quantity": oq or 0.0, "committed_amount": ca or 0.0, "received_quantity": rq or 0.0, "received_amount": ra or 0.0}
+            for p, i, oq, ca, rq, ra in db.execute(query) if p is not None
+        }
+
+    @staticmethod
+    def reconcile(db: Session, fix: bool = False) -> schemas.LedgerReconciliation:
+        """Recompute the ledger from the raw PO / receipt / invoice rows and compare.
+
+        Checks the project totals, every BOQ ledger line, and the received quantity rolled into each
+        project BOQ line. With fix=True the drifted rows are rewritten from the recomputed values.
+        """
+        discrepancies = []
+
+        def check(table: str, project_id: str, column: str, current, value: float, **ids) -> bool:
+            if abs((current or 0.0) - value) <= RECONCILE_TOLERANCE:
+                return False
+            discrepancies.append(schemas.LedgerDiscrepancy(table=table, projectId=project_id, field=column,
+                                                           ledger=current or 0.0, expected=value, **ids))
+            return True
+
+        expected = LedgerService._expected_totals(db)
+        actual = {row.project_id: row for row in db.scalars(select(models.ProjectLedger))}
+        for project_id in set(expected) | set(actual):
+            want = expected.get(project_id, dict.fromkeys(_PROJECT_COLUMNS, 0.0))
+            have = actual.get(project_id)
+            for column, value in want.items():
+                check("project_ledger", project_id, column, getattr(have, column) if have is not None else 0.0, value)
+
+        expected_lines = LedgerService._expected_boq_lines(db)
+        lines = {(row.project_id, row.item_id): row for row in db.scalars(select(models.BOQLedger))}
+        for project_id, item_id in set(expected_lines) | set(lines):
+            want = expected_lines.get((project_id, item_id), dict.fromkeys(_BOQ_COLUMNS, 0.0))
+            have = lines.get((project_id, item_id))
+            for column, value in want.items():
+                check("boq_ledger", project_id, column, getattr(have, column) if have is not None else 0.0, value, itemId=item_id)
+
+        boq = models.ProjectBOQ
+        boq_fixes = []
+        for boq_id, project_id, item_id, received in db.execute(select(boq.id, boq.project_id, boq.item_id, boq.received_quantity)):
+            value = expected_lines.get((project_id, item_id), {}).get("received_quantity", 0.0)
+            if check("project_boq", project_id, "received_quantity", received, value, itemId=item_id, boqId=boq_id):
+                boq_fixes.append({"id": boq_id, "project_id": project_id, "received_quantity": value})
+
+        if fix and discrepancies:
+            for project_id in {d.projectId for d in discrepancies if d.table == "project_ledger"}:
+                want = expected.get(project_id, dict.fromkeys(_PROJECT_COLUMNS, 0.0))
+                db.merge(models.ProjectLedger(project_id=project_id, **want))
+                db.execute(update(models.Project).where(models.Project.id == project_id).values(spent=want["committed_amount"]))
+            LedgerService._rebuild_boq_ledger(db, {d.projectId for d in discrepancies if d.table != "project_boq"})
+            if boq_fixes:
+                db.execute(update(models.ProjectBOQ), boq_fixes)
+            db.commit()
+            logger.warning(f"Ledger reconciliation repaired {len(discrepancies)} discrepancies")
+
+        checked = set(expected) | set(actual) | {p for p, _ in expected_lines} | {p for p, _ in lines}
+        return schemas.LedgerReconciliation(projectsChecked=len(checked), fixed=fix and bool(discrepancies),
+                                            discrepancies=discrepancies)
+
+    @staticmethod
+    def _rebuild_boq_ledger(db: Session, project_ids: set):
+        if not project_ids:
+            return
+        rows = LedgerService._expected_boq_lines(db, project_ids)
+        db.query(models.BOQLedger).filter(models.BOQLedger.project_id.in_(project_ids)).delete(synchronize_session=False)
+        if rows:
+            db.execute(insert(models.BOQLedger), [{"project_id": p, "item_id": i, **want} for (p, i), want in rows.items()])
+
+if __name__ == "__main__":
+    # Nightly job: python -m backend.services.ledger_service [--fix]
+    import sys
+    from ..database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as session:
+        result = LedgerService.reconcile(session, fix="--fix" in sys.argv)
+    print(result.model_dump_json(indent=2))
+    sys.exit(1 if result.discrepancies and not result.fixed else 0)
@@ -0,0 +1,254 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Iterable, List, Optional
+
+from sqlalchemy import Numeric, String, bindparam, case, cast, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..database import WRITE_RETRY_ATTEMPTS, WRITE_RETRY_BACKOFF_SECONDS, is_retryable_conflict
+from .audit_service import audit_writer
+from .dashboard_service import DashboardService
+
+logger = logging.getLogger(__name__)
+
+MATCH_TOLERANCE_DEFAULT = float(os.getenv("MATCH_TOLERANCE_DEFAULT", "100.0"))
+MATCH_CHUNK_SIZE = int(os.getenv("MATCH_CHUNK_SIZE", "1000"))
+MATCH_QUEUE_BATCH = int(os.getenv("MATCH_QUEUE_BATCH", "200"))
+# Statuses the automatic and bulk re-match touch; MATCHED invoices stay as they are
+REMATCH_STATUSES = ("PENDING_MATCH", "MISMATCH")
+
+
+class MatchingService:
+    """Three-way match (PO price x received quantity vs invoice total) as set-based SQL.
+
+    One UPDATE scores a whole chunk of invoices against their PO's GRN value and tolerance, and one
+    INSERT ... SELECT stores the per-line breakdown, so re-matching thousands of invoices costs a few
+    statements per chunk rather than a PO load per invoice.
+    """
+
+    @staticmethod
+    def _grn_value():
+        line = models.POItem
+        return (
+            select(func.coalesce(func.sum(func.coalesce(line.received_quantity, 0.0) * line.price), 0.0))
+            .where(line.po_id == models.Invoice.po_id)
+            .scalar_subquery()
+        )
+
+    @staticmethod
+    def _tolerance():
+        # Supplier setting first, then project, then the global default
+        po = models.PurchaseOrder
+        configured = (
+            select(func.coalesce(models.Supplier.match_tolerance, models.Project.match_tolerance))
+            .select_from(po)
+            .outerjoin(models.Supplier, models.Supplier.id == po.supplier_id)
+            .outerjoin(models.Project, models.Project.id == po.project_id)
+            .where(po.id == models.Invoice.po_id)
+            .scalar_subquery()
+        )
+        return func.coalesce(configured, MATCH_TOLERANCE_DEFAULT)
+
+    @staticmethod
+    def _amount(value):
+        # Two decimals, as text for the details message (round() needs numeric on PostgreSQL)
+        return cast(func.round(cast(value, Numeric), 2), String)
+
+    @staticmethod
+    def _score(db: Session, invoice_ids: List[str]):
+        # Returns (id, po_id, status, variance) of every scored invoice, for the audit log
+        inv = models.Invoice
+        grn = MatchingService._grn_value()
+        within = func.abs(inv.total_amount - grn) <= MatchingService._tolerance()
+        total, grn_text, variance = (MatchingService._amount(v) for v in (inv.total_amount, grn, inv.total_amount - grn))
+        return db.execute(
+            update(inv)
+            .where(inv.id.in_(invoice_ids))
+            .values(
+                grn_value=grn,
+                variance=inv.total_amount - grn,
+                match_tolerance=MatchingService._tolerance(),
+                status=case((within, "MATCHED"), else_="MISMATCH"),
+                match_status_details=case(
+                    (within, "Success. Variance: " + variance + " (within limit). GRN Value: " + grn_text),
+                    else_="Failed. Invoice: " + total + ", GRN Value: " + grn_text + ". Variance: " + variance,
+                ),
+                matched_at=func.now(),
+            )
+            .returning(inv.id, inv.po_id, inv.status, inv.variance)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+    @staticmethod
+    def _store_lines(db: Session, invoice_ids: List[str]):
+        inv, line, match = models.Invoice, models.POItem, models.InvoiceMatchLine
+        ordered = (
+            select(line.po_id, func.sum(line.quantity * line.price).label("value"))
+            .group_by(line.po_id)
+            .subquery()
+        )
+        received_value = func.coalesce(line.received_quantity, 0.0) * line.price
+        # Invoices carry a single total: allocate it over the PO lines by ordered value
+        billed = case((ordered.c.value > 0, inv.total_amount * line.quantity * line.price / ordered.c.value), else_=0.0)
+        db.execute(delete(match).where(match.invoice_id.in_(invoice_ids)))
+        db.execute(insert(match).from_select(
+            ["invoice_id", "po_item_id", "item_id", "ordered_quantity", "received_quantity", "unit_price",
+             "received_value", "billed_amount", "variance"],
+            select(inv.id, line.id, line.item_id, line.quantity, func.coalesce(line.received_quantity, 0.0), line.price,
+                   received_value, billed, billed - received_value)
+            .join(line, line.po_id == inv.po_id)
+            .join(ordered, ordered.c.po_id == inv.po_id)
+            .where(inv.id.in_(invoice_ids)),
+        ))
+
+    @staticmethod
+    def rematch(db: Session, *, po_ids: Optional[Iterable[str]] = None, invoice_ids: Optional[Iterable[str]] = None,
+                statuses: Optional[Iterable[str]] = REMATCH_STATUSES, chunk_size: int = MATCH_CHUNK_SIZE,
+                actor=None, trigger: str = "automatic") -> schemas.MatchRunReport:
+        """Re-match the selected invoices chunk by chunk (keyset on id), committing after each chunk.
+
+        Every scored invoice is audited as done by `actor` (None: the system), tagged with `trigger`.
+        """
+        inv = models.Invoice
+        candidates = select(inv.id).where(inv.po_id.isnot(None))
+        if po_ids is not None: candidates = candidates.where(inv.po_id.in_(list(po_ids)))
+        if invoice_ids is not None: candidates = candidates.where(inv.id.in_(list(invoice_ids)))
+        if statuses is not None:
+            # Inlined values: the planner can only match the partial ix_invoices_unmatched against literals
+            candidates = candidates.where(inv.status.in_(bindparam("statuses", list(statuses), expanding=True, literal_execute=True)))
+
+        report = schemas.MatchRunReport()
+        last_id = None
+        while True:
+            stmt = candidates.order_by(inv.id).limit(chunk_size)
+            if last_id is not None:
+                stmt = stmt.where(inv.id > last_id)
+            chunk = list(db.scalars(stmt))
+            if not chunk:
+                break
+            by_status = select(inv.status, func.count(), func.sum(inv.total_amount)).where(inv.id.in_(chunk)).group_by(inv.status)
+            before = db.execute(by_status).all()
+            scored = MatchingService._score(db, chunk)
+            MatchingService._store_lines(db, chunk)
+            after = db.execute(by_status).all()
+            for status, count, _ in after:
+                if status == "MATCHED": report.matched += count
+                else: report.mismatched += count
+            # The bulk UPDATE bypasses the ORM: hand the status moves to the dashboard counters
+            DashboardService.record_status_change(db, models.Invoice, before, after)
+            report.processed += len(chunk)
+            db.commit()
+            for invoice_id, po_id, status, variance in scored:
+                audit_writer.record(actor, "INVOICE_MATCHED" if status == "MATCHED" else "INVOICE_MISMATCHED", invoice_id,
+                                    poId=po_id, variance=variance, trigger=trigger)
+            last_id = chunk[-1]
+        return report
+
+    @staticmethod
+    def get_match_lines(db: Session, invoice_id: str) -> List[models.InvoiceMatchLine]:
+        return list(db.scalars(
+            select(models.InvoiceMatchLine).where(models.InvoiceMatchLine.invoice_id == invoice_id)
+            .order_by(models.InvoiceMatchLine.po_item_id)
+        ))
+
+
+_STOP = object()
+
+
+class MatchWorker:
+    """Background thread that re-matches the open invoices of POs whose receipts or invoices changed.
+
+    Submissions are PO ids; the worker drains whatever is queued (up to MATCH_QUEUE_BATCH), de-duplicates
+    it and runs one MatchingService.rematch for the batch on its own session.
+    """
+
+    def __init__(self, batch_size: int = MATCH_QUEUE_BATCH):
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._session_factory = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, session_factory):
+        if self.running:
+            return
+        self._session_factory = session_factory
+        self._thread = threading.Thread(target=self._loop, name="match-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, *po_ids: str):
+        if not self.running:
+            # Nothing lost: the bulk re-match job picks these invoices up
+            logger.debug("Match worker not running; skipping re-match of %s", po_ids)
+            return
+        for po_id in po_ids:
+            self._queue.put(po_id)
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """Block until everything submitted so far has been processed (tests, graceful shutdown)."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                po_ids = {item for item in batch if item is not _STOP}
+                if po_ids:
+                    self._process(po_ids)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if _STOP in batch:
+                return
+
+    def _process(self, po_ids: set):
+        for attempt in range(1, WRITE_RETRY_ATTEMPTS + 1):
+            with self._session_factory() as db:
+                try:
+                    MatchingService.rematch(db, po_ids=sorted(po_ids))
+                    return
+                except Exception as e:
+                    db.rollback()
+                    if not is_retryable_conflict(e) or attempt == WRITE_RETRY_ATTEMPTS:
+                        logger.error(f"Invoice re-match failed for {len(po_ids)} POs: {e}")
+                        return
+            time.sleep(WRITE_RETRY_BACKOFF_SECONDS * attempt)
+
+
+match_worker = MatchWorker()
+
+
+if __name__ == "__main__":
+    # Bulk job: python -m backend.services.matching_service
+    from ..database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as session:
+        result = MatchingService.rematch(session)
+    print(result.model_dump_json(indent=2))
@@ -1,8 +1,26 @@
 
-from sqlalchemy.orm import Session
+from sqlalchemy import case, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.exc import StaleDataError
 from fastapi import HTTPException
 from .. import models, schemas
+from ..database import WRITE_RETRY_ATTEMPTS, WRITE_RETRY_BACKOFF_SECONDS, is_retryable_conflict
+from .analytics_service import ProcurementAnalyticsService
+from .audit_service import audit_writer
+from .comparison_service import QuoteComparisonService
+from .dashboard_service import DashboardService
+from .ledger_service import LedgerService
+from .matching_service import MatchingService, match_worker
+import asyncio
+import collections
 import datetime
+import logging
+import random
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
 
 class ProcurementService:
     
@@ -54,26 +72,55 @@ class ProcurementService:
 
     @staticmethod
     def create_quotation(db: Session, quote_data: schemas.QuotationCreate):
+        total = quote_data.totalAmount
+        if quote_data.items:
+            # One price per item: a repeated line would be added to the total twice and awarded at its last price
+            counts = collections.Counter(line.itemId for line in quote_data.items)
+            duplicates = sorted(item_id for item_id, n in counts.items() if n > 1)
+            if duplicates:
+                raise HTTPException(status_code=400, detail=f"Items quoted more than once: {', '.join(duplicates)}")
+            rfq = db.get(models.RFQ, quote_data.rfqId)
+            if not rfq: raise HTTPException(status_code=404, detail="RFQ not found")
+            requested = {}
+            for item_id, qty in db.execute(
+                select(models.RequestItem.item_id, models.RequestItem.quantity)
+                .where(models.RequestItem.request_id == rfq.material_request_id)
+            ):
+                requested[item_id] = requested.get(item_id, 0.0) + qty
+            unknown = [line.itemId for line in quote_data.items if line.itemId not in requested]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Items not requested in this RFQ: {', '.join(unknown)}")
+            # Line-priced quotes: the total is what the requested quantities cost at the quoted prices
+            total = sum(requested[line.itemId] * line.unitPrice for line in quote_data.items)
+        elif total is None:
+            raise HTTPException(status_code=400, detail="Provide totalAmount or priced items")
+
         db_quote = models.Quotation(
             rfq_id=quote_data.rfqId,
             supplier_id=quote_data.supplierId,
-            total_amount=quote_data.totalAmount,
+            total_amount=total,
             currency=quote_data.currency,
             valid_until=quote_data.validUntil,
+            lead_time_days=quote_data.leadTimeDays,
             is_selected=False
         )
+        db_quote.items = [
+            models.QuotationItem(item_id=line.itemId, unit_price=line.unitPrice, lead_time_days=line.leadTimeDays)
+            for line in quote_data.items
+        ]
         db.add(db_quote)
         db.commit()
         db.refresh(db_quote)
         return db_quote
 
     @staticmethod
-    def select_winning_quotation(db: Session, rfq_id: str, quotation_id: str):
+    def select_winning_quotation(db: Session, rfq_id: str, quotation_id: str, user=None):
         # 1. Validation
         rfq = db.query(models.RFQ).filter(models.RFQ.id == rfq_id).first()
         if not rfq: raise HTTPException(status_code=404, detail="RFQ not found")
         
-        quote = db.query(models.Quotation).filter(models.Quotation.id == quotation_id, models.Quotation.rfq_id == rfq_id).first()
+        quote = db.query(models.Quotation).options(selectinload(models.Quotation.items)) \
+            .filter(models.Quotation.id == quotation_id, models.Quotation.rfq_id == rfq_id).first()
         if not quote: raise HTTPException(status_code=404, detail="Quotation not found for this RFQ")
         
         if rfq.status != "OPEN": raise HTTPException(status_code=400, detail="RFQ is not OPEN")
@@ -84,36 +131,38 @@ class ProcurementService:
         
         # 3. Generate PO automatically from Context
         # Fetch PR items to know what was ordered
-        pr = db.query(models.MaterialRequest).filter(models.MaterialRequest.id == rfq.material_request_id).first()
+        pr = db.query(models.MaterialRequest).options(selectinload(models.MaterialRequest.items)) \
+            .filter(models.MaterialRequest.id == rfq.material_request_id).first()
         if not pr: raise HTTPException(status_code=500, detail="Original PR missing")
 
+        if quote.items:
+            # Line-priced quote: order exactly the quoted lines at their quoted prices
+            prices = {line.item_id: line.unit_price for line in quote.items}
+            po_lines = [(req_item.item_id, req_item.quantity, prices[req_item.item_id])
+                        for req_item in pr.items if req_item.item_id in prices]
+        else:
+            # Lump-sum quote: allocate the total per unit so the PO lines add up to the quoted amount
+            total_qty = sum(req_item.quantity for req_item in pr.items)
+            unit_price = quote.total_amount / total_qty if total_qty > 0 else 0.0
+            po_lines = [(req_item.item_id, req_item.quantity, unit_price) for req_item in pr.items]
+
         db_po = models.PurchaseOrder(
             project_id=pr.project_id,
             supplier_id=quote.supplier_id,
             material_request_id=pr.id,
             quotation_id=quote.id,
             status="PENDING_APPROVAL",
-            total_amount=quote.total_amount
+            total_amount=sum(qty * price for _, qty, price in po_lines)
         )
+        db_po.items = [
+            models.POItem(item_id=item_id, quantity=qty, price=price, received_quantity=0.0)
+            for item_id, qty, price in po_lines
+        ]
         db.add(db_po)
-        db.flush()
-
-        # Distribute Cost (Simple allocation for Lump Sum quotes)
-        # In a real system with line-item quotes, we would map specific prices.
-        item_count = len(pr.items)
-        avg_price = quote.total_amount / item_count if item_count > 0 else 0
-
-        for req_item in pr.items:
-            db.add(models.POItem(
-                po_id=db_po.id,
-                item_id=req_item.item_id,
-                quantity=req_item.quantity,
-                price=avg_price, # Allocated price
-                received_quantity=0.0
-            ))
-
         db.commit()
         db.refresh(db_po)
+        audit_writer.record(user, "WINNER_SELECTED", rfq.id, quotationId=quote.id, supplierId=quote.supplier_id,
+                            poId=db_po.id, amount=db_po.total_amount)
         return db_po
 
     @staticmethod
@@ -153,90 +202,112 @@ class ProcurementService:
 
     @staticmethod
     def approve_po(db: Session, po_id: str, user: models.User):
-        po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.id == po_id).first()
+        po = db.query(models.PurchaseOrder).options(selectinload(models.PurchaseOrder.items)) \
+            .filter(models.PurchaseOrder.id == po_id).first()
         if not po:
             raise HTTPException(status_code=404, detail="PO not found")
         
         if user.role not in ["ADMIN", "GENERAL_MANAGER"] and po.total_amount > user.approval_limit:
             raise HTTPException(status_code=403, detail="Amount exceeds approval limit")
+
+        # Approving twice would commit the same spend twice
+        if po.status != "PENDING_APPROVAL":
+            raise HTTPException(status_code=400, detail=f"PO is not pending approval (status: {po.status})")
         
         po.status = "APPROVED"
+        LedgerService.record_po_approval(db, po)
         db.commit()
+        audit_writer.record(user, "PO_APPROVED", po.id, amount=po.total_amount, projectId=po.project_id)
         return po
 
     @staticmethod
-    def create_receipt(db: Session, rec_data: schemas.ReceiptCreate, user_id: str):
-        po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.id == rec_data.poId).first()
+    def create_receipt(db: Session, rec_data: schemas.ReceiptCreate, user):
+        # Lock the PO row so concurrent receipts against the same PO queue up behind each other
+        po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.id == rec_data.poId).with_for_update().first()
         if not po:
             raise HTTPException(status_code=404, detail="PO not found")
-        
-        db_rec = models.Receipt(
-            po_id=rec_data.poId,
-            received_by=user_id
-        )
-        db.add(db_rec)
-        db.flush()
 
-        all_fully_received = True
+        # All PO lines in one query; a receipt line maps onto the first PO line for its item
+        lines = {}
+        for row in db.execute(
+            select(models.POItem.id, models.POItem.item_id, models.POItem.quantity,
+                   models.POItem.received_quantity, models.POItem.price)
+            .where(models.POItem.po_id == po.id).order_by(models.POItem.id)
+        ):
+            lines.setdefault(row.item_id, row)
 
+        deltas = {}
         for rec_item in rec_data.items:
-            po_line = db.query(models.POItem).filter(
-                models.POItem.po_id == rec_data.poId,
-                models.POItem.item_id == rec_item.itemId
-            ).first()
-
-            if not po_line: continue
-
-            if po_line.received_quantity + rec_item.quantity > po_line.quantity:
+            if rec_item.itemId in lines:
+                deltas[rec_item.itemId] = deltas.get(rec_item.itemId, 0.0) + rec_item.quantity
+        for item_id, delta in deltas.items():
+            line = lines[item_id]
+            if (line.received_quantity or 0.0) + delta > line.quantity:
                 raise HTTPException(
-                    status_code=400, 
-                    detail=f"Cannot receive {rec_item.quantity}. Only {po_line.quantity - po_line.received_quantity} remaining for item."
+                    status_code=400,
+                    detail=f"Cannot receive {delta}. Only {line.quantity - (line.received_quantity or 0.0)} remaining for item."
                 )
 
-            po_line.received_quantity += rec_item.quantity
-            if po_line.received_quantity < po_line.quantity:
-                all_fully_received = False
+        db_rec = models.Receipt(
+            po_id=rec_data.poId,
+            received_by=user.id
+        )
+        db_rec.items = [
+            models.ReceiptItem(item_id=rec_item.itemId, quantity=rec_item.quantity)
+            for rec_item in rec_data.items if rec_item.itemId in lines
+        ]
+        db.add(db_rec)
 
-            db.add(models.ReceiptItem(
-                receipt_id=db_rec.id,
-                item_id=rec_item.itemId,
-                quantity=rec_item.quantity
-            ))
-        
-        if all_fully_received:
-            for line in po.items:
-                if line.received_quantity < line.quantity:
-                    all_fully_received = False
-                    break
-        
-        po.status = "RECEIVED" if all_fully_received else "PARTIALLY_RECEIVED"
+        if deltas:
+            # One guarded UPDATE for every line: a line that would go over its ordered quantity is not touched
+            line_ids = [lines[item_id].id for item_id in deltas]
+            delta = case({lines[item_id].id: value for item_id, value in deltas.items()}, value=models.POItem.id)
+            result = db.execute(
+                update(models.POItem)
+                .where(models.POItem.id.in_(line_ids),
+                       func.coalesce(models.POItem.received_quantity, 0.0) + delta <= models.POItem.quantity)
+                .values(received_quantity=func.coalesce(models.POItem.received_quantity, 0.0) + delta,
+                        version=models.POItem.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != len(line_ids):
+                # Another receipt got there first; the caller retries against fresh quantities
+                raise StaleDataError("PO lines changed while receiving")
+
+        # Status from one aggregate over the updated lines
+        open_lines = db.scalar(
+            select(func.count()).select_from(models.POItem)
+            .where(models.POItem.po_id == po.id, func.coalesce(models.POItem.received_quantity, 0.0) < models.POItem.quantity)
+        )
+        new_status = "RECEIVED" if open_lines == 0 else "PARTIALLY_RECEIVED"
+        if po.status != new_status:
+            po.status = new_status  # a real change keeps its old value in the history (dashboard counters)
+        else:
+            # Always bump the PO version; through `version` itself, so no tracked attribute loses its old value
+            po.version = po.version + 1
+        LedgerService.record_receipt(db, po.project_id, [
+            (item_id, value, lines[item_id].price) for item_id, value in deltas.items()
+        ])
         db.commit()
+        audit_writer.record(user, "GOODS_RECEIVED", po.id, receiptId=db_rec.id, status=new_status,
+                            quantities={item_id: value for item_id, value in deltas.items()})
+        # New GRN value: open invoices on this PO are re-matched in the background
+        match_worker.submit(po.id)
         return db_rec
 
     @staticmethod
-    def perform_three_way_match(db: Session, invoice: models.Invoice):
-        po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.id == invoice.po_id).first()
-        if not po: return
-        
-        # 1. Calculate GRN Value (Value of Goods Actually Received)
-        grn_value = sum(item.received_quantity * item.price for item in po.items)
-        
-        # 2. Compare with Invoice Amount
-        variance = invoice.total_amount - grn_value
-        tolerance = 100.0 # Configurable tolerance
-
-        if abs(variance) <= tolerance:
-            invoice.status = "MATCHED"
-            invoice.match_status_details = f"Success. Variance: {variance:.2f} (within limit). GRN Value: {grn_value}"
-        else:
-            invoice.status = "MISMATCH"
-            invoice.match_status_details = f"Failed. Invoice: {invoice.total_amount}, GRN Value: {grn_value}. Variance: {variance:.2f}"
-        
-        db.commit()
+    def perform_three_way_match(db: Session, invoice: models.Invoice, user=None):
+        # Same set-based path as the background and bulk re-match, limited to this invoice
+        MatchingService.rematch(db, invoice_ids=[invoice.id], statuses=None, actor=user, trigger="manual")
+        db.refresh(invoice)
         return invoice
 
     @staticmethod
     def create_invoice(db: Session, inv_data: schemas.InvoiceCreate):
+        po = db.get(models.PurchaseOrder, inv_data.poId)
+        if not po:
+            raise HTTPException(status_code=404, detail="PO not found")
+
         db_inv = models.Invoice(
             po_id=inv_data.poId,
             supplier_invoice_number=inv_data.supplierInvoiceNumber,
@@ -244,18 +315,131 @@ class ProcurementService:
             status="PENDING_MATCH"
         )
         db.add(db_inv)
+        LedgerService.record_invoice(db, po.project_id, db_inv.total_amount)
         db.commit()
         db.refresh(db_inv)
-        
-        # Trigger Match
-        return ProcurementService.perform_three_way_match(db, db_inv)
+
+        # Matching runs on the background worker; the invoice is returned as PENDING_MATCH
+        match_worker.submit(po.id)
+        return db_inv
 
     @staticmethod
-    def match_invoice_manually(db: Session, invoice_id: str):
+    def match_invoice_manually(db: Session, invoice_id: str, user=None):
         inv = db.query(models.Invoice).filter(models.Invoice.id == invoice_id).first()
         if not inv: raise HTTPException(status_code=404, detail="Invoice not found")
-        return ProcurementService.perform_three_way_match(db, inv)
+        return ProcurementService.perform_three_way_match(db, inv, user)
+
+    @staticmethod
+    def rematch_invoices(db: Session, user=None):
+        return MatchingService.rematch(db, actor=user, trigger="bulk")
 
     @staticmethod
     def get_project_boq(db: Session, project_id: str):
         return db.query(models.ProjectBOQ).filter(models.ProjectBOQ.project_id == project_id).all()
+
+
+class AsyncProcurementService:
+    """Async entry points for the routes.
+
+    Each call runs the ProcurementService implementation on the AsyncSession's connection through
+    run_sync, so the business rules live in one place and only the I/O is awaited. When `out` is
+    given the result is serialized inside the same greenlet, where relationship loads are still allowed.
+    """
+
+    @staticmethod
+    async def _run(db: AsyncSession, method, *args, out=None):
+        def call(session: Session):
+            result = method(session, *args)
+            if out is None or result is None:
+                return result
+            if isinstance(result, list):
+                return [out.model_validate(row) for row in result]
+            return out.model_validate(result)
+
+        # A lost race (stale version, deadlock, busy lock) rolls back and re-runs on fresh rows
+        for attempt in range(1, WRITE_RETRY_ATTEMPTS + 1):
+            try:
+                return await db.run_sync(call)
+            except Exception as e:
+                if not is_retryable_conflict(e):
+                    raise
+                await db.rollback()
+                if attempt == WRITE_RETRY_ATTEMPTS:
+                    logger.warning(f"{method.__name__} gave up after {attempt} conflicting attempts: {e.__class__.__name__}")
+                    raise HTTPException(status_code=409, detail="Concurrent update conflict; please retry",
+                                        headers={"Retry-After": "1"})
+                await asyncio.sleep(WRITE_RETRY_BACKOFF_SECONDS * attempt * (1 + random.random()))
+
+    @staticmethod
+    async def create_material_request(db: AsyncSession, req: schemas.RequestCreate, user_id: str):
+        return await AsyncProcurementService._run(db, ProcurementService.create_material_request, req, user_id, out=schemas.RequestOut)
+
+    @staticmethod
+    async def create_rfq(db: AsyncSession, rfq_data: schemas.RFQCreate, user_id: str):
+        return await AsyncProcurementService._run(db, ProcurementService.create_rfq, rfq_data, user_id, out=schemas.RFQOut)
+
+    @staticmethod
+    async def create_quotation(db: AsyncSession, quote_data: schemas.QuotationCreate):
+        return await AsyncProcurementService._run(db, ProcurementService.create_quotation, quote_data, out=schemas.QuotationOut)
+
+    @staticmethod
+    async def compare_quotations(db: AsyncSession, rfq_id: str, top: int = 3):
+        return await db.run_sync(QuoteComparisonService.compare, rfq_id, top)
+
+    @staticmethod
+    async def select_winning_quotation(db: AsyncSession, rfq_id: str, quotation_id: str, user=None):
+        return await AsyncProcurementService._run(db, ProcurementService.select_winning_quotation, rfq_id, quotation_id, user,
+                                                  out=schemas.POOut)
+
+    @staticmethod
+    async def create_po(db: AsyncSession, po_data: schemas.POCreate, user_id: str):
+        return await AsyncProcurementService._run(db, ProcurementService.create_po, po_data, user_id, out=schemas.POOut)
+
+    @staticmethod
+    async def approve_po(db: AsyncSession, po_id: str, user: models.User):
+        return await AsyncProcurementService._run(db, ProcurementService.approve_po, po_id, user)
+
+    @staticmethod
+    async def create_receipt(db: AsyncSession, rec_data: schemas.ReceiptCreate, user):
+        return await AsyncProcurementService._run(db, ProcurementService.create_receipt, rec_data, user, out=schemas.ReceiptOut)
+
+    @staticmethod
+    async def create_invoice(db: AsyncSession, inv_data: schemas.InvoiceCreate):
+        return await AsyncProcurementService._run(db, ProcurementService.create_invoice, inv_data, out=schemas.InvoiceOut)
+
+    @staticmethod
+    async def match_invoice_manually(db: AsyncSession, invoice_id: str, user=None):
+        return await AsyncProcurementService._run(db, ProcurementService.match_invoice_manually, invoice_id, user,
+                                                  out=schemas.InvoiceOut)
+
+    @staticmethod
+    async def get_invoice_match_lines(db: AsyncSession, invoice_id: str):
+        return await AsyncProcurementService._run(db, MatchingService.get_match_lines, invoice_id, out=schemas.InvoiceMatchLineOut)
+
+    @staticmethod
+    async def rematch_invoices(db: AsyncSession, user=None):
+        return await AsyncProcurementService._run(db, ProcurementService.rematch_invoices, user)
+
+    @staticmethod
+    async def get_dashboard(db: AsyncSession):
+        return await db.run_sync(DashboardService.get_dashboard)
+
+    @staticmethod
+    async def rebuild_dashboard(db: AsyncSession):
+        return await db.run_sync(DashboardService.rebuild)
+
+    @staticmethod
+    async def procurement_summary(db: AsyncSession, project_id: Optional[str] = None):
+        return await db.run_sync(ProcurementAnalyticsService.summarize, project_id)
+
+    @staticmethod
+    async def get_boq_progress(db: AsyncSession, project_id: str):
+        return await db.run_sync(LedgerService.get_boq_progress, project_id)
+
+    @staticmethod
+    async def get_project_financials(db: AsyncSession, project_id: str):
+        return await db.run_sync(LedgerService.get_financials, project_id)
+
+    @staticmethod
+    async def get_project_boq(db: AsyncSession, project_id: str):
+        return await AsyncProcurementService._run(db, ProcurementService.get_project_boq, project_id, out=schemas.ProjectBOQOut)
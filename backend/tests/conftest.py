@@ -0,0 +1,126 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ENV", "DEVELOPMENT")
+os.environ.setdefault("BCRYPT_ROUNDS", "5")
+os.environ.setdefault("AI_BACKEND", "fake")  # never reach the network from tests
+os.environ.setdefault("AUDIT_WAL_DIR", tempfile.mkdtemp(prefix="itqan-audit-wal-"))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from ..database import Base, get_db, get_session_factory
+from ..main import app
+from .. import models, auth
+from ..auth_cache import principal_cache
+from ..idempotency import idempotency_store
+from ..ai_client import ai_client
+from ..instrumentation import metrics
+from ..profiling import profiler
+from ..services.audit_service import audit_writer
+from ..services.matching_service import match_worker
+
+
+@pytest.fixture(autouse=True)
+def _reset_process_caches():
+    # Tokens minted within the same second are identical across tests
+    principal_cache.clear()
+    idempotency_store.clear()
+    ai_client.cache.clear()
+    metrics.clear()
+    profiler.clear()
+    audit_writer.clear()
+    yield
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    # Per-test SQLite file: seeded through this sync engine, served to the app through async_engine
+    test_engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=test_engine)
+    yield test_engine
+    test_engine.dispose()
+
+
+@pytest.fixture()
+def async_engine(engine, tmp_path):
+    # NullPool: TestClient may run each request on a fresh event loop
+    test_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+    yield test_engine
+    test_engine.sync_engine.dispose()
+
+
+@pytest.fixture()
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture()
+def client(engine, async_engine):
+    TestingSession = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_db():
+        async with TestingSession() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: TestingSession
+    # Background matcher on the test database; tests call match_worker.drain() before asserting
+    match_worker.start(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    # Audit writer likewise; tests call audit_writer.flush() before reading audit_logs
+    audit_writer.start(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    yield TestClient(app)
+    match_worker.stop()
+    audit_writer.stop()
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture()
+def admin(db):
+    user = models.User(name="Admin", email="admin@test.com", password_hash="x", role="ADMIN", approval_limit=0.0)
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture()
+def admin_headers(admin):
+    token = auth.create_access_token({"sub": admin.email, "role": admin.role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def selects(self):
+        return sum(1 for s in self.statements if s.lstrip().upper().startswith("SELECT"))
+
+
+@pytest.fixture()
+def count_queries(async_engine):
+    """Context manager recording every statement the app's engine runs inside the block."""
+    @contextmanager
+    def counter():
+        recorded = QueryCounter()
+
+        def on_execute(conn, cursor, statement, parameters, context, executemany):
+            recorded.statements.append(statement)
+
+        event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+        try:
+            yield recorded
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    return counter
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from ..ai_client import AIClient, AIError, FakeBackend, ai_client
+
+
+class _Gauge(FakeBackend):
+    def __init__(self, delay):
+        super().__init__(delay=delay)
+        self.active = self.peak = 0
+
+    async def generate(self, prompt):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            return await super().generate(prompt)
+        finally:
+            self.active -= 1
+
+
+def test_analyze_is_cached_by_context_and_data(client, admin_headers):
+    fake = FakeBackend(responses={"budget": "Budget at risk"})
+    ai_client.set_backend(fake)
+    try:
+        body = {"context": "dashboard", "data": {"budget": 100, "spent": 90}}
+        res = client.post("/api/ai/analyze", headers=admin_headers, json=body)
+        assert res.json() == {"text": "Budget at risk", "source": "ai"}
+        # Same analysis over the same local summary: served from the cache
+        res = client.post("/api/ai/analyze", headers=admin_headers,
+                          json={"context": "dashboard", "data": {"spent": 90, "budget": 100}})
+        assert res.json()["text"] == "Budget at risk" and len(fake.prompts) == 1
+
+        ai_client.set_backend(None)
+        res = client.post("/api/ai/analyze", headers=admin_headers, json={"context": "other", "data": {}})
+        assert res.json()["source"] == "local" and res.json()["detail"] == "AI Service Unavailable (Missing Key)"
+    finally:
+        ai_client.set_backend(FakeBackend())
+
+
+def test_identical_calls_are_coalesced_and_concurrency_is_bounded():
+    backend = _Gauge(delay=0.05)
+    ai = AIClient(backend, max_concurrency=2)
+
+    async def run():
+        same = await asyncio.gather(*[ai.generate("same prompt") for _ in range(5)])
+        distinct = await asyncio.gather(*[ai.generate(f"prompt {i}") for i in range(6)])
+        return same, distinct
+
+    same, distinct = asyncio.run(run())
+    assert len(set(same)) == 1 and backend.prompts.count("same prompt") == 1
+    assert len(set(distinct)) == 6 and backend.peak == 2
+
+
+def test_timeout_raises_and_is_not_cached():
+    ai = AIClient(FakeBackend(delay=1.0), timeout=0.05)
+    with pytest.raises(AIError, match="timed out"):
+        asyncio.run(ai.generate("slow"))
+    ai.set_backend(FakeBackend(responses={"slow": "done"}))
+    assert asyncio.run(ai.generate("slow")) == "done"
+
+
+def test_timeout_includes_the_wait_for_a_free_slot():
+    ai = AIClient(FakeBackend(delay=1.0), timeout=0.2, max_concurrency=1)
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        results = await asyncio.gather(ai.generate("first"), ai.generate("second"), return_exceptions=True)
+        return results, asyncio.get_running_loop().time() - started
+
+    results, elapsed = asyncio.run(run())
+    # The second call queues behind the first and gives up at the same deadline, not one timeout later
+    assert all(isinstance(r, AIError) for r in results) and elapsed < 0.35
@@ -0,0 +1,69 @@
+import datetime
+
+from .. import models
+from ..services.analytics_service import ProcurementAnalyticsService
+from ..services.ledger_service import LedgerService
+
+NOW = datetime.datetime(2024, 6, 1)
+
+
+def _seed(db):
+    db.add_all([
+        models.Project(id="p-1", code="P1", name="Tower", budget=1000.0),
+        models.Project(id="p-2", code="P2", name="Bridge", budget=1000.0),
+        models.Supplier(id="s-1", name="Acme"), models.Supplier(id="s-2", name="Beta"),
+        models.Item(id="it-1", sku="CEM", name="Cement", base_price=10.0),
+        models.Item(id="it-2", sku="STL", name="Steel", base_price=100.0),
+    ])
+    for po_id, project_id, supplier_id, amount, price in [("po-1", "p-1", "s-1", 1100.0, 18.0), ("po-2", "p-2", "s-1", 600.0, 10.5),
+                                                          ("po-3", "p-2", "s-2", 300.0, 10.0)]:
+        po = models.PurchaseOrder(id=po_id, project_id=project_id, supplier_id=supplier_id, total_amount=amount, status="APPROVED")
+        po.items = [models.POItem(item_id="it-1", quantity=10.0, price=price)]
+        db.add(po)
+        db.flush()
+        LedgerService.record_po_approval(db, po)
+    db.add(models.PurchaseOrder(id="po-4", project_id="p-1", supplier_id="s-2", total_amount=5000.0, status="PENDING_APPROVAL"))
+    db.add(models.MaterialRequest(id="mr-1", project_id="p-2", requester_id="u-1"))
+    db.add(models.RFQ(id="rfq-late", material_request_id="mr-1", status="OPEN", deadline=datetime.datetime(2024, 5, 20)))
+    db.add(models.RFQ(id="rfq-ok", material_request_id="mr-1", status="OPEN", deadline=datetime.datetime(2024, 7, 1)))
+    quote = models.Quotation(id="q-1", rfq_id="rfq-late", supplier_id="s-2", total_amount=40.0)
+    quote.items = [models.QuotationItem(item_id="it-2", unit_price=40.0)]
+    db.add(quote)
+    db.add(models.Invoice(id="inv-1", po_id="po-2", total_amount=700.0, status="MISMATCH", variance=-100.0))
+    db.commit()
+
+
+def test_summary_flags_burn_concentration_outliers_and_late_rfqs(db):
+    _seed(db)
+    summary = ProcurementAnalyticsService.summarize(db, now=NOW)
+    assert (summary.totalBudget, summary.totalCommitted) == (2000.0, 2000.0)
+    assert summary.projectsOverBudget == 1 and summary.projectsAtRisk == 1
+    assert [b.code for b in summary.budgetBurn] == ["P1", "P2"] and summary.budgetBurn[0].burn == 1.1
+
+    # Pending PO not counted: Acme 1700 / Beta 300
+    assert summary.supplierCount == 2 and summary.topSuppliers[0].share == 0.85
+    assert summary.supplierHHI == round(0.85 ** 2 + 0.15 ** 2, 4)
+
+    assert summary.priceOutlierCount == 2
+    assert [(o.source, o.documentId, o.deviation) for o in summary.priceOutliers] == [("PO", "po-1", 0.8), ("QUOTE", "q-1", -0.6)]
+    assert summary.lateRfqCount == 1 and summary.lateRfqs[0].rfqId == "rfq-late"
+    assert summary.lateRfqs[0].daysLate == 12 and summary.lateRfqs[0].quotations == 1
+    assert (summary.invoiceMismatches, summary.invoiceMismatchVariance) == (1, 100.0)
+
+    text = ProcurementAnalyticsService.describe(summary)
+    assert "1 project(s) over budget" in text and "Acme holds 85%" in text and "CEM at +80%" in text
+
+    scoped = ProcurementAnalyticsService.summarize(db, project_id="p-2", now=NOW)
+    assert scoped.totalBudget == 1000.0 and scoped.supplierCount == 2 and scoped.lateRfqCount == 1
+    assert [o.documentId for o in scoped.priceOutliers] == ["q-1"]
+
+
+def test_summary_endpoint_and_compact_prompt(client, db, admin_headers, count_queries):
+    _seed(db)
+    client.get("/api/users/me", headers=admin_headers)
+    with count_queries() as counted:
+        res = client.get("/api/analytics/summary", headers=admin_headers, params={"project_id": "p-1"})
+    assert res.status_code == 200 and res.json()["projectsOverBudget"] == 1
+    assert counted.selects <= 9
+    context = ProcurementAnalyticsService.prompt_context(ProcurementAnalyticsService.summarize(db, project_id="p-1", now=NOW))
+    assert "lateRfqs" not in context and len(context) < 1000
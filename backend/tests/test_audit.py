@@ -0,0 +1,114 @@
+import datetime
+import json
+import os
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from .. import models
+from ..services.audit_service import AuditWriter, audit_writer
+from ..services.matching_service import match_worker
+
+
+def _rfq_with_quote(db):
+    db.add_all([models.Project(id="p-1", code="P1", name="Tower", budget=10_000.0),
+                models.Supplier(id="s-1", name="Steel Co"), models.User(id="u-eng", name="Eng", email="e@x", password_hash="x", role="SITE_ENGINEER")])
+    mr = models.MaterialRequest(id="mr-1", project_id="p-1", requester_id="u-eng", status="IN_PROCUREMENT")
+    mr.items = [models.RequestItem(item_id="i-1", quantity=10.0)]
+    db.add_all([mr, models.RFQ(id="rfq-1", material_request_id="mr-1", status="OPEN"),
+                models.Quotation(id="q-1", rfq_id="rfq-1", supplier_id="s-1", total_amount=500.0)])
+    db.commit()
+
+
+def test_mutations_are_audited_and_reviewable(client, db, admin, admin_headers):
+    _rfq_with_quote(db)
+    po = client.post("/api/rfqs/rfq-1/select-winner", headers=admin_headers, json={"quotationId": "q-1"}).json()
+    assert client.put(f"/api/purchase-orders/{po['id']}/approve", headers=admin_headers).status_code == 200
+    client.post("/api/receipts", headers=admin_headers, json={"poId": po["id"], "items": [{"itemId": "i-1", "quantity": 10}]})
+    invoice = client.post("/api/invoices", json={"poId": po["id"], "supplierInvoiceNumber": "A", "totalAmount": 500.0}).json()
+    assert match_worker.drain()
+    client.post(f"/api/invoices/{invoice['id']}/match", headers=admin_headers)
+    # Nothing is in the table until the writer flushes
+    assert db.query(models.AuditLog).count() == 0
+    audit_writer.flush()
+
+    entries = client.get("/api/admin/audit", headers=admin_headers).json()
+    assert [(e["action"], e["userName"], e["entityId"]) for e in entries] == [
+        ("INVOICE_MATCHED", "Admin", invoice["id"]),
+        ("INVOICE_MATCHED", "system", invoice["id"]),  # background matcher
+        ("GOODS_RECEIVED", "Admin", po["id"]),
+        ("PO_APPROVED", "Admin", po["id"]),
+        ("WINNER_SELECTED", "Admin", "rfq-1"),
+    ]
+    assert entries[0]["details"] == {"poId": po["id"], "variance": 0.0, "trigger": "manual"}
+    assert entries[-1]["userId"] == admin.id and entries[-1]["category"] == "RFQ"
+
+    # Filters and newest-first keyset pages
+    assert [e["action"] for e in client.get("/api/admin/audit", headers=admin_headers,
+                                            params={"entity_id": po["id"]}).json()] == ["GOODS_RECEIVED", "PO_APPROVED"]
+    assert len(client.get("/api/admin/audit", headers=admin_headers, params={"action": "INVOICE_MATCHED"}).json()) == 2
+    seen, cursor = [], None
+    while True:
+        res = client.get("/api/admin/audit", headers=admin_headers, params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        seen += [e["id"] for e in res.json()]
+        cursor = res.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert seen == [e["id"] for e in entries]
+
+    old = (datetime.datetime.utcnow() - datetime.timedelta(days=30)).isoformat()
+    assert client.get("/api/admin/audit", headers=admin_headers, params={"date_to": old}).json() == []
+    assert client.get("/api/admin/audit", headers=admin_headers, params={"date_from": "2020-01-01T00:00:00"}).status_code == 400
+
+
+@pytest.fixture()
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture()
+def wal_dir(tmp_path):
+    return tmp_path / "wal"
+
+
+def test_batches_are_multi_row_inserts_and_failed_flushes_keep_entries(engine, session_factory, wal_dir):
+    writer = AuditWriter(wal_dir=str(wal_dir), batch_size=4)
+    for n in range(10):
+        writer.record(None, "PO_APPROVED", f"po-{n}", amount=n)
+    assert len(os.listdir(wal_dir)) == 1
+
+    def broken():
+        raise ConnectionError("database unavailable")
+
+    writer._session_factory = broken
+    with pytest.raises(ConnectionError):
+        writer.flush()
+    assert writer.pending == 10 and len(os.listdir(wal_dir)) == 1
+
+    inserts = []
+    event.listen(engine, "before_cursor_execute", lambda *args: inserts.append(args[2]))
+    writer._session_factory = session_factory
+    assert writer.flush() == 10
+    assert len([s for s in inserts if s.startswith("INSERT INTO audit_logs")]) == 3  # 4 + 4 + 2 rows
+    assert writer.pending == 0 and os.listdir(wal_dir) == []
+    with session_factory() as db:
+        assert sorted(db.query(models.AuditLog.entity_id)) == sorted((f"po-{n}",) for n in range(10))
+
+
+def test_entries_left_by_a_crashed_process_are_replayed_once(session_factory, wal_dir):
+    crashed = AuditWriter(wal_dir=str(wal_dir))
+    entries = [crashed.record(None, "GOODS_RECEIVED", f"po-{n}") for n in range(3)]
+    path, f = crashed._segment
+    f.write(b'{"id": "torn')  # died mid-append
+    f.close()  # process gone: its lock is released, the segment stays
+    with session_factory() as db:  # and it had committed the first entry before dying
+        db.add(models.AuditLog(**{**entries[0], "details": json.dumps({})}))
+        db.commit()
+
+    writer = AuditWriter(wal_dir=str(wal_dir), flush_interval=0.01)
+    writer.start(session_factory)
+    writer.stop()
+    assert not os.path.exists(path)
+    with session_factory() as db:
+        assert sorted(e for (e,) in db.query(models.AuditLog.entity_id)) == ["po-0", "po-1", "po-2"]
@@ -0,0 +1,67 @@
+import threading
+
+from sqlalchemy import update
+
+from .. import auth, models
+
+
+def test_principal_served_from_cache(client, admin_headers, count_queries):
+    assert client.get("/api/users/me", headers=admin_headers).status_code == 200
+    with count_queries() as queries:
+        res = client.get("/api/users/me", headers=admin_headers)
+    assert res.status_code == 200
+    assert res.json()["role"] == "ADMIN"
+    assert queries.statements == []
+
+
+def test_role_change_invalidates(client, db, admin, admin_headers):
+    assert client.get("/api/users/me", headers=admin_headers).json()["role"] == "ADMIN"
+
+    admin.role = "ENGINEER"
+    db.commit()
+    assert client.get("/api/users/me", headers=admin_headers).json()["role"] == "ENGINEER"
+
+    admin.is_active = False
+    db.commit()
+    assert client.get("/api/users/me", headers=admin_headers).status_code == 401
+
+
+def test_invalidation_waits_for_the_commit(client, db, admin, admin_headers):
+    assert client.get("/api/users/me", headers=admin_headers).json()["role"] == "ADMIN"
+
+    admin.role = "ENGINEER"
+    db.flush()
+    # Not committed: a request now still reads (and caches) the old row
+    assert client.get("/api/users/me", headers=admin_headers).json()["role"] == "ADMIN"
+    db.commit()
+    assert client.get("/api/users/me", headers=admin_headers).json()["role"] == "ENGINEER"
+
+    db.execute(update(models.User).where(models.User.id == admin.id).values(role="ADMIN"))
+    db.commit()
+    assert client.get("/api/users/me", headers=admin_headers).json()["role"] == "ADMIN"
+
+
+def _login(client, password):
+    return client.post("/api/auth/login", data={"username": "admin@test.com", "password": password})
+
+
+def test_login_rehashes_outdated_hash(client, db, admin):
+    admin.password_hash = auth.CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("s3cret")
+    db.commit()
+
+    assert _login(client, "wrong").status_code == 401
+    assert _login(client, "s3cret").status_code == 200
+    db.expire_all()
+    assert auth.pwd_context.identify(admin.password_hash) == "bcrypt"
+    assert f"$2b${auth.BCRYPT_ROUNDS:02d}$" in admin.password_hash
+
+
+def test_login_rejected_fast_when_password_pool_saturated(client, db, admin, monkeypatch):
+    admin.password_hash = auth.get_password_hash("s3cret")
+    db.commit()
+    monkeypatch.setattr(auth, "_password_slots", threading.BoundedSemaphore(1))
+    auth._password_slots.acquire()
+
+    res = _login(client, "s3cret")
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "1"
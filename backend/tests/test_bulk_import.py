@@ -0,0 +1,90 @@
+import json
+import threading
+
+from .. import models
+from ..services import import_service
+from ..services.import_service import ImportService
+
+
+def test_csv_items_upsert_on_sku_with_row_errors(client, db, admin_headers):
+    db.add(models.Item(sku="REBAR", name="Old name", unit="t", base_price=1.0))
+    db.commit()
+    body = "sku,name,unit,basePrice\nREBAR,Rebar 12mm,t,950\nCEM,Cement,bag,not-a-number\nSAND,Sand,m3,40\n"
+
+    res = client.post("/api/import/items", headers=admin_headers, files={"file": ("items.csv", body, "text/csv")})
+    assert res.status_code == 200, res.text
+    report = res.json()
+    assert (report["processed"], report["imported"], report["failed"]) == (3, 2, 1)
+    assert report["errors"][0]["row"] == 2 and report["errors"][0]["errors"][0].startswith("basePrice")
+
+    db.expire_all()
+    items = {i.sku: i for i in db.query(models.Item).all()}
+    assert set(items) == {"REBAR", "SAND"}
+    assert (items["REBAR"].name, items["REBAR"].base_price) == ("Rebar 12mm", 950.0)
+
+
+def test_ndjson_boq_resolves_codes_and_reports_unknown_keys(client, db, admin_headers):
+    db.add_all([models.Project(id="p-1", code="P1", name="Tower"), models.Item(id="i-1", sku="REBAR", name="Rebar")])
+    db.commit()
+    lines = [
+        {"projectCode": "P1", "sku": "REBAR", "totalQuantity": 120},
+        {"projectCode": "P1", "sku": "GHOST", "totalQuantity": 5},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines)
+
+    res = client.post("/api/import/boq", headers=admin_headers, files={"file": ("boq.ndjson", body)})
+    assert res.status_code == 200, res.text
+    assert (res.json()["imported"], res.json()["failed"]) == (1, 1)
+
+    res = client.post("/api/import/boq", headers=admin_headers,
+                      files={"file": ("boq.ndjson", json.dumps({"projectCode": "P1", "sku": "REBAR", "totalQuantity": 150}))})
+    assert res.json()["imported"] == 1
+    boq = db.query(models.ProjectBOQ).all()
+    assert [(b.project_id, b.item_id, b.total_quantity) for b in boq] == [("p-1", "i-1", 150.0)]
+
+
+def test_repeated_keys_keep_the_last_row_and_report_the_others(client, db, admin_headers):
+    db.add_all([models.Project(id="p-1", code="P1", name="Tower"), models.Item(id="i-1", sku="REBAR", name="Rebar"),
+                models.ProjectBOQ(project_id="p-1", item_id="i-1", total_quantity=100, received_quantity=40)])
+    db.commit()
+    body = "sku,name,unit,basePrice\nCEM,Cement,bag,10\nCEM,Cement 50kg,bag,12\n"
+    report = client.post("/api/import/items", headers=admin_headers, files={"file": ("items.csv", body, "text/csv")}).json()
+    assert (report["processed"], report["imported"], report["failed"]) == (2, 1, 1)
+    assert report["errors"] == [{"row": 1, "errors": ["sku: repeated on row 2, which replaces this row"]}]
+
+    lines = [{"projectCode": "P1", "sku": "REBAR", "totalQuantity": q} for q in (120, 130)]
+    body = "\n".join(json.dumps(line) for line in lines)
+    report = client.post("/api/import/boq", headers=admin_headers, files={"file": ("boq.ndjson", body)}).json()
+    assert (report["processed"], report["imported"], report["failed"]) == (2, 1, 1)
+    db.expire_all()
+    boq = db.query(models.ProjectBOQ).all()
+    # Updated in place on (project_id, item_id); what was already received is kept
+    assert [(b.total_quantity, b.received_quantity) for b in boq] == [(130.0, 40.0)]
+
+
+def test_import_requires_admin_and_known_format(client, admin_headers):
+    assert client.post("/api/import/items", files={"file": ("items.csv", "sku\n")}).status_code == 401
+    assert client.post("/api/import/items", headers=admin_headers, files={"file": ("items.txt", "x")}).status_code == 415
+
+
+def test_upload_is_parsed_off_the_event_loop(client, db, admin_headers, monkeypatch):
+    threads = {"parse": set(), "write": set()}
+    read_csv, write_chunk = import_service._READERS["csv"], ImportService.write_chunk
+
+    def recording_reader(stream):
+        for row in read_csv(stream):
+            threads["parse"].add(threading.get_ident())
+            yield row
+
+    def recording_writer(*args):
+        threads["write"].add(threading.get_ident())
+        return write_chunk(*args)
+
+    monkeypatch.setitem(import_service._READERS, "csv", recording_reader)
+    monkeypatch.setattr(import_service, "IMPORT_CHUNK_SIZE", 2)
+    monkeypatch.setattr(ImportService, "write_chunk", staticmethod(recording_writer))
+    body = "sku,name,unit,basePrice\n" + "".join(f"S-{n},Item {n},pc,{n}\n" for n in range(5))
+    res = client.post("/api/import/items", headers=admin_headers, files={"file": ("items.csv", body, "text/csv")})
+    assert res.json()["imported"] == 5
+    # Chunks are written on the event loop thread through the request's session; none of the parsing is
+    assert len(threads["write"]) == 1 and not threads["parse"] & threads["write"]
@@ -0,0 +1,74 @@
+import threading
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+
+from .. import models
+from ..main import app
+
+# Many threads, each with its own TestClient (own event loop + connection), race on the same rows.
+THREADS = 12
+
+
+def _hammer(client, headers, n, request):
+    # Warm-up on the main client: engine first-connect and principal cache happen once, not in the race
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+    barrier = threading.Barrier(n)
+    statuses = [None] * n
+
+    def worker(i):
+        client = TestClient(app)
+        barrier.wait()
+        statuses[i] = request(client, i).status_code
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert set(statuses) <= {200, 400, 409}, statuses
+    return statuses
+
+
+def _po(db, status="APPROVED", quantity=6.0):
+    db.add(models.Project(id="p-1", code="P1", name="Tower", budget=10_000.0))
+    po = models.PurchaseOrder(id="po-1", project_id="p-1", supplier_id="s-1", total_amount=quantity * 10.0, status=status)
+    po.items = [models.POItem(item_id="i-1", quantity=quantity, price=10.0)]
+    db.add(po)
+    db.commit()
+
+
+def test_parallel_receipts_never_over_receive(client, db, admin_headers):
+    _po(db)
+    statuses = _hammer(client, admin_headers, THREADS, lambda c, i: c.post("/api/receipts", headers=admin_headers,
+                                                    json={"poId": "po-1", "items": [{"itemId": "i-1", "quantity": 1}]}))
+    db.expire_all()
+    line = db.query(models.POItem).one()
+    assert line.received_quantity == statuses.count(200) <= 6
+    assert db.query(models.ReceiptItem).count() == statuses.count(200)
+    assert db.get(models.BOQLedger, ("p-1", "i-1")).received_quantity == line.received_quantity
+    assert db.get(models.PurchaseOrder, "po-1").status == ("RECEIVED" if line.received_quantity == 6 else "PARTIALLY_RECEIVED")
+
+
+def test_parallel_approvals_commit_spend_once(client, db, admin_headers):
+    _po(db, status="PENDING_APPROVAL")
+    statuses = _hammer(client, admin_headers, THREADS, lambda c, i: c.put("/api/purchase-orders/po-1/approve", headers=admin_headers))
+    assert statuses.count(200) == 1
+    db.expire_all()
+    assert db.get(models.ProjectLedger, "p-1").committed_amount == 60.0
+    assert db.get(models.Project, "p-1").spent == 60.0
+
+
+def test_parallel_winner_selection_creates_one_po(client, db, admin_headers):
+    db.add(models.Project(id="p-1", code="P1", name="Tower", budget=10_000.0))
+    mr = models.MaterialRequest(id="mr-1", project_id="p-1", requester_id="u-1", status="APPROVED_TECHNICAL")
+    mr.items = [models.RequestItem(item_id="i-1", quantity=2.0)]
+    rfq = models.RFQ(id="rfq-1", material_request_id="mr-1", status="OPEN")
+    quotes = [models.Quotation(id=f"q-{i}", rfq_id="rfq-1", supplier_id=f"s-{i}", total_amount=100.0 + i) for i in range(3)]
+    db.add_all([mr, rfq, *quotes])
+    db.commit()
+
+    statuses = _hammer(client, admin_headers, THREADS, lambda c, i: c.post("/api/rfqs/rfq-1/select-winner", headers=admin_headers,
+                                                            json={"quotationId": f"q-{i % 3}"}))
+    assert statuses.count(200) == 1
+    db.expire_all()
+    assert db.query(func.count(models.PurchaseOrder.id)).filter(models.PurchaseOrder.material_request_id == "mr-1").scalar() == 1
+    assert db.query(models.Quotation).filter(models.Quotation.is_selected.is_(True)).count() == 1
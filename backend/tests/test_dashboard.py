@@ -0,0 +1,84 @@
+from .. import models
+from ..services.dashboard_service import approval_band
+from ..services.matching_service import match_worker
+
+
+def _seed(db):
+    db.add_all([
+        models.Project(id="p-1", code="P1", name="Tower", budget=100000.0),
+        models.Project(id="p-2", code="P2", name="Bridge", budget=100000.0),
+        models.Supplier(id="s-1", name="Steel Co"), models.Supplier(id="s-2", name="Cement Co"),
+        models.Item(id="i-1", sku="REBAR", name="Rebar", unit="t", base_price=10.0),
+    ])
+    req = models.MaterialRequest(id="mr-1", project_id="p-1", requester_id="u-1", status="PENDING_TECHNICAL")
+    db.add(req)
+    db.commit()
+    req.status = "APPROVED_TECHNICAL"
+    db.commit()
+
+
+def _create_po(client, headers, project_id, supplier_id, qty, price):
+    res = client.post("/api/purchase-orders", headers=headers, json={
+        "projectId": project_id, "supplierId": supplier_id, "materialRequestId": None,
+        "items": [{"itemId": "i-1", "quantity": qty, "price": price, "name": None}],
+    })
+    assert res.status_code == 200, res.text
+    return res.json()["id"]
+
+
+def _lifecycle(client, db, headers):
+    _seed(db)
+    small = _create_po(client, headers, "p-1", "s-1", 10, 10.0)      # 100
+    large = _create_po(client, headers, "p-2", "s-2", 100, 600.0)    # 60,000
+    pending = _create_po(client, headers, "p-1", "s-2", 1, 5000.0)   # 5,000, left pending
+    for po_id in (small, large):
+        assert client.put(f"/api/purchase-orders/{po_id}/approve", headers=headers).status_code == 200
+    assert client.post("/api/receipts", headers=headers, json={"poId": small, "items": [{"itemId": "i-1", "quantity": 10}]}).status_code == 200
+    assert client.post("/api/receipts", headers=headers, json={"poId": large, "items": [{"itemId": "i-1", "quantity": 40}]}).status_code == 200
+    client.post("/api/invoices", json={"poId": small, "supplierInvoiceNumber": "INV-1", "totalAmount": 100.0})
+    client.post("/api/invoices", json={"poId": large, "supplierInvoiceNumber": "INV-2", "totalAmount": 60000.0})
+    assert match_worker.drain()
+    return small, large, pending
+
+
+def test_counters_follow_the_lifecycle_and_match_a_rebuild(client, db, admin_headers):
+    _lifecycle(client, db, admin_headers)
+    dash = client.get("/api/dashboard", headers=admin_headers).json()
+
+    assert dash["requestsByStatus"] == {"APPROVED_TECHNICAL": 1}
+    assert dash["posByStatus"] == {"RECEIVED": {"count": 1, "amount": 100.0}, "PARTIALLY_RECEIVED": {"count": 1, "amount": 60000.0},
+                                   "PENDING_APPROVAL": {"count": 1, "amount": 5000.0}}
+    assert dash["invoicesByStatus"] == {"MATCHED": {"count": 1, "amount": 100.0}, "MISMATCH": {"count": 1, "amount": 60000.0}}
+    bands = {b["band"]: b["count"] for b in dash["pendingApprovals"]}
+    assert bands[approval_band(5000.0)] == 1 and sum(bands.values()) == 1
+    assert [(b["key"], b["name"], b["amount"]) for b in dash["spendByProject"]] == [("p-2", "Bridge", 60000.0), ("p-1", "Tower", 100.0)]
+    assert [b["amount"] for b in dash["spendByMonth"]] == [60100.0]
+
+    rebuilt = client.post("/api/admin/dashboard/rebuild", headers=admin_headers).json()
+    assert rebuilt == dash
+
+
+def test_dashboard_reads_do_not_grow_with_history(client, db, admin_headers, count_queries):
+    _seed(db)
+    client.get("/api/users/me", headers=admin_headers)
+    with count_queries() as small:
+        client.get("/api/dashboard", headers=admin_headers)
+    db.add_all([models.PurchaseOrder(id=f"po-{i}", project_id=f"p-{i % 2 + 1}", supplier_id="s-1", total_amount=10.0,
+                                     status="APPROVED") for i in range(300)])
+    db.commit()
+    with count_queries() as large:
+        res = client.get("/api/dashboard", headers=admin_headers)
+    assert res.json()["posByStatus"]["APPROVED"] == {"count": 300, "amount": 3000.0}
+    assert len(large.statements) == len(small.statements) == 4
+
+
+def test_repeated_partial_receipt_bumps_the_version_without_reloading_the_po(client, db, admin_headers, count_queries):
+    small, large, _ = _lifecycle(client, db, admin_headers)
+    with count_queries() as counted:
+        res = client.post("/api/receipts", headers=admin_headers, json={"poId": large, "items": [{"itemId": "i-1", "quantity": 10}]})
+    assert res.status_code == 200, res.text
+    # Status stays PARTIALLY_RECEIVED: the PO is read once (the locking load), never again for the dashboard counters
+    assert sum(1 for s in counted.statements if s.lstrip().upper().startswith("SELECT") and "FROM purchase_orders" in s) == 1
+    db.expire_all()
+    assert db.get(models.PurchaseOrder, large).version == 4  # created, approved, two receipts
+    assert client.get("/api/dashboard", headers=admin_headers).json()["posByStatus"]["PARTIALLY_RECEIVED"] == {"count": 1, "amount": 60000.0}
@@ -0,0 +1,49 @@
+import csv
+import datetime
+import io
+import json
+
+import pytest
+
+from .. import models
+from ..services import export_service
+
+
+@pytest.fixture()
+def lifecycle_rows(db):
+    for i in range(5):
+        po = models.PurchaseOrder(id=f"po-{i}", project_id="p-1" if i < 3 else "p-2", supplier_id="s-1",
+                                  total_amount=100.0 * i, created_at=datetime.datetime(2024, 1, 1 + i))
+        po.items = [models.POItem(item_id="i-1", quantity=1.0, price=10.0)]
+        db.add(po)
+        db.add(models.Invoice(id=f"inv-{i}", po_id=f"po-{i}", total_amount=10.0, created_at=datetime.datetime(2024, 2, 1)))
+    db.commit()
+
+
+def test_ndjson_export_with_date_and_project_filters(client, admin_headers, lifecycle_rows):
+    res = client.get("/api/export/purchase-orders", headers=admin_headers,
+                     params={"project_id": "p-1", "date_from": "2024-01-02T00:00:00"})
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in res.text.splitlines()]
+    assert [r["id"] for r in rows] == ["po-1", "po-2"]
+
+    res = client.get("/api/export/invoices", headers=admin_headers, params={"project_id": "p-2"})
+    assert [json.loads(line)["id"] for line in res.text.splitlines()] == ["inv-3", "inv-4"]
+
+
+def test_csv_export_of_line_items_filters_through_parent(client, admin_headers, lifecycle_rows):
+    res = client.get("/api/export/po-items", headers=admin_headers, params={"format": "csv", "project_id": "p-2"})
+    assert res.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(res.text)))
+    assert sorted(r["po_id"] for r in rows) == ["po-3", "po-4"]
+
+
+def test_parquet_export_across_batches(client, admin_headers, lifecycle_rows, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(export_service, "EXPORT_BATCH_SIZE", 2)
+    res = client.get("/api/export/purchase-orders", headers=admin_headers, params={"format": "parquet"})
+    assert res.status_code == 200
+    table = pq.read_table(io.BytesIO(res.content))
+    assert table.num_rows == 5 and table.num_columns == len(models.PurchaseOrder.__table__.columns)
+    assert pq.ParquetFile(io.BytesIO(res.content)).num_row_groups == 3
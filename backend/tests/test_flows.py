@@ -1,22 +1,58 @@
 
-from fastapi.testclient import TestClient
-from ..main import app
-from ..auth import create_access_token
+from .. import models
+from ..services.matching_service import match_worker
 
-client = TestClient(app)
+def test_full_procurement_flow(client, db, admin_headers):
+    headers = admin_headers
+    db.add_all([
+        models.Project(id="p-1", code="P1", name="Tower", budget=100000.0),
+        models.Supplier(id="s-1", name="Steel Co"),
+        models.Item(id="i-1", sku="REBAR", name="Rebar", unit="t", base_price=10.0),
+        models.Item(id="i-2", sku="CEM", name="Cement", unit="bag", base_price=5.0),
+    ])
+    db.commit()
 
-def test_full_procurement_flow():
-    # 1. Login as Admin
-    token = create_access_token({"sub": "admin@test.com", "role": "ADMIN"})
-    headers = {"Authorization": f"Bearer {token}"}
+    # 1. Material request (technical approval has no endpoint yet, so flip it directly)
+    res = client.post("/api/material-requests", headers=headers, json={
+        "projectId": "p-1", "notes": None,
+        "items": [{"itemId": "i-1", "quantity": 10}, {"itemId": "i-2", "quantity": 20}],
+    })
+    assert res.status_code == 200, res.text
+    pr_id = res.json()["id"]
+    assert len(res.json()["items"]) == 2
+    db.query(models.MaterialRequest).filter_by(id=pr_id).update({"status": "APPROVED_TECHNICAL"})
+    db.commit()
 
-    # 2. Create Project (Mock)
-    # We skip creating DB objects manually and rely on endpoints or skip if DB not init in test env
-    # For this file to work, we assume the DB is available or we'd mock the DB session.
-    # Here is a basic check for the endpoints existence and validation logic.
-    pass
+    # 2. RFQ -> quotation -> winner
+    rfq = client.post("/api/rfqs", headers=headers, json={"materialRequestId": pr_id, "deadline": "2030-01-01T00:00:00"}).json()
+    quote = client.post("/api/quotations", json={"rfqId": rfq["id"], "supplierId": "s-1", "totalAmount": 400.0}).json()
+    res = client.post(f"/api/rfqs/{rfq['id']}/select-winner", headers=headers, json={"quotationId": quote["id"]})
+    assert res.status_code == 200, res.text
+    po = res.json()
+    assert po["status"] == "PENDING_APPROVAL" and len(po["items"]) == 2
 
-def test_receipt_validation():
+    # 3. Approve, receive everything, invoice
+    assert client.put(f"/api/purchase-orders/{po['id']}/approve", headers=headers).status_code == 200
+    res = client.post("/api/receipts", headers=headers, json={
+        "poId": po["id"], "items": [{"itemId": "i-1", "quantity": 10}, {"itemId": "i-2", "quantity": 20}],
+    })
+    assert res.status_code == 200, res.text
+    db.expire_all()
+    assert db.get(models.PurchaseOrder, po["id"]).status == "RECEIVED"
+
+    grn_value = sum(line["quantity"] * line["price"] for line in po["items"])
+    res = client.post("/api/invoices", json={"poId": po["id"], "supplierInvoiceNumber": "INV-1", "totalAmount": grn_value})
+    assert res.status_code == 200, res.text
+    assert res.json()["status"] == "PENDING_MATCH"
+    assert match_worker.drain()
+    invoice = client.get("/api/invoices", params={"po_id": po["id"]}).json()[0]
+    assert (invoice["status"], invoice["grn_value"], invoice["variance"]) == ("MATCHED", grn_value, 0.0)
+
+    fin = client.get("/api/projects/p-1/financials").json()
+    assert fin["committed"] == po["total_amount"]
+    assert fin["received"] == fin["invoiced"] == grn_value
+
+def test_receipt_validation(client):
     # Test strict quantity logic via direct service call or endpoint would require mocking DB.
     # Since we don't have a test DB setup script here, we check the health.
     response = client.get("/health")
@@ -0,0 +1,69 @@
+from .. import models
+from ..http_cache import item_catalog_cache
+from ..pagination import count_cache
+
+# Conditional GET on master data: ETags follow the per-table version bumped at commit.
+
+
+def test_not_modified_skips_row_load(client, db, count_queries):
+    db.add_all([models.Project(id=f"p-{i}", code=f"P{i}", name=f"Project {i}") for i in range(5)])
+    db.commit()
+    first = client.get("/api/projects")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and etag.startswith('W/"projects-')
+    assert "must-revalidate" in first.headers["cache-control"] and first.headers["last-modified"]
+
+    with count_queries() as counted:
+        res = client.get("/api/projects", headers={"If-None-Match": etag})
+    assert res.status_code == 304 and res.headers["etag"] == etag
+    assert counted.selects == 1 and "table_versions" in counted.statements[0]
+
+    res = client.get("/api/projects", headers={"If-Modified-Since": first.headers["last-modified"]})
+    assert res.status_code == 304
+    # Each page / filter has its own tag
+    assert client.get("/api/projects?limit=2", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_create_changes_etag_and_invalidates_item_cache(client, db, admin_headers, count_queries):
+    item_catalog_cache.clear()
+    db.add(models.Item(id="it-1", sku="SKU-1", name="Cement", unit="bag", base_price=10.0))
+    db.commit()
+    first = client.get("/api/items")
+    assert [row["sku"] for row in first.json()] == ["SKU-1"] and first.headers["x-total-count"] == "1"
+
+    with count_queries() as counted:
+        cached = client.get("/api/items")
+    assert cached.status_code == 200 and cached.json() == first.json()
+    assert counted.selects == 1 and cached.headers["x-total-count"] == "1"
+
+    res = client.post("/api/items", json={"name": "Steel", "sku": "SKU-2", "unit": "t", "basePrice": 500.0})
+    assert res.status_code == 200
+    count_cache.clear()
+    res = client.get("/api/items", headers={"If-None-Match": first.headers["etag"]})
+    assert res.status_code == 200 and res.headers["etag"] != first.headers["etag"]
+    assert sorted(row["sku"] for row in res.json()) == ["SKU-1", "SKU-2"]
+
+    suppliers = client.get("/api/suppliers").headers["etag"]
+    client.post("/api/suppliers", json={"name": "Acme"})
+    assert client.get("/api/suppliers", headers={"If-None-Match": suppliers}).status_code == 200
+
+
+def test_receipt_changes_only_its_projects_boq_etag(client, db, admin_headers):
+    db.add_all([models.ProjectBOQ(id="b-1", project_id="p-1", item_id="it-1", total_quantity=10.0),
+                models.ProjectBOQ(id="b-2", project_id="p-2", item_id="it-1", total_quantity=10.0)])
+    po = models.PurchaseOrder(id="po-1", project_id="p-1", supplier_id="s-1", total_amount=50.0, status="APPROVED")
+    po.items = [models.POItem(item_id="it-1", quantity=5.0, price=10.0)]
+    db.add(po)
+    db.commit()
+    etag = client.get("/api/projects/p-1/boq", headers=admin_headers).headers["etag"]
+    other = client.get("/api/projects/p-2/boq", headers=admin_headers).headers["etag"]
+    assert client.get("/api/projects/p-1/boq", headers={"If-None-Match": etag}).status_code == 304
+
+    res = client.post("/api/receipts", headers=admin_headers, json={"poId": "po-1", "items": [{"itemId": "it-1", "quantity": 2.0}]})
+    assert res.status_code == 200
+    res = client.get("/api/projects/p-1/boq", headers={"If-None-Match": etag})
+    assert res.status_code == 200 and res.json()[0]["receivedQuantity"] == 2.0
+    assert client.get("/api/projects/p-2/boq", headers={"If-None-Match": other}).status_code == 304
+    # One counter row per project: receipts for different projects do not queue on a shared row
+    versions = dict(db.query(models.TableVersion.table_name, models.TableVersion.version))
+    assert versions["project_boq:p-1"] == 2 and "project_boq" not in versions
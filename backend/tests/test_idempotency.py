@@ -0,0 +1,54 @@
+from .. import auth, models
+from ..idempotency import MemoryIdempotencyStore
+
+
+def _seed(db):
+    db.add(models.Project(id="p-1", code="P1", name="Tower", budget=1000.0))
+    po = models.PurchaseOrder(id="po-1", project_id="p-1", supplier_id="s-1", total_amount=100.0, status="APPROVED")
+    po.items = [models.POItem(item_id="i-1", quantity=10, price=10.0)]
+    db.add(po)
+    db.commit()
+
+
+def test_retried_posts_replay_the_first_response(client, db, admin_headers):
+    _seed(db)
+    headers = {**admin_headers, "Idempotency-Key": "tablet-42-req-1"}
+    body = {"projectId": "p-1", "items": [{"itemId": "i-1", "quantity": 3}], "notes": "slab"}
+    first = client.post("/api/material-requests", headers=headers, json=body)
+    retry = client.post("/api/material-requests", headers=headers, json=body)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json() and retry.headers["idempotent-replayed"] == "true"
+    assert db.query(models.MaterialRequest).count() == 1
+
+    # Same key, different payload: refused instead of silently replaying
+    assert client.post("/api/material-requests", headers=headers, json={**body, "notes": "other"}).status_code == 422
+
+
+def test_duplicate_receipt_does_not_trip_quantity_checks(client, db, admin_headers):
+    _seed(db)
+    headers = {**admin_headers, "Idempotency-Key": "grn-7"}
+    body = {"poId": "po-1", "items": [{"itemId": "i-1", "quantity": 10}]}
+    assert client.post("/api/receipts", headers=headers, json=body).status_code == 200
+    assert client.post("/api/receipts", headers=headers, json=body).status_code == 200
+    assert db.query(models.Receipt).count() == 1
+    # Without the key the second receipt really runs, and is rejected
+    assert client.post("/api/receipts", headers=admin_headers, json=body).status_code == 400
+
+
+def test_keys_are_scoped_per_caller(client, db, admin_headers):
+    _seed(db)
+    db.add(models.User(id="u-2", name="Clerk", email="clerk@test.com", password_hash="x", role="SITE_ENGINEER"))
+    db.commit()
+    clerk = {"Authorization": f"Bearer {auth.create_access_token({'sub': 'clerk@test.com', 'role': 'SITE_ENGINEER'})}"}
+    body = {"projectId": "p-1", "items": [{"itemId": "i-1", "quantity": 1}], "notes": None}
+    a = client.post("/api/material-requests", headers={**admin_headers, "Idempotency-Key": "k"}, json=body).json()
+    b = client.post("/api/material-requests", headers={**clerk, "Idempotency-Key": "k"}, json=body).json()
+    assert a["id"] != b["id"]
+
+
+def test_store_reports_in_flight_and_expires():
+    store = MemoryIdempotencyStore(ttl=0.0)
+    assert store.reserve("k") is None
+    assert store.reserve("k").pending
+    store.release("k")
+    assert store.reserve("k") is None
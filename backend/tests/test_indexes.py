@@ -0,0 +1,71 @@
+import ast
+import pathlib
+
+from sqlalchemy import event
+
+from ..benchmarks.dataset import DatasetSize, generate
+from ..database import Base
+
+MIGRATIONS = pathlib.Path(__file__).parents[1] / "alembic" / "versions"
+
+
+def _migration_indexes():
+    # INDEXES tables, plus literal op.create_index(name, table, columns) calls next to a create_table
+    indexes = {}
+    for migration in sorted(MIGRATIONS.glob("*.py")):
+        tree = ast.parse(migration.read_text())
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) == "INDEXES":
+                indexes.update({name: (table, tuple(columns), where, False)
+                                for name, table, columns, where in ast.literal_eval(node.value)})
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Call) and getattr(node.func, "attr", None) == "create_index"
+                    and all(isinstance(arg, (ast.Constant, ast.List)) for arg in node.args[:3])):
+                name, table, columns = (ast.literal_eval(arg) for arg in node.args[:3])
+                unique = any(k.arg == "unique" and ast.literal_eval(k.value) for k in node.keywords)
+                indexes[name] = (table, tuple(columns), None, unique)
+    return indexes
+
+
+def _model_indexes():
+    indexes = {}
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            where = index.dialect_options["postgresql"]["where"]
+            indexes[index.name] = (table.name, tuple(c.name for c in index.columns), str(where) if where is not None else None,
+                                   bool(index.unique))
+    return indexes
+
+
+def test_migration_creates_the_indexes_the_models_declare():
+    declared, migrated = _model_indexes(), _migration_indexes()
+    assert declared == migrated
+
+
+def test_history_lookups_do_not_scan_large_tables(client, engine, async_engine, db, admin_headers):
+    data = generate(db, DatasetSize(years=1, projects=3, suppliers=5, items=40, requests_per_day=4))
+    large = {"material_requests", "request_items", "rfqs", "quotations", "quotation_items", "purchase_orders",
+             "po_items", "receipts", "receipt_items", "invoices"}
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        for path in (f"/api/purchase-orders?status=PENDING_APPROVAL&project_id={data.project_id}",
+                     f"/api/material-requests?project_id={data.project_id}", "/api/rfqs?status=OPEN",
+                     f"/api/rfqs/{data.rfq_id}/comparison", f"/api/receipts?po_id={data.po_id}",
+                     f"/api/invoices/{data.invoice_id}/match-lines"):
+            assert client.get(path, headers=admin_headers).status_code == 200, path
+        assert client.post("/api/admin/matching/rematch", headers=admin_headers).status_code == 200
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+            scans = [line for line in plan if line.startswith("SCAN ") and " USING " not in line
+                     and line.split()[1] in large]
+            assert not scans, (statement, plan)
@@ -0,0 +1,44 @@
+import logging
+import re
+
+from .. import instrumentation, models
+from ..instrumentation import parameter_shape
+
+
+def _timing(header: str) -> dict:
+    return {name: (float(dur), desc) for name, dur, desc in re.findall(r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?', header)}
+
+
+def test_server_timing_and_route_histograms(client, db, admin_headers, count_queries):
+    db.add_all([models.Project(id="p-1", code="P1", name="Tower", budget=1000.0),
+                models.Project(id="p-2", code="P2", name="Bridge", budget=1000.0)])
+    db.commit()
+    client.get("/api/users/me", headers=admin_headers)
+    with count_queries() as recorded:
+        res = client.get("/api/projects/p-1/financials", headers=admin_headers)
+    timing = _timing(res.headers["server-timing"])
+    assert timing["db"][1] == f"{len(recorded.statements)} queries"
+    assert set(timing) == {"db", "pool", "app", "serialize", "total"}
+    assert timing["total"][0] >= timing["app"][0] >= timing["db"][0]
+
+    client.get("/api/projects/p-2/financials", headers=admin_headers)
+    text = client.get("/metrics").text
+    labels = 'method="GET",route="/api/projects/{project_id}/financials"'
+    # Route template, not the raw path: one series for both projects
+    assert f"http_request_duration_seconds_count{{{labels}}} 2" in text
+    assert f'http_request_sql_statements_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f'http_requests_total{{{labels},status="200"}} 2' in text
+    assert "# TYPE http_request_serialization_seconds histogram" in text
+
+
+def test_slow_queries_are_logged_with_route_and_parameter_shape(client, db, admin_headers, monkeypatch, caplog):
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 0.0)
+    with caplog.at_level(logging.WARNING, logger="backend.instrumentation"):
+        client.get("/api/purchase-orders", params={"project_id": "secret-project"}, headers=admin_headers)
+    slow = [r.getMessage() for r in caplog.records if r.getMessage().startswith("Slow query")]
+    assert any("route=/api/purchase-orders" in m and "params=(str" in m for m in slow)
+    assert not any("secret-project" in m for m in slow)  # shapes only, never values
+    assert 'db_slow_queries_total{route="/api/purchase-orders"}' in client.get("/metrics").text
+
+    assert parameter_shape(("a",) * 500 + (1,)) == "(str x 500, int)"
+    assert parameter_shape([{"id": "x", "n": 1}] * 3, executemany=True) == "3 x {id: str, n: int}"
@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from .. import models
+
+
+def _approved_po(db):
+    db.add(models.Project(id="p-1", code="P1", name="Tower", budget=1000.0))
+    po = models.PurchaseOrder(id="po-1", project_id="p-1", supplier_id="s-1", total_amount=300.0)
+    po.items = [models.POItem(item_id="i-1", quantity=10, price=20.0), models.POItem(item_id="i-2", quantity=5, price=20.0)]
+    db.add(po)
+    db.commit()
+
+
+def test_approval_receipt_and_invoice_update_ledger(client, db, admin_headers):
+    _approved_po(db)
+    assert client.put("/api/purchase-orders/po-1/approve", headers=admin_headers).status_code == 200
+    assert client.put("/api/purchase-orders/po-1/approve", headers=admin_headers).status_code == 400
+    client.post("/api/receipts", headers=admin_headers, json={"poId": "po-1", "items": [{"itemId": "i-1", "quantity": 4}]})
+    client.post("/api/invoices", json={"poId": "po-1", "supplierInvoiceNumber": "A", "totalAmount": 80.0})
+
+    fin = client.get("/api/projects/p-1/financials").json()
+    assert fin == {"projectId": "p-1", "budget": 1000.0, "committed": 300.0, "received": 80.0, "invoiced": 80.0,
+                   "remainingBudget": 700.0, "utilization": 0.3}
+    boq = db.get(models.BOQLedger, ("p-1", "i-1"))
+    assert (boq.ordered_quantity, boq.received_quantity, boq.received_amount) == (10.0, 4.0, 80.0)
+    assert db.get(models.Project, "p-1").spent == 300.0
+
+    assert client.post("/api/admin/ledger/reconcile", headers=admin_headers).json()["discrepancies"] == []
+
+
+def test_reconcile_detects_and_repairs_drift(client, db, admin_headers):
+    _approved_po(db)
+    client.put("/api/purchase-orders/po-1/approve", headers=admin_headers)
+    db.query(models.ProjectLedger).update({"committed_amount": 999.0})
+    db.commit()
+
+    report = client.post("/api/admin/ledger/reconcile", headers=admin_headers).json()
+    assert [(d["field"], d["ledger"], d["expected"]) for d in report["discrepancies"]] == [("committed_amount", 999.0, 300.0)]
+
+    report = client.post("/api/admin/ledger/reconcile", headers=admin_headers, params={"fix": True}).json()
+    assert report["fixed"] is True
+    assert client.get("/api/projects/p-1/financials").json()["committed"] == 300.0
+    assert client.post("/api/admin/ledger/reconcile", headers=admin_headers).json()["discrepancies"] == []
+
+
+def test_receipt_rolls_up_into_boq_progress(client, db, admin_headers):
+    _approved_po(db)
+    db.add_all([models.ProjectBOQ(id="b-1", project_id="p-1", item_id="i-1", total_quantity=20.0, received_quantity=0.0),
+                models.ProjectBOQ(id="b-2", project_id="p-1", item_id="i-3", total_quantity=8.0, received_quantity=0.0)])
+    db.commit()
+    client.put("/api/purchase-orders/po-1/approve", headers=admin_headers)
+    client.post("/api/receipts", headers=admin_headers, json={"poId": "po-1", "items": [{"itemId": "i-1", "quantity": 4}]})
+
+    # One BOQ line per item: a second line would receive the same quantities again
+    db.add(models.ProjectBOQ(id="b-3", project_id="p-1", item_id="i-1", total_quantity=5.0))
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    progress = client.get("/api/projects/p-1/boq/progress").json()
+    assert progress == [
+        {"id": "b-1", "itemId": "i-1", "totalQuantity": 20.0, "receivedQuantity": 4.0, "outstandingQuantity": 16.0,
+         "onOrderQuantity": 6.0, "percentComplete": 20.0},
+        {"id": "b-2", "itemId": "i-3", "totalQuantity": 8.0, "receivedQuantity": 0.0, "outstandingQuantity": 8.0,
+         "onOrderQuantity": 0.0, "percentComplete": 0.0},
+    ]
+
+
+def test_reconcile_checks_each_boq_line(client, db, admin_headers):
+    _approved_po(db)
+    db.add(models.ProjectBOQ(id="b-1", project_id="p-1", item_id="i-1", total_quantity=20.0, received_quantity=0.0))
+    db.commit()
+    client.put("/api/purchase-orders/po-1/approve", headers=admin_headers)
+    client.post("/api/receipts", headers=admin_headers, json={"poId": "po-1", "items": [{"itemId": "i-1", "quantity": 4}]})
+    db.query(models.BOQLedger).filter_by(item_id="i-1").update({"received_quantity": 9.0})
+    db.query(models.ProjectBOQ).update({"received_quantity": 1.0})
+    db.commit()
+
+    report = client.post("/api/admin/ledger/reconcile", headers=admin_headers).json()
+    assert [(d["table"], d["itemId"], d["boqId"], d["field"], d["ledger"], d["expected"]) for d in report["discrepancies"]] == [
+        ("boq_ledger", "i-1", None, "received_quantity", 9.0, 4.0),
+        ("project_boq", "i-1", "b-1", "received_quantity", 1.0, 4.0),
+    ]
+
+    assert client.post("/api/admin/ledger/reconcile", headers=admin_headers, params={"fix": True}).json()["fixed"] is True
+    assert client.post("/api/admin/ledger/reconcile", headers=admin_headers).json()["discrepancies"] == []
+    assert client.get("/api/projects/p-1/boq/progress").json()[0]["receivedQuantity"] == 4.0
+    assert db.get(models.BOQLedger, ("p-1", "i-2")).ordered_quantity == 5.0
@@ -0,0 +1,66 @@
+from .. import models
+from ..services.matching_service import MatchingService, match_worker
+
+
+def _po(db, supplier_tolerance=None, project_tolerance=None):
+    db.add(models.Project(id="p-1", code="P1", name="Tower", budget=10_000.0, match_tolerance=project_tolerance))
+    db.add(models.Supplier(id="s-1", name="Steel Co", match_tolerance=supplier_tolerance))
+    po = models.PurchaseOrder(id="po-1", project_id="p-1", supplier_id="s-1", total_amount=1000.0, status="APPROVED")
+    po.items = [models.POItem(id="l-1", item_id="i-1", quantity=10, price=50.0),
+                models.POItem(id="l-2", item_id="i-2", quantity=10, price=50.0)]
+    db.add(po)
+    db.commit()
+
+
+def test_receipt_rematches_open_invoices_in_background(client, db, admin_headers):
+    _po(db)
+    client.post("/api/receipts", headers=admin_headers, json={"poId": "po-1", "items": [{"itemId": "i-1", "quantity": 10}]})
+    res = client.post("/api/invoices", json={"poId": "po-1", "supplierInvoiceNumber": "A", "totalAmount": 1000.0})
+    assert res.json()["status"] == "PENDING_MATCH"
+    assert match_worker.drain()
+    db.expire_all()
+    invoice = db.get(models.Invoice, res.json()["id"])
+    assert (invoice.status, invoice.grn_value, invoice.variance, invoice.match_tolerance) == ("MISMATCH", 500.0, 500.0, 100.0)
+    assert invoice.match_status_details.startswith("Failed. Invoice: 1000")
+    assert "GRN Value: 500" in invoice.match_status_details and "Variance: 500" in invoice.match_status_details
+
+    assert client.get(f"/api/invoices/{invoice.id}/match-lines").status_code == 401
+    lines = client.get(f"/api/invoices/{invoice.id}/match-lines", headers=admin_headers).json()
+    assert [(l["poItemId"], l["receivedValue"], l["billedAmount"], l["variance"]) for l in lines] == [
+        ("l-1", 500.0, 500.0, 0.0), ("l-2", 0.0, 500.0, 500.0)]
+
+    # The missing goods land: the receipt alone triggers the re-match
+    client.post("/api/receipts", headers=admin_headers, json={"poId": "po-1", "items": [{"itemId": "i-2", "quantity": 10}]})
+    assert match_worker.drain()
+    db.expire_all()
+    assert db.get(models.Invoice, invoice.id).status == "MATCHED"
+    assert db.get(models.Invoice, invoice.id).match_status_details.startswith("Success. Variance: 0")
+    assert all(l["variance"] == 0.0 for l in client.get(f"/api/invoices/{invoice.id}/match-lines", headers=admin_headers).json())
+
+
+def test_tolerance_prefers_supplier_then_project(client, db):
+    _po(db, supplier_tolerance=None, project_tolerance=600.0)
+    db.add(models.Invoice(id="inv-1", po_id="po-1", total_amount=500.0, status="PENDING_MATCH"))
+    db.commit()
+    assert MatchingService.rematch(db).matched == 1
+
+    db.get(models.Supplier, "s-1").match_tolerance = 10.0
+    db.get(models.Invoice, "inv-1").status = "PENDING_MATCH"
+    db.commit()
+    assert MatchingService.rematch(db).mismatched == 1
+    db.refresh(db.get(models.Invoice, "inv-1"))
+    assert db.get(models.Invoice, "inv-1").match_tolerance == 10.0
+
+
+def test_bulk_rematch_is_chunked_and_skips_matched(client, db, admin_headers):
+    _po(db)
+    db.add_all([models.Invoice(id=f"inv-{i:02d}", po_id="po-1", total_amount=50.0 if i % 2 else 500.0,
+                               status="MATCHED" if i < 3 else "MISMATCH") for i in range(20)])
+    db.commit()
+
+    report = MatchingService.rematch(db, chunk_size=7)
+    assert report.model_dump() == {"processed": 17, "matched": 9, "mismatched": 8}
+    assert db.query(models.InvoiceMatchLine).count() == 17 * 2
+
+    report = client.post("/api/admin/matching/rematch", headers=admin_headers).json()
+    assert report == {"processed": 8, "matched": 0, "mismatched": 8}
@@ -0,0 +1,70 @@
+import pathlib
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from ..database import Base
+
+alembic = pytest.importorskip("alembic")
+from alembic import command  # noqa: E402
+from alembic.autogenerate import compare_metadata  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from alembic.migration import MigrationContext  # noqa: E402
+
+SCRIPTS = pathlib.Path(__file__).parents[1] / "alembic"
+
+
+@pytest.fixture()
+def database_url(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)  # read by alembic/env.py
+    return url
+
+
+@pytest.fixture()
+def alembic_config(database_url):
+    config = Config()  # no ini file: leaves the test run's logging alone
+    config.set_main_option("script_location", str(SCRIPTS))
+    return config
+
+
+def test_upgrade_to_head_matches_the_models(alembic_config, database_url):
+    command.upgrade(alembic_config, "head")
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as conn:
+            assert compare_metadata(MigrationContext.configure(conn), Base.metadata) == []
+    finally:
+        engine.dispose()
+
+
+def test_downgrade_to_base_drops_everything(alembic_config, database_url):
+    command.upgrade(alembic_config, "head")
+    command.downgrade(alembic_config, "base")
+    engine = create_engine(database_url)
+    try:
+        assert inspect(engine).get_table_names() == ["alembic_version"]
+    finally:
+        engine.dispose()
+
+
+def test_database_at_the_baseline_keeps_its_rows(alembic_config, database_url):
+    command.upgrade(alembic_config, "0001_baseline")
+    engine = create_engine(database_url)
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO purchase_orders (id, status) VALUES ('po-1', 'APPROVED')")
+            conn.exec_driver_sql("INSERT INTO po_items (id, po_id, quantity, price) VALUES ('l-1', 'po-1', 2, 5)")
+            conn.exec_driver_sql("INSERT INTO audit_logs (id, action) VALUES ('a-1', 'PO_APPROVED')")  # no timestamp
+            # Two lines for one item (per phase): merged before (project_id, item_id) becomes unique
+            conn.exec_driver_sql("INSERT INTO project_boq (id, project_id, item_id, total_quantity, received_quantity) "
+                                 "VALUES ('b-1', 'p-1', 'i-1', 30, 0), ('b-2', 'p-1', 'i-1', 20, 0), ('b-3', 'p-1', 'i-2', 5, 0)")
+        command.upgrade(alembic_config, "head")
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT version FROM purchase_orders").all() == [(1,)]
+            assert conn.exec_driver_sql("SELECT version, quantity FROM po_items").all() == [(1, 2.0)]
+            assert conn.exec_driver_sql("SELECT count(*) FROM audit_logs WHERE timestamp IS NOT NULL").scalar() == 1
+            assert conn.exec_driver_sql("SELECT id, item_id, total_quantity FROM project_boq ORDER BY id").all() == [
+                ("b-1", "i-1", 50.0), ("b-3", "i-2", 5.0)]
+    finally:
+        engine.dispose()
@@ -0,0 +1,44 @@
+import datetime
+
+from .. import models
+from ..pagination import count_cache
+
+
+def _seed_invoices(db, count):
+    base = datetime.datetime(2024, 1, 1)
+    for i in range(count):
+        db.add(models.Invoice(
+            id=f"inv-{i:03d}", po_id="po-1", supplier_invoice_number=f"S{i}", total_amount=float(i),
+            status="MATCHED" if i % 2 else "MISMATCH", created_at=base + datetime.timedelta(minutes=i // 2),
+        ))
+    db.commit()
+    count_cache.clear()
+
+
+def test_keyset_walks_every_row_once(client, db):
+    _seed_invoices(db, 25)
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 10}
+        if cursor: params["cursor"] = cursor
+        res = client.get("/api/invoices", params=params)
+        assert res.status_code == 200
+        seen.extend(row["id"] for row in res.json())
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [f"inv-{i:03d}" for i in range(25)]
+
+
+def test_filter_count_and_projection(client, db):
+    _seed_invoices(db, 6)
+    res = client.get("/api/invoices", params={"status": "MATCHED", "fields": "id,status"})
+    assert res.status_code == 200
+    assert res.headers["X-Total-Count"] == "3"
+    assert res.json() == [{"id": "inv-001", "status": "MATCHED"}, {"id": "inv-003", "status": "MATCHED"},
+                          {"id": "inv-005", "status": "MATCHED"}]
+
+
+def test_rejects_unknown_fields_and_bad_cursor(client, db):
+    assert client.get("/api/invoices", params={"fields": "password_hash"}).status_code == 400
+    assert client.get("/api/invoices", params={"cursor": "not-a-cursor"}).status_code == 400
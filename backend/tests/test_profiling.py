@@ -0,0 +1,84 @@
+import asyncio
+import re
+import sys
+import time
+
+from .. import models, profiling
+from ..profiling import Profiler
+
+_SCOPE = {"type": "http", "method": "GET", "path": "/api/projects", "headers": [(b"x-profile", b"s3cret")]}
+
+
+def _spin(seconds: float):
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+
+def _worker():
+    profile = profiling.enter_thread()
+    try:
+        _spin(0.05)
+    finally:
+        profiling.exit_thread(profile)
+
+
+def test_samples_the_request_task_and_its_worker_threads():
+    p = Profiler(token="s3cret")
+
+    async def request():
+        profile = p.start(_SCOPE, sys._getframe())
+        token = profiling._current.set(profile)
+        try:
+            _spin(0.05)  # on the loop, in the request's task
+            await asyncio.gather(asyncio.to_thread(_worker), asyncio.sleep(0.05))
+        finally:
+            profiling._current.reset(token)
+            p.finish(profile)
+        return profile
+
+    profile = asyncio.run(request())
+    stacks = dict(line.rsplit(" ", 1) for line in profile.folded().splitlines())
+    on_loop = [s for s in stacks if s.startswith(f"{__name__}:test_samples_the_request_task_and_its_worker_threads.<locals>.request;")]
+    in_worker = [s for s in stacks if s.startswith(f"{__name__}:_worker;")]
+    assert any(s.endswith(f"{__name__}:_spin") for s in on_loop)
+    assert any(s.endswith(f"{__name__}:_spin") for s in in_worker)
+    assert sum(map(int, stacks.values())) == profile.samples > 0
+    assert p.get(profile.id) is profile and profile.roots == {}
+
+
+def test_header_trigger_and_rate_limit():
+    p = Profiler(token="s3cret", rate_per_minute=2)
+    assert p.start({**_SCOPE, "headers": [(b"x-profile", b"guess")]}, None) is None
+    assert not Profiler(token=None).enabled  # no token, nothing armed: the middleware skips it all
+
+    async def run():
+        started = [p.start(_SCOPE, sys._getframe()) for _ in range(3)]
+        for profile in filter(None, started):
+            p.finish(profile)
+        return started
+
+    started = asyncio.run(run())
+    assert [s is not None for s in started] == [True, True, False]
+    assert p.status()["skipped"] == 1
+
+
+def test_admin_arms_profiling_for_the_next_requests(client, db, admin_headers, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL_MS", 0.5)
+    db.add(models.Project(id="p-1", code="P1", name="Tower", budget=1000.0))
+    db.commit()
+    assert client.post("/api/admin/profiling", json={"pathPrefix": "/api/projects/", "count": 1},
+                       headers=admin_headers).json()["armed"] == 1
+
+    assert "x-profile-id" not in client.get("/api/users/me", headers=admin_headers).headers
+    profile_id = client.get("/api/projects/p-1/financials", headers=admin_headers).headers["x-profile-id"]
+    assert "x-profile-id" not in client.get("/api/projects/p-1/financials", headers=admin_headers).headers
+
+    status = client.get("/api/admin/profiling", headers=admin_headers).json()
+    assert status["armed"] == 0
+    assert [(p["id"], p["route"], p["trigger"]) for p in status["profiles"]] == \
+        [(profile_id, "/api/projects/{project_id}/financials", "armed")]
+    res = client.get(f"/api/admin/profiling/{profile_id}", headers=admin_headers)
+    assert res.headers["content-type"].startswith("text/plain")
+    assert all(re.fullmatch(r"\S+ \d+", line) for line in res.text.splitlines())
+    assert client.get("/api/admin/profiling/nope", headers=admin_headers).status_code == 404
@@ -0,0 +1,67 @@
+import pytest
+
+from .. import models
+from ..pagination import count_cache
+
+# Guard against N+1 loads: the SELECT count of a list endpoint must not grow with the rows it returns.
+
+
+def _seed(db, n, offset=0):
+    for i in range(offset, offset + n):
+        req = models.MaterialRequest(id=f"mr-{i}", project_id="p-1", requester_id="u-1", status="APPROVED_TECHNICAL")
+        req.items = [models.RequestItem(item_id=f"it-{j}", quantity=1.0) for j in range(3)]
+        po = models.PurchaseOrder(id=f"po-{i}", project_id="p-1", supplier_id="s-1", total_amount=30.0)
+        po.items = [models.POItem(item_id=f"it-{j}", quantity=1.0, price=10.0) for j in range(3)]
+        rec = models.Receipt(id=f"rec-{i}", po_id=f"po-{i}", received_by="u-1")
+        rec.items = [models.ReceiptItem(item_id=f"it-{j}", quantity=1.0) for j in range(3)]
+        db.add_all([req, po, rec])
+    db.commit()
+
+
+@pytest.mark.parametrize("path", ["/api/purchase-orders", "/api/material-requests", "/api/receipts"])
+def test_list_select_count_is_flat(client, db, count_queries, path):
+    _seed(db, 3)
+    count_cache.clear()
+    with count_queries() as small:
+        res = client.get(path)
+    assert res.status_code == 200 and len(res.json()) == 3
+
+    _seed(db, 12, offset=3)
+    count_cache.clear()
+    with count_queries() as large:
+        res = client.get(path)
+    assert res.status_code == 200 and len(res.json()) == 15
+    assert all(len(row["items"]) == 3 for row in res.json())
+
+    assert large.selects == small.selects
+
+
+def _po_with_lines(db, po_id, n):
+    po = models.PurchaseOrder(id=po_id, project_id="p-1", supplier_id="s-1", total_amount=10.0 * n, status="APPROVED")
+    po.items = [models.POItem(item_id=f"it-{j}", quantity=5.0, price=10.0) for j in range(n)]
+    db.add(po)
+    db.commit()
+
+
+def test_receipt_round_trips_do_not_grow_with_lines(client, db, admin_headers, count_queries):
+    _po_with_lines(db, "po-small", 2)
+    _po_with_lines(db, "po-large", 40)
+
+    def receive(po_id, n, qty):
+        return client.post("/api/receipts", headers=admin_headers,
+                           json={"poId": po_id, "items": [{"itemId": f"it-{j}", "quantity": qty} for j in range(n)]})
+
+    client.get("/api/users/me", headers=admin_headers)  # warm the principal cache
+    with count_queries() as small:
+        assert receive("po-small", 2, 5.0).status_code == 200
+    with count_queries() as large:
+        res = receive("po-large", 40, 2.0)
+    assert res.status_code == 200 and len(res.json()["items"]) == 40
+    assert len(large.statements) == len(small.statements)
+
+    assert db.get(models.PurchaseOrder, "po-small").status == "RECEIVED"
+    assert db.get(models.PurchaseOrder, "po-large").status == "PARTIALLY_RECEIVED"
+    # Guarded update: over-receiving a line is rejected and nothing is applied
+    assert receive("po-large", 40, 4.0).status_code == 400
+    db.expire_all()
+    assert {line.received_quantity for line in db.get(models.PurchaseOrder, "po-large").items} == {2.0}
@@ -0,0 +1,62 @@
+from .. import models
+
+
+def _rfq(db, lines):
+    db.add(models.Project(id="p-1", code="P1", name="Tower", budget=1e9))
+    mr = models.MaterialRequest(id="mr-1", project_id="p-1", requester_id="u-1", status="IN_PROCUREMENT")
+    mr.items = [models.RequestItem(item_id=item_id, quantity=qty) for item_id, qty in lines]
+    db.add_all([mr, models.RFQ(id="rfq-1", material_request_id="mr-1", status="OPEN")])
+    db.commit()
+
+
+def test_line_quotes_are_ranked_and_awarded_at_line_prices(client, db, admin_headers):
+    _rfq(db, [("i-1", 10.0), ("i-2", 4.0)])
+    db.add_all([models.Supplier(id="s-a", name="A", rating=5.0), models.Supplier(id="s-b", name="B", rating=2.5)])
+    db.commit()
+    quote_a = client.post("/api/quotations", json={"rfqId": "rfq-1", "supplierId": "s-a", "leadTimeDays": 7, "items": [
+        {"itemId": "i-1", "unitPrice": 12.0}, {"itemId": "i-2", "unitPrice": 50.0, "leadTimeDays": 3}]}).json()
+    quote_b = client.post("/api/quotations", json={"rfqId": "rfq-1", "supplierId": "s-b", "items": [
+        {"itemId": "i-1", "unitPrice": 10.0, "leadTimeDays": 7}]}).json()
+    assert quote_a["total_amount"] == 10 * 12.0 + 4 * 50.0 and len(quote_a["items"]) == 2
+    assert client.post("/api/quotations", json={"rfqId": "rfq-1", "supplierId": "s-b", "items": [
+        {"itemId": "i-9", "unitPrice": 1.0}]}).status_code == 400
+    duplicate = client.post("/api/quotations", json={"rfqId": "rfq-1", "supplierId": "s-b", "items": [
+        {"itemId": "i-1", "unitPrice": 9.0}, {"itemId": "i-2", "unitPrice": 40.0}, {"itemId": "i-1", "unitPrice": 1.0}]})
+    assert duplicate.status_code == 400 and "i-1" in duplicate.json()["detail"]
+
+    cmp = client.get("/api/rfqs/rfq-1/comparison").json()
+    line_1, line_2 = cmp["lines"]
+    assert [o["quotationId"] for o in line_1["offers"]] == [quote_b["id"], quote_a["id"]]
+    assert line_2["bestQuotationId"] == quote_a["id"] and len(line_2["offers"]) == 1
+    ranking = [(s["quotationId"], s["linesQuoted"], s["total"], s["rank"]) for s in cmp["suppliers"]]
+    assert ranking == [(quote_a["id"], 2, 320.0, 1), (quote_b["id"], 1, 100.0, 2)]
+
+    po = client.post("/api/rfqs/rfq-1/select-winner", headers=admin_headers, json={"quotationId": quote_a["id"]}).json()
+    assert sorted((line["itemId"], line["price"]) for line in po["items"]) == [("i-1", 12.0), ("i-2", 50.0)]
+    assert po["total_amount"] == 320.0
+
+
+def test_lump_sum_quote_allocates_total_across_po_lines(client, db, admin_headers):
+    _rfq(db, [("i-1", 10.0), ("i-2", 30.0)])
+    quote = client.post("/api/quotations", json={"rfqId": "rfq-1", "supplierId": "s-a", "totalAmount": 400.0}).json()
+    po = client.post("/api/rfqs/rfq-1/select-winner", headers=admin_headers, json={"quotationId": quote["id"]}).json()
+    assert po["total_amount"] == sum(line["quantity"] * line["price"] for line in po["items"]) == 400.0
+
+
+def test_comparison_scales_to_large_rfqs(client, db, count_queries):
+    # Timing for this shape: python -m backend.benchmarks.quote_comparison
+    suppliers, lines = 40, 300
+    _rfq(db, [(f"i-{j}", 1.0 + j % 5) for j in range(lines)])
+    for i in range(suppliers):
+        quote = models.Quotation(id=f"q-{i:02d}", rfq_id="rfq-1", supplier_id=f"s-{i}", total_amount=0.0, lead_time_days=i % 9)
+        quote.items = [models.QuotationItem(item_id=f"i-{j}", unit_price=100.0 + (i * 7 + j) % 13) for j in range(lines) if (i + j) % 4]
+        db.add(quote)
+    db.commit()
+
+    with count_queries() as counted:
+        result = client.get("/api/rfqs/rfq-1/comparison").json()
+    assert len(result["lines"]) == lines and len(result["suppliers"]) == suppliers
+    assert [s["rank"] for s in result["suppliers"]] == list(range(1, suppliers + 1))
+    assert all(len(line["offers"]) <= 3 for line in result["lines"])
+    # The RFQ, its requested items, the quotations and all their lines: no query per line or per quote
+    assert len(counted.statements) == 4, counted.statements
@@ -0,0 +1,49 @@
+import datetime
+import json
+
+from fastapi.encoders import jsonable_encoder
+
+from .. import models
+from ..responses import render_json
+
+# orjson rendering of ORM rows and response compression negotiation.
+
+
+def _seed_items(db, n):
+    db.add_all([models.Item(id=f"it-{i:04d}", sku=f"SKU-{i:04d}", name=f"Item {i}", unit="pcs", base_price=1.5 * i,
+                            category="civil") for i in range(n)])
+    db.commit()
+
+
+def test_orm_rows_render_like_jsonable_encoder(db):
+    sup = models.Supplier(id="s-1", name="Acme", rating=4.5, created_at=datetime.datetime(2024, 5, 1, 8, 30, 15, 250000))
+    db.add(sup)
+    db.commit()
+    db.refresh(sup)
+    assert json.loads(render_json([sup])) == jsonable_encoder([sup])
+    assert json.loads(render_json([sup]))[0]["created_at"] == "2024-05-01T08:30:15.250000"
+
+
+def test_large_responses_are_compressed_small_ones_are_not(client, db):
+    _seed_items(db, 200)
+    res = client.get("/api/items", headers={"Accept-Encoding": "gzip"})
+    assert res.status_code == 200 and res.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in res.headers["vary"] and res.headers["x-total-count"] == "200"
+    assert int(res.headers["content-length"]) < len(res.content) / 3  # httpx hands back the decoded body
+    assert len(res.json()) == 100 and res.json()[0]["sku"] == "SKU-0000"
+
+    res = client.get("/api/items", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in res.headers and len(res.json()) == 100
+    res = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers
+
+
+def test_streamed_export_is_compressed_per_chunk(client, db, admin_headers):
+    for i in range(300):
+        po = models.PurchaseOrder(id=f"po-{i:03d}", project_id="p-1", supplier_id="s-1", total_amount=10.0 * i)
+        db.add(po)
+    db.commit()
+    res = client.get("/api/export/purchase-orders", headers={**admin_headers, "Accept-Encoding": "gzip"})
+    assert res.status_code == 200 and res.headers["content-encoding"] == "gzip"
+    assert [json.loads(line)["id"] for line in res.text.splitlines()][:2] == ["po-000", "po-001"]
+    assert len(res.text.splitlines()) == 300